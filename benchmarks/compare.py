@@ -0,0 +1,58 @@
+"""Compares two benchmark result files produced by the benchmarks.
+
+Measurements are matched on their operation and parameters, and the
+ratio of the new to the old median latency is printed. Ratios above
+the threshold are flagged as regressions, and the exit status is
+non-zero if any are found.
+
+"""
+
+import argparse
+import io
+import json
+import sys
+
+
+def key(record):
+    """Identify a measurement by its operation and parameters."""
+    return tuple(sorted((k, v) for k, v in record.items() if k != 'stats'))
+
+
+def load(fname):
+    """Load the result records of a run, indexed by measurement."""
+    with io.open(fname, 'r', encoding='utf-8') as f:
+        return dict((key(r), r['stats']) for r in json.load(f)['results'])
+
+
+def main():
+    """Print the change in median latency between two runs."""
+    parser = argparse.ArgumentParser(
+        description="Compares the results of two benchmark runs.")
+    parser.add_argument('old', help="Results of the baseline run.")
+    parser.add_argument('new', help="Results of the run to compare.")
+    parser.add_argument('--threshold', type=float, default=1.10,
+                        help="Ratio of new to old median latency above"
+                        " which a measurement is a regression."
+                        " Default: %(default)s")
+    args = parser.parse_args()
+
+    old = load(args.old)
+    new = load(args.new)
+    regressions = 0
+    for k in sorted(set(old) & set(new), key=repr):
+        ratio = new[k]['p50'] / old[k]['p50']
+        flag = ""
+        if ratio > args.threshold:
+            flag = "REGRESSION"
+            regressions += 1
+        print("{0:<70} {1:.6f}s -> {2:.6f}s x{3:.2f} {4}".format(
+            " ".join("{0}={1}".format(*kv) for kv in k),
+            old[k]['p50'], new[k]['p50'], ratio, flag))
+    for k in sorted(set(old) ^ set(new), key=repr):
+        print("{0:<70} only in {1}".format(
+            " ".join("{0}={1}".format(*kv) for kv in k),
+            args.old if k in old else args.new))
+    sys.exit(1 if regressions else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""Benchmarks the compression of payloads before their encryption.
+
+For each codec of `pebel.compress`, `AUTO` and no compression, this
+measures `cpabe_encrypt` and `cpabe_decrypt` over payloads of each
+size and kind:
+
+ - `log`    generated log lines, highly compressible;
+ - `text`   words drawn at random, moderately compressible;
+ - `random` random bytes, incompressible.
+
+The size of each ciphertext is recorded alongside the latencies and
+throughput, the latter relative to the size of the plaintext.
+
+Example::
+
+    python3 benchmarks/compression.py --payloads 1M 16M --out c.json
+
+"""
+
+import argparse
+import io
+import os
+import random
+
+from charm.toolbox.pairinggroup import PairingGroup
+
+from pebel.compress import AUTO, CODECS
+from pebel.cpabe import cpabe_setup, cpabe_keygen, cpabe_encrypt, cpabe_decrypt
+
+from harness import measure, parse_size, report, write_results
+
+## The attributes of the key and the policy of the ciphertexts.
+ATTRIBUTES = ['ONE', 'TWO']
+POLICY = 'ONE and TWO'
+
+
+def payload(kind, size, seed=0):
+    """Generate a payload of the given kind and size."""
+    rnd = random.Random(seed)
+    if kind == 'random':
+        return os.urandom(size)
+    out = io.BytesIO()
+    if kind == 'log':
+        levels = ['INFO', 'INFO', 'INFO', 'WARN', 'DEBUG', 'ERROR']
+        i = 0
+        while out.tell() < size:
+            out.write("2026-10-19T12:{0:02d}:{1:02d} {2} worker-{3} request"
+                      " {4} served in {5}ms\n".format(
+                          (i // 60) % 60, i % 60, rnd.choice(levels),
+                          rnd.randrange(8), i, rnd.randrange(500)).encode())
+            i += 1
+    else:
+        words = ["".join(chr(rnd.randrange(97, 123))
+                         for _ in range(rnd.randrange(2, 10)))
+                 for _ in range(5000)]
+        while out.tell() < size:
+            out.write(rnd.choice(words).encode() + b' ')
+    return out.getvalue()[:size]
+
+
+def main():
+    """Run the compression benchmarks."""
+    parser = argparse.ArgumentParser(
+        description="Benchmarks compress-then-encrypt across codecs and"
+        " payload kinds.")
+    parser.add_argument('--group', default='SS512',
+                        help="Pairing group. Default: %(default)s")
+    parser.add_argument('--codecs', nargs='+',
+                        default=['none', AUTO] + sorted(CODECS),
+                        choices=['none', AUTO] + sorted(CODECS),
+                        help="Codecs to measure. Default: %(default)s")
+    parser.add_argument('--kinds', nargs='+',
+                        default=['log', 'text', 'random'],
+                        choices=['log', 'text', 'random'],
+                        help="Payload kinds. Default: %(default)s")
+    parser.add_argument('--payloads', nargs='+', type=parse_size,
+                        default=[parse_size('64K'), parse_size('4M')],
+                        help="Payload sizes, e.g. 1K 1M 1G."
+                        " Default: %(default)s")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="Timed repetitions per measurement."
+                        " Default: %(default)s")
+    parser.add_argument('--out', default="compression.json",
+                        help="File in which to store the results."
+                        " Default: %(default)s")
+    args = parser.parse_args()
+
+    group = PairingGroup(args.group)
+    mpk, msk = cpabe_setup(group)
+    deckey = cpabe_keygen(group, msk, mpk, ATTRIBUTES)
+    results = []
+
+    def record(stats, **params):
+        params['stats'] = stats
+        results.append(params)
+        report(params)
+
+    for kind in args.kinds:
+        for size in args.payloads:
+            data = payload(kind, size)
+            for codec in args.codecs:
+                compression = None if codec == 'none' else codec
+                params = {'group': args.group, 'kind': kind,
+                          'payload': size, 'codec': codec}
+                ctxt = cpabe_encrypt(group, mpk, io.BytesIO(data), POLICY,
+                                     compression=compression)
+                stats = measure(lambda: cpabe_encrypt(
+                                    group, mpk, io.BytesIO(data), POLICY,
+                                    compression=compression),
+                                repeat=args.repeat, nbytes=size,
+                                trace_memory=False)
+                stats['ciphertext_bytes'] = len(ctxt)
+                record(stats, op='cpabe_encrypt', **params)
+                record(measure(lambda: cpabe_decrypt(group, mpk, deckey,
+                                                     io.BytesIO(ctxt)),
+                               repeat=args.repeat, nbytes=size,
+                               trace_memory=False),
+                       op='cpabe_decrypt', **params)
+                print("{0:<28} ciphertext {1} bytes, {2:.1%} of"
+                      " plaintext".format('', len(ctxt),
+                                          len(ctxt) / float(size)))
+
+    write_results(args.out, 'compression', dict(vars(args)), results)
+
+if __name__ == '__main__':
+    main()
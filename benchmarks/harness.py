@@ -0,0 +1,131 @@
+"""Shared timing, memory and reporting helpers for the benchmarks.
+
+Each benchmark produces a list of result records, one per measured
+operation and parameter combination, that are stored as JSON together
+with a description of the machine and library versions so that runs
+can later be compared using `compare.py`.
+
+"""
+
+import io
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+
+def percentile(samples, p):
+    """Return the p-th percentile of the samples, interpolating linearly."""
+    ordered = sorted(samples)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * p / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def measure(fn, repeat=10, warmup=1, nbytes=None, trace_memory=True):
+    """Time repeated calls of fn.
+
+    @param fn           The zero argument callable to measure.
+    @param repeat       The number of timed calls.
+    @param warmup       The number of untimed calls made first.
+    @param nbytes       The payload size processed per call, if any, used
+    to report throughput.
+    @param trace_memory Report the peak Python allocations of a call.
+
+    @return A `dict` of latency percentiles in seconds, throughput and
+    peak memory.
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    stats = {
+        'repeat': repeat,
+        'mean': sum(samples) / len(samples),
+        'min': min(samples),
+        'p50': percentile(samples, 50),
+        'p90': percentile(samples, 90),
+        'p99': percentile(samples, 99),
+        'max': max(samples),
+        'ops_per_s': len(samples) / sum(samples),
+    }
+    if nbytes is not None:
+        stats['bytes'] = nbytes
+        stats['bytes_per_s'] = nbytes / stats['p50']
+    if trace_memory:
+        tracemalloc.start()
+        fn()
+        stats['peak_traced_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    stats['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return stats
+
+
+def environment():
+    """Describe the interpreter, machine and library versions."""
+    env = {
+        'python': sys.version,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+    for module in ('charm', 'Crypto', 'numpy'):
+        try:
+            env[module] = getattr(__import__(module), '__version__',
+                                  'unknown')
+        except ImportError:
+            env[module] = None
+    try:
+        env['commit'] = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        env['commit'] = None
+    return env
+
+
+def write_results(fname, benchmark, parameters, results):
+    """Store the results of a benchmark run as JSON.
+
+    @param fname      The name of the output file (`str`).
+    @param benchmark  The name (`str`) of the benchmark.
+    @param parameters A `dict` of the parameters of the run.
+    @param results    A `list` of result records.
+    """
+    with io.open(fname, 'w', encoding='utf-8') as f:
+        json.dump({'benchmark': benchmark,
+                   'environment': environment(),
+                   'parameters': parameters,
+                   'results': results}, f, indent=2, sort_keys=True)
+
+
+def report(record):
+    """Print a one line summary of a result record."""
+    labels = " ".join("{0}={1}".format(k, record[k])
+                      for k in sorted(record) if k not in ('stats', 'op'))
+    stats = record['stats']
+    line = "{0:<28} {1:<40} p50={2:.6f}s p99={3:.6f}s".format(
+        record['op'], labels, stats['p50'], stats['p99'])
+    if 'bytes_per_s' in stats:
+        line += " {0:.2f}MB/s".format(stats['bytes_per_s'] / 2**20)
+    print(line)
+    sys.stdout.flush()
+
+
+def parse_size(text):
+    """Parse a size such as 1K, 16M or 1G into a number of bytes."""
+    units = {'K': 2**10, 'M': 2**20, 'G': 2**30}
+    text = text.strip().upper().rstrip('B')
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
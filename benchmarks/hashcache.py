@@ -0,0 +1,121 @@
+"""Benchmarks the hash cache of `pebel.hashcache` on policies and keys
+made up of numerical comparisons.
+
+For each word size, keys hold a value for each of several numerical
+attributes, one bit marker per bit, and policies compare each of them
+against a threshold. `cpabe_keygen`, `cpabe_encrypt`, `kpabe_keygen`
+and `kpabe_encrypt` are measured with the cache disabled and enabled,
+and the hit rate of the cache is recorded, together with the number of
+leaves of the compiled policy. Before measuring, the keys are checked
+to decrypt the ciphertexts of each workload.
+
+Example::
+
+    python3 benchmarks/hashcache.py --nbits 8 32 --numerical 4 --out h.json
+
+"""
+
+import argparse
+import io
+
+from charm.toolbox.pairinggroup import PairingGroup
+
+from pebel.cpabe import cpabe_setup, cpabe_keygen, cpabe_encrypt, cpabe_decrypt
+from pebel.kpabe import kpabe_setup, kpabe_keygen, kpabe_encrypt, kpabe_decrypt
+from pebel.hashcache import HASH_CACHE_SIZE, get_hash_cache
+from pebel.policycache import compile_policy
+from pebel.policy import constructNumericalAttribute, convertNumericalComparison
+
+from harness import measure, report, write_results
+
+
+def workload(nbits, numerical):
+    """Return the attributes and policy of a marker heavy workload."""
+    names = ["NUM{0}".format(i) for i in range(numerical)]
+    value = (1 << nbits) * 2 // 3
+    attributes = ['MEMBER']
+    for name in names:
+        attributes.extend(a.upper() for a in
+                          constructNumericalAttribute(name, value, nbits))
+    clauses = ["({0})".format(convertNumericalComparison(
+        name, True, (1 << nbits) // 3, nbits)) for name in names]
+    return attributes, " and ".join(['MEMBER'] + clauses)
+
+
+def check(ptxt):
+    """Check that a key of the workload decrypted its ciphertext."""
+    if bytes(ptxt) != b'x':
+        raise SystemExit("The key does not decrypt the ciphertext.")
+
+
+def main():
+    """Run the hash cache benchmarks."""
+    parser = argparse.ArgumentParser(
+        description="Benchmarks key generation and encryption with and"
+        " without the hash cache.")
+    parser.add_argument('--cp-group', default='SS512', dest='cp_group',
+                        help="Pairing group for CP-ABE. Default: %(default)s")
+    parser.add_argument('--kp-group', default='MNT224', dest='kp_group',
+                        help="Pairing group for KP-ABE. Default: %(default)s")
+    parser.add_argument('--nbits', nargs='+', type=int, default=[8, 32],
+                        help="Numerical attribute bit widths."
+                        " Default: %(default)s")
+    parser.add_argument('--numerical', type=int, default=4,
+                        help="Numerical attributes per key and policy."
+                        " Default: %(default)s")
+    parser.add_argument('--repeat', type=int, default=10,
+                        help="Timed repetitions per measurement."
+                        " Default: %(default)s")
+    parser.add_argument('--out', default="hashcache.json",
+                        help="File in which to store the results."
+                        " Default: %(default)s")
+    args = parser.parse_args()
+
+    results = []
+
+    def record(stats, **params):
+        params['stats'] = stats
+        results.append(params)
+        report(params)
+
+    cp_group = PairingGroup(args.cp_group)
+    cp_mpk, cp_msk = cpabe_setup(cp_group)
+    kp_group = PairingGroup(args.kp_group)
+    kp_mpk, kp_msk = kpabe_setup(kp_group)
+
+    for nbits in args.nbits:
+        attributes, policy = workload(nbits, args.numerical)
+        leaves = len(compile_policy(policy).attributes)
+        check(cpabe_decrypt(cp_group, cp_mpk, cpabe_keygen(
+            cp_group, cp_msk, cp_mpk, attributes), io.BytesIO(
+                cpabe_encrypt(cp_group, cp_mpk, io.BytesIO(b'x'), policy))))
+        check(kpabe_decrypt(kp_group, kp_mpk, kpabe_keygen(
+            kp_group, kp_msk, kp_mpk, policy), io.BytesIO(
+                kpabe_encrypt(kp_group, kp_mpk, io.BytesIO(b'x'),
+                              attributes))))
+        cases = [
+            ('cpabe_keygen', cp_group, lambda: cpabe_keygen(
+                cp_group, cp_msk, cp_mpk, attributes)),
+            ('cpabe_encrypt', cp_group, lambda: cpabe_encrypt(
+                cp_group, cp_mpk, io.BytesIO(b'x'), policy)),
+            ('kpabe_keygen', kp_group, lambda: kpabe_keygen(
+                kp_group, kp_msk, kp_mpk, policy)),
+            ('kpabe_encrypt', kp_group, lambda: kpabe_encrypt(
+                kp_group, kp_mpk, io.BytesIO(b'x'), attributes)),
+        ]
+        for op, group, fn in cases:
+            cache = get_hash_cache(group)
+            for size in (0, HASH_CACHE_SIZE):
+                cache.resize(size)
+                cache.clear()
+                stats = measure(fn, repeat=args.repeat, trace_memory=False)
+                stats.update(('cache_' + k, v)
+                             for k, v in cache.metrics().items())
+                record(stats, op=op, group=group.groupType(), nbits=nbits,
+                       markers=len(attributes), leaves=leaves,
+                       cache=bool(size))
+
+    write_results(args.out, 'hashcache', dict(vars(args)), results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""Benchmarks loading keys into worker processes with `pebel.keystore`.
+
+A Master Public Key and a number of decryption keys are generated and
+written to files, then packed into a key store. For each number of
+workers, that many processes are spawned at once and each loads every
+key, either reading each from its file or from the key store, and
+prepared or not. Each worker reports the time taken to load its keys,
+its cold start, recorded as `p50` and, the slowest worker, `p99`,
+its resident memory and, where Linux provides it, its proportional
+memory, which divides pages shared between processes among them.
+
+Example::
+
+    python3 benchmarks/keystore.py --keys 100 500 --workers 4 16 \\
+        --out k.json
+
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import statistics
+import tempfile
+import time
+
+from charm.toolbox.pairinggroup import PairingGroup
+
+from pebel.cpabe import cpabe_setup, cpabe_keygen
+from pebel.keystore import KeyStore, build_keystore
+from pebel.prepared import prepare_key
+from pebel.util import (write_key_to_file, read_key_from_file,
+                        read_group_from_file)
+
+from harness import report, write_results
+
+ATTRIBUTES = ['ONE', 'TWO', 'THREE', 'FOUR']
+
+
+def memory():
+    """Return the resident and proportional memory in bytes of this
+    process, the latter being None if unknown."""
+    rss = pss = None
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Rss:'):
+                    rss = int(line.split()[1]) * 1024
+                elif line.startswith('Pss:'):
+                    pss = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if rss is None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return rss, pss
+
+
+def worker(task):
+    """Load every key of a task, returning the seconds taken and the
+    memory of the worker."""
+    mode, prepare, mpk_fname, fnames, store_fname, barrier, out = task
+    barrier.wait()
+    start = time.perf_counter()
+    if mode == 'files':
+        group = read_group_from_file(mpk_fname)
+        keys = [read_key_from_file(mpk_fname, group)]
+        for fname in fnames:
+            key = read_key_from_file(fname, group)
+            keys.append(prepare_key(group, key) if prepare else key)
+    else:
+        store = KeyStore(store_fname, maxsize=len(fnames) + 1)
+        keys = [store.get('mpk')]
+        for fname in fnames:
+            keys.append(store.get(os.path.basename(fname), prepare=prepare))
+    seconds = time.perf_counter() - start
+    out.put((seconds,) + memory())
+
+
+def run(mode, prepare, workers, mpk_fname, fnames, store_fname):
+    """Spawn workers at once and collect their measurements."""
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(workers)
+    out = ctx.Queue()
+    task = (mode, prepare, mpk_fname, fnames, store_fname, barrier, out)
+    procs = [ctx.Process(target=worker, args=(task,))
+             for _ in range(workers)]
+    for p in procs:
+        p.start()
+    samples = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+    seconds = [s[0] for s in samples]
+    stats = {'p50': statistics.median(seconds),
+             'p99': max(seconds),
+             'rss_mean': statistics.mean(s[1] for s in samples)}
+    if all(s[2] is not None for s in samples):
+        stats['pss_mean'] = statistics.mean(s[2] for s in samples)
+    return stats
+
+
+def main():
+    """Run the key store benchmarks."""
+    parser = argparse.ArgumentParser(
+        description="Benchmarks loading keys into worker processes from"
+        " their files and from a key store.")
+    parser.add_argument('--group', default='SS512',
+                        help="Pairing group. Default: %(default)s")
+    parser.add_argument('--keys', nargs='+', type=int, default=[100, 500],
+                        help="Decryption key counts. Default: %(default)s")
+    parser.add_argument('--workers', nargs='+', type=int,
+                        default=[os.cpu_count() or 1],
+                        help="Worker process counts. Default: %(default)s")
+    parser.add_argument('--prepare', action='store_true',
+                        help="Also measure loading prepared keys.")
+    parser.add_argument('--out', default="keystore.json",
+                        help="File in which to store the results."
+                        " Default: %(default)s")
+    args = parser.parse_args()
+
+    results = []
+
+    def record(stats, **params):
+        params['stats'] = stats
+        results.append(params)
+        report(params)
+
+    group = PairingGroup(args.group)
+    mpk, msk = cpabe_setup(group)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        mpk_fname = os.path.join(tmp, 'mpk')
+        write_key_to_file(mpk_fname, mpk, group)
+        for n in args.keys:
+            fnames = []
+            for i in range(n):
+                fname = os.path.join(tmp, 'key{0}'.format(i))
+                if not os.path.exists(fname):
+                    write_key_to_file(fname, cpabe_keygen(group, msk, mpk,
+                                                          ATTRIBUTES), group)
+                fnames.append(fname)
+            store_fname = os.path.join(tmp, 'keys{0}.pks'.format(n))
+            keys = {os.path.basename(f): f for f in fnames}
+            keys['mpk'] = mpk_fname
+            build_keystore(store_fname, keys)
+            size = os.path.getsize(store_fname)
+            for workers in args.workers:
+                for prepare in [False, True] if args.prepare else [False]:
+                    for mode in ('files', 'keystore'):
+                        stats = run(mode, prepare, workers, mpk_fname,
+                                    fnames, store_fname)
+                        stats['store_bytes'] = size
+                        record(stats, op=mode, group=args.group, keys=n,
+                               workers=workers, prepare=prepare)
+
+    write_results(args.out, 'keystore', dict(vars(args)), results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Benchmarks parallel encapsulation under large policies with
+`pebel.parallel`.
+
+For each leaf count, a disjunction over that many attributes is
+encapsulated under with `cpabe_encapsulate`, sequentially and with
+each number of worker processes, whatever the threshold of
+`pebel.parallel`. Disjunctions are written flat, `A or B or C ...`, as
+policies over many users are, and as balanced trees. The untimed
+warm-up call starts the pool.
+
+Example::
+
+    python3 benchmarks/parallel.py --leaves 10 100 1000 10000 \\
+        --workers 2 4 8 --out p.json
+
+"""
+
+import argparse
+import os
+
+from charm.toolbox.pairinggroup import PairingGroup
+
+from pebel import parallel
+from pebel.cpabe import cpabe_setup, cpabe_encapsulate
+
+from harness import measure, report, write_results
+
+
+def flat(attrs):
+    """Return a disjunction over attrs without brackets."""
+    return " or ".join(attrs)
+
+
+def balanced(attrs):
+    """Return a disjunction over attrs as a balanced tree."""
+    if len(attrs) == 1:
+        return attrs[0]
+    half = len(attrs) // 2
+    return "({0} or {1})".format(balanced(attrs[:half]),
+                                 balanced(attrs[half:]))
+
+
+SHAPES = {'flat': flat, 'balanced': balanced}
+
+
+def main():
+    """Run the parallel encapsulation benchmarks."""
+    parser = argparse.ArgumentParser(
+        description="Benchmarks CP-ABE encapsulation under large policies"
+        " sequentially and across worker processes.")
+    parser.add_argument('--group', default='SS512',
+                        help="Pairing group. Default: %(default)s")
+    parser.add_argument('--leaves', nargs='+', type=int,
+                        default=[10, 100, 1000, 10000],
+                        help="Policy leaf counts. Default: %(default)s")
+    parser.add_argument('--workers', nargs='+', type=int,
+                        default=[os.cpu_count() or 1],
+                        help="Worker process counts. Default: %(default)s")
+    parser.add_argument('--shapes', nargs='+', default=sorted(SHAPES),
+                        choices=sorted(SHAPES),
+                        help="Policy shapes. Default: %(default)s")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="Timed repetitions per measurement."
+                        " Default: %(default)s")
+    parser.add_argument('--out', default="parallel.json",
+                        help="File in which to store the results."
+                        " Default: %(default)s")
+    args = parser.parse_args()
+
+    results = []
+
+    def record(stats, **params):
+        params['stats'] = stats
+        results.append(params)
+        report(params)
+
+    group = PairingGroup(args.group)
+    mpk, _ = cpabe_setup(group)
+
+    for workers in [1] + [w for w in args.workers if w > 1]:
+        parallel.configure(workers=workers, threshold=0)
+        for shape in args.shapes:
+            for n in args.leaves:
+                policy = SHAPES[shape](["ATTR{0}".format(i)
+                                        for i in range(n)])
+                stats = measure(lambda: cpabe_encapsulate(group, mpk,
+                                                          policy),
+                                repeat=args.repeat, trace_memory=False)
+                stats['leaves_per_s'] = n / stats['p50']
+                record(stats, op='cpabe_encapsulate', group=args.group,
+                       shape=shape, leaves=n, workers=workers)
+    parallel.configure(workers=1)
+
+    write_results(args.out, 'parallel', dict(vars(args)), results)
+
+if __name__ == '__main__':
+    main()
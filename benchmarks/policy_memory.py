@@ -0,0 +1,103 @@
+"""Measures the memory used by large generated policy trees.
+
+A policy is generated as the disjunction of many numerical
+comparisons, and the bytes allocated per logical node are reported
+for the previous, dict based, node layout and for the current
+hash-consed `PolicyTree`.
+
+"""
+
+import argparse
+import contextlib
+import random
+import tracemalloc
+
+from pebel import policy
+
+
+class _DictPolicyTree:
+    """The node layout used prior to hash-consing, kept for comparison."""
+    def __init__(self, value, k=1, children=[]):
+        self.k = k
+        self.value = value
+        self.children = children
+
+    def isLeaf(self):
+        return not self.children
+
+
+@contextlib.contextmanager
+def node_type(cls):
+    """Temporarily construct policy nodes using the given class."""
+    saved = policy.PolicyTree
+    policy.PolicyTree = cls
+    try:
+        yield
+    finally:
+        policy.PolicyTree = saved
+
+
+def build_policy(ncomparisons, nnames, nbits, seed):
+    """Build the disjunction of `ncomparisons` random comparisons."""
+    rnd = random.Random(seed)
+    root = None
+    for _ in range(ncomparisons):
+        name = "attr{0}".format(rnd.randrange(nnames))
+        value = rnd.randrange(1, (1 << nbits) - 1)
+        p = policy.numericalComparisonTree(name, rnd.random() < 0.5,
+                                           value, nbits)
+        root = p if root is None else policy.kof2_policy(1, root, p)
+    return root
+
+
+def count_nodes(root):
+    """Count the logical and the distinct nodes within a policy."""
+    logical = 0
+    distinct = set()
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        logical += 1
+        distinct.add(id(node))
+        stack.extend(node.children)
+    return logical, len(distinct)
+
+
+def measure(cls, args):
+    """Return (logical nodes, distinct nodes, bytes) for a node class."""
+    with node_type(cls):
+        tracemalloc.start()
+        root = build_policy(args.comparisons, args.names,
+                            args.nbits, args.seed)
+        used = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    logical, distinct = count_nodes(root)
+    return logical, distinct, used
+
+
+def main():
+    """Report bytes per node before and after hash-consing."""
+    parser = argparse.ArgumentParser(
+        description="Measures memory per node of generated policies.")
+    parser.add_argument('--comparisons', default=2000, type=int,
+                        help="Number of numerical comparisons."
+                        " Default: %(default)s")
+    parser.add_argument('--names', default=8, type=int,
+                        help="Number of distinct numerical attributes."
+                        " Default: %(default)s")
+    parser.add_argument('--nbits', default=32, type=int,
+                        help="Word size of numerical attributes."
+                        " Default: %(default)s")
+    parser.add_argument('--seed', default=0, type=int,
+                        help="Random seed. Default: %(default)s")
+    args = parser.parse_args()
+
+    for label, cls in (("before", _DictPolicyTree),
+                       ("after", policy.PolicyTree)):
+        logical, distinct, used = measure(cls, args)
+        print("{0:>6}: {1} nodes ({2} distinct), {3} bytes,"
+              " {4:.1f} bytes/node".format(label, logical, distinct, used,
+                                          used / logical))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Benchmarks the policy cache of `pebel.policycache`.
+
+For each policy size, a recurring policy of that many leaves, mixing
+conjunctions and disjunctions, is parsed, encapsulated under with
+CP-ABE and used to issue KP-ABE keys. Encapsulation and key generation
+are measured through Charm, which parses the policy on each call, and
+through pebel with the policy cache disabled and enabled.
+
+Example::
+
+    python3 benchmarks/policycache.py --leaves 8 64 --out p.json
+
+"""
+
+import argparse
+
+from charm.toolbox.pairinggroup import PairingGroup, GT
+from charm.toolbox.secretutil import SecretUtil
+from charm.schemes.abenc.abenc_bsw07 import CPabe_BSW07
+from charm.schemes.abenc.abenc_lsw08 import KPabe
+
+from pebel.cpabe import cpabe_setup, cpabe_encapsulate
+from pebel.kpabe import kpabe_setup, kpabe_keygen
+from pebel.policycache import POLICY_CACHE_SIZE, get_policy_cache
+
+from harness import measure, report, write_results
+
+
+def workload(leaves):
+    """Return a policy of the given number of leaves, pairing
+    conjunctions under disjunctions."""
+    attrs = ["ATTR{0}".format(i) for i in range(leaves)]
+    pairs = [" and ".join(attrs[i:i + 2]) for i in range(0, leaves, 2)]
+    return " or ".join("({0})".format(p) for p in pairs)
+
+
+def main():
+    """Run the policy cache benchmarks."""
+    parser = argparse.ArgumentParser(
+        description="Benchmarks policy parsing, CP-ABE encapsulation and"
+        " KP-ABE key generation with and without the policy cache.")
+    parser.add_argument('--cp-group', default='SS512', dest='cp_group',
+                        help="Pairing group for CP-ABE. Default: %(default)s")
+    parser.add_argument('--kp-group', default='MNT224', dest='kp_group',
+                        help="Pairing group for KP-ABE. Default: %(default)s")
+    parser.add_argument('--leaves', nargs='+', type=int, default=[8, 64],
+                        help="Policy leaf counts. Default: %(default)s")
+    parser.add_argument('--repeat', type=int, default=10,
+                        help="Timed repetitions per measurement."
+                        " Default: %(default)s")
+    parser.add_argument('--out', default="policycache.json",
+                        help="File in which to store the results."
+                        " Default: %(default)s")
+    args = parser.parse_args()
+
+    results = []
+
+    def record(stats, **params):
+        params['stats'] = stats
+        results.append(params)
+        report(params)
+
+    cp_group = PairingGroup(args.cp_group)
+    cp_mpk, cp_msk = cpabe_setup(cp_group)
+    kp_group = PairingGroup(args.kp_group)
+    kp_mpk, kp_msk = kpabe_setup(kp_group)
+    cache = get_policy_cache()
+
+    for leaves in args.leaves:
+        policy = workload(leaves)
+        record(measure(lambda: SecretUtil(cp_group, False).createPolicy(
+            policy), repeat=args.repeat, trace_memory=False),
+               op='parse', leaves=leaves, impl='charm')
+        record(measure(lambda: CPabe_BSW07(cp_group).encrypt(
+            cp_mpk, cp_group.random(GT), policy), repeat=args.repeat,
+            trace_memory=False),
+               op='cpabe_encapsulate', leaves=leaves, impl='charm')
+        record(measure(lambda: KPabe(kp_group).keygen(
+            kp_mpk, kp_msk, policy), repeat=args.repeat,
+            trace_memory=False),
+               op='kpabe_keygen', leaves=leaves, impl='charm')
+
+        cases = [
+            ('parse', lambda: cache.get(policy)),
+            ('cpabe_encapsulate', lambda: cpabe_encapsulate(
+                cp_group, cp_mpk, policy)),
+            ('kpabe_keygen', lambda: kpabe_keygen(
+                kp_group, kp_msk, kp_mpk, policy)),
+        ]
+        for op, fn in cases:
+            for size in (0, POLICY_CACHE_SIZE):
+                cache.resize(size)
+                cache.clear()
+                stats = measure(fn, repeat=args.repeat, trace_memory=False)
+                stats.update(('cache_' + k, v)
+                             for k, v in cache.metrics().items())
+                record(stats, op=op, leaves=leaves,
+                       impl='pebel' if size else 'pebel-uncached')
+
+    write_results(args.out, 'policycache', dict(vars(args)), results)
+
+if __name__ == '__main__':
+    main()
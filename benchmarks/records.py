@@ -0,0 +1,93 @@
+"""Benchmarks record level encryption with `pebel.records`.
+
+For each record size, a batch of records is encrypted and decrypted in
+record mode, sharing one record key, and the throughput in records per
+second and the bytes added per record are recorded. For comparison a
+few records are encrypted individually with `cpabe_encrypt`.
+
+Example::
+
+    python3 benchmarks/records.py --sizes 100 1KiB --batch 100000 --out r.json
+
+"""
+
+import argparse
+import io
+
+from charm.toolbox.pairinggroup import PairingGroup
+
+from pebel.cpabe import cpabe_setup, cpabe_keygen, cpabe_encrypt
+from pebel.records import RecordEncryptor, RecordDecryptor
+
+from harness import measure, parse_size, report, write_results
+
+POLICY = 'ONE and (TWO or THREE)'
+
+
+def main():
+    """Run the record benchmarks."""
+    parser = argparse.ArgumentParser(
+        description="Benchmarks record mode encryption and decryption.")
+    parser.add_argument('--group', default='SS512',
+                        help="Pairing group. Default: %(default)s")
+    parser.add_argument('--sizes', nargs='+', type=parse_size,
+                        default=[100, 1024],
+                        help="Record sizes. Default: %(default)s")
+    parser.add_argument('--batch', type=int, default=100000,
+                        help="Records per batch. Default: %(default)s")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="Timed repetitions per measurement."
+                        " Default: %(default)s")
+    parser.add_argument('--out', default="records.json",
+                        help="File in which to store the results."
+                        " Default: %(default)s")
+    args = parser.parse_args()
+
+    results = []
+
+    def record(stats, **params):
+        params['stats'] = stats
+        results.append(params)
+        report(params)
+
+    group = PairingGroup(args.group)
+    mpk, msk = cpabe_setup(group)
+    deckey = cpabe_keygen(group, msk, mpk, ['ONE', 'TWO'])
+
+    for size in args.sizes:
+        records = [bytes(size)] * args.batch
+        encryptor = RecordEncryptor(group, mpk, policy=POLICY)
+        ctxts = list(encryptor.encrypt_records(records))
+        decryptor = RecordDecryptor(mpk, deckey, group)
+        decryptor.add_header(encryptor.header)
+
+        cases = [
+            ('record_encrypt',
+             lambda: list(encryptor.encrypt_records(records))),
+            ('record_decrypt',
+             lambda: list(decryptor.decrypt_records(ctxts))),
+        ]
+        for op, fn in cases:
+            stats = measure(fn, repeat=args.repeat,
+                            nbytes=size * args.batch, trace_memory=False)
+            stats['records_per_s'] = args.batch / stats['p50']
+            stats['overhead'] = len(ctxts[0]) - size
+            stats['header'] = len(encryptor.header)
+            record(stats, op=op, size=size, batch=args.batch,
+                   backend='cryptography')
+
+        stats = measure(lambda: cpabe_encrypt(group, mpk,
+                                              io.BytesIO(records[0]),
+                                              POLICY),
+                        repeat=args.repeat, nbytes=size, trace_memory=False)
+        stats['records_per_s'] = 1 / stats['p50']
+        stats['overhead'] = len(cpabe_encrypt(group, mpk,
+                                              io.BytesIO(records[0]),
+                                              POLICY)) - size
+        record(stats, op='cpabe_encrypt', size=size, batch=1,
+               backend='pycrypto')
+
+    write_results(args.out, 'records', dict(vars(args)), results)
+
+if __name__ == '__main__':
+    main()
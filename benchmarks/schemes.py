@@ -0,0 +1,351 @@
+"""Benchmarks the CP-ABE and KP-ABE wrappers and the policy compilers.
+
+For every requested pairing group this measures:
+
+ 1. `cpabe_setup` and `kpabe_setup`;
+ 2. `cpabe_keygen` over keys of each attribute count, and
+    `kpabe_keygen` over policies of each leaf count;
+ 3. `cpabe_encrypt` over policies of each leaf count, and
+    `kpabe_encrypt` over attribute sets of each attribute count, for
+    each payload size;
+ 4. `cpabe_decrypt` and `kpabe_decrypt` of those ciphertexts, and the
+    outsourced `cpabe_transform` and `cpabe_decrypt_transformed`;
+ 5. CP-ABE key generation, encryption and decryption with numerical
+    comparisons of each bit width;
+ 6. setup, keygen, encrypt and decrypt of any further scheme
+    registered within `pebel.schemes`, e.g. `fame`;
+ 7. decapsulation, evaluated as one product of pairings, against the
+    per-leaf pairings of the Charm schemes, and with prepared keys
+    (`--schemes pairings`);
+ 8. decapsulation with one satisfying leaf of a large header, decoding
+    every group element up front against decoding only those used
+    (`--schemes headers`).
+
+The policy compilers within `pebel.policy` are measured for each bit
+width. Latency percentiles, throughput and peak memory are printed
+and stored as JSON, see `harness.py`.
+
+Example::
+
+    python3 benchmarks/schemes.py --groups SS512 MNT224 \\
+        --leaves 1 10 100 --payloads 1K 1M 1G --out results.json
+
+"""
+
+import argparse
+import io
+import os
+
+from charm.toolbox.pairinggroup import PairingGroup
+from charm.schemes.abenc.abenc_bsw07 import CPabe_BSW07
+from charm.schemes.abenc.abenc_lsw08 import KPabe
+from charm.core.engine.util import bytesToObject
+
+from pebel.cpabe import cpabe_setup, cpabe_keygen, cpabe_encrypt, cpabe_decrypt
+from pebel.cpabe import (cpabe_outsource_keygen, cpabe_transform,
+                         cpabe_decrypt_transformed)
+from pebel.cpabe import cpabe_encapsulate, cpabe_decapsulate
+from pebel.kpabe import kpabe_encapsulate, kpabe_decapsulate
+from pebel.cpabe import _decrypt as cpabe_decrypt_header
+from pebel.kpabe import _decrypt as kpabe_decrypt_header
+from pebel.prepared import prepare_key
+from pebel.kpabe import kpabe_setup, kpabe_keygen, kpabe_encrypt, kpabe_decrypt
+from pebel import policy, schemes
+
+from harness import measure, parse_size, report, write_results
+
+
+def attributes(n):
+    """Return n distinct attribute names."""
+    return ["ATTR{0}".format(i) for i in range(n)]
+
+
+def conjunction(attrs):
+    """Return the policy requiring every attribute, the worst case for
+    decryption."""
+    return " and ".join(attrs)
+
+
+def disjunction(attrs):
+    """Return the policy requiring any one attribute."""
+    return " or ".join(attrs)
+
+
+def bench_policy(args, record):
+    """Measure the numerical policy compilers."""
+    for nbits in args.nbits:
+        value = (1 << nbits) // 3
+        record(measure(lambda: policy.convertNumericalComparison(
+                           'A', False, value, nbits), repeat=args.repeat),
+               op='convertNumericalComparison', nbits=nbits)
+        record(measure(lambda: policy.constructNumericalAttribute(
+                           'A', value, nbits), repeat=args.repeat),
+               op='constructNumericalAttribute', nbits=nbits)
+        text = policy.convertNumericalComparison('A', False, value, nbits)
+        record(measure(lambda: policy.parsePolicy(text),
+                       repeat=args.repeat),
+               op='parsePolicy', nbits=nbits)
+
+
+def bench_cpabe(group, args, record):
+    """Measure the CP-ABE wrapper over a single pairing group."""
+    name = group.groupType()
+    record(measure(lambda: cpabe_setup(group), repeat=args.repeat),
+           op='cpabe_setup', group=name)
+    mpk, msk = cpabe_setup(group)
+
+    for n in args.attributes:
+        attrs = attributes(n)
+        record(measure(lambda: cpabe_keygen(group, msk, mpk, attrs),
+                       repeat=args.repeat),
+               op='cpabe_keygen', group=name, attributes=n)
+
+    cases = [(n, conjunction(attributes(n)), attributes(n), 'leaves')
+             for n in args.leaves]
+    for nbits in args.nbits:
+        value = (1 << nbits) // 3
+        cases.append((nbits,
+                      policy.convertNumericalComparison(
+                          'NUM', False, value, nbits),
+                      [a.upper() for a in policy.constructNumericalAttribute(
+                          'NUM', value - 1, nbits)],
+                      'nbits'))
+
+    for n, pol, attrs, label in cases:
+        dkey = cpabe_keygen(group, msk, mpk, attrs)
+        tkey, rkey = cpabe_outsource_keygen(group, dkey)
+        for size in args.payloads:
+            data = os.urandom(size)
+            params = {'group': name, label: n, 'payload': size}
+            record(measure(lambda: cpabe_encrypt(group, mpk,
+                                                 io.BytesIO(data), pol),
+                           repeat=args.repeat, nbytes=size,
+                           trace_memory=args.memory),
+                   op='cpabe_encrypt', **params)
+            ctxt = cpabe_encrypt(group, mpk, io.BytesIO(data), pol)
+            record(measure(lambda: cpabe_decrypt(group, mpk, dkey,
+                                                 io.BytesIO(ctxt)),
+                           repeat=args.repeat, nbytes=size,
+                           trace_memory=args.memory),
+                   op='cpabe_decrypt', **params)
+            record(measure(lambda: cpabe_transform(group, mpk, tkey,
+                                                   io.BytesIO(ctxt)),
+                           repeat=args.repeat, nbytes=size),
+                   op='cpabe_transform', **params)
+            tctxt = cpabe_transform(group, mpk, tkey, io.BytesIO(ctxt))
+            record(measure(lambda: cpabe_decrypt_transformed(
+                               group, rkey, io.BytesIO(tctxt)),
+                           repeat=args.repeat, nbytes=size,
+                           trace_memory=args.memory),
+                   op='cpabe_decrypt_transformed', **params)
+
+
+def bench_kpabe(group, args, record):
+    """Measure the KP-ABE wrapper over a single pairing group."""
+    name = group.groupType()
+    record(measure(lambda: kpabe_setup(group), repeat=args.repeat),
+           op='kpabe_setup', group=name)
+    mpk, msk = kpabe_setup(group)
+
+    for n in args.leaves:
+        pol = conjunction(attributes(n))
+        record(measure(lambda: kpabe_keygen(group, msk, mpk, pol),
+                       repeat=args.repeat),
+               op='kpabe_keygen', group=name, leaves=n)
+
+    for n in args.attributes:
+        attrs = attributes(n)
+        dkey = kpabe_keygen(group, msk, mpk, conjunction(attrs))
+        for size in args.payloads:
+            data = os.urandom(size)
+            params = {'group': name, 'attributes': n, 'payload': size}
+            record(measure(lambda: kpabe_encrypt(group, mpk,
+                                                 io.BytesIO(data), attrs),
+                           repeat=args.repeat, nbytes=size,
+                           trace_memory=args.memory),
+                   op='kpabe_encrypt', **params)
+            ctxt = kpabe_encrypt(group, mpk, io.BytesIO(data), attrs)
+            record(measure(lambda: kpabe_decrypt(group, mpk, dkey,
+                                                 io.BytesIO(ctxt)),
+                           repeat=args.repeat, nbytes=size,
+                           trace_memory=args.memory),
+                   op='kpabe_decrypt', **params)
+
+
+def bench_pairings(group, args, record):
+    """Measure decapsulation against that of the Charm schemes, which
+    evaluate each pairing separately."""
+    name = group.groupType()
+    cp_mpk, cp_msk = cpabe_setup(group)
+    kp_mpk, kp_msk = kpabe_setup(group)
+    for n in args.leaves:
+        attrs = attributes(n)
+        pol = conjunction(attrs)
+        params = {'group': name, 'leaves': n}
+
+        dkey = cpabe_keygen(group, cp_msk, cp_mpk, attrs)
+        header = cpabe_encapsulate(group, cp_mpk, pol)[1]
+        record(measure(lambda: CPabe_BSW07(group).decrypt(
+                           cp_mpk, dkey, bytesToObject(header, group)),
+                       repeat=args.repeat),
+               op='cpabe_decapsulate_charm', **params)
+        record(measure(lambda: cpabe_decapsulate(group, cp_mpk, dkey,
+                                                 header),
+                       repeat=args.repeat),
+               op='cpabe_decapsulate', **params)
+        prepared = prepare_key(group, dkey)
+        record(measure(lambda: cpabe_decapsulate(group, cp_mpk, prepared,
+                                                 header),
+                       repeat=args.repeat),
+               op='cpabe_decapsulate_prepared', **params)
+
+        dkey = kpabe_keygen(group, kp_msk, kp_mpk, pol)
+        header = kpabe_encapsulate(group, kp_mpk, attrs)[1]
+        record(measure(lambda: KPabe(group).decrypt(
+                           bytesToObject(header, group), dkey),
+                       repeat=args.repeat),
+               op='kpabe_decapsulate_charm', **params)
+        record(measure(lambda: kpabe_decapsulate(group, kp_mpk, dkey,
+                                                 header),
+                       repeat=args.repeat),
+               op='kpabe_decapsulate', **params)
+        prepared = prepare_key(group, dkey)
+        record(measure(lambda: kpabe_decapsulate(group, kp_mpk, prepared,
+                                                 header),
+                       repeat=args.repeat),
+               op='kpabe_decapsulate_prepared', **params)
+
+
+def bench_headers(group, args, record):
+    """Measure decapsulation of headers of which a single leaf is used,
+    decoding the whole header against decoding it lazily."""
+    name = group.groupType()
+    cp_mpk, cp_msk = cpabe_setup(group)
+    kp_mpk, kp_msk = kpabe_setup(group)
+    for n in args.leaves:
+        attrs = attributes(n)
+        params = {'group': name, 'leaves': n}
+
+        dkey = cpabe_keygen(group, cp_msk, cp_mpk, attrs[-1:])
+        header = cpabe_encapsulate(group, cp_mpk, disjunction(attrs))[1]
+        record(measure(lambda: cpabe_decrypt_header(
+                           group, dkey, bytesToObject(header, group)),
+                       repeat=args.repeat),
+               op='cpabe_decapsulate_eager', **params)
+        record(measure(lambda: cpabe_decapsulate(group, cp_mpk, dkey,
+                                                 header),
+                       repeat=args.repeat),
+               op='cpabe_decapsulate', **params)
+
+        dkey = kpabe_keygen(group, kp_msk, kp_mpk, attrs[-1])
+        header = kpabe_encapsulate(group, kp_mpk, attrs)[1]
+        record(measure(lambda: kpabe_decrypt_header(
+                           group, dkey, bytesToObject(header, group)),
+                       repeat=args.repeat),
+               op='kpabe_decapsulate_eager', **params)
+        record(measure(lambda: kpabe_decapsulate(group, kp_mpk, dkey,
+                                                 header),
+                       repeat=args.repeat),
+               op='kpabe_decapsulate', **params)
+
+
+def bench_registered(name, group, args, record):
+    """Measure a scheme of `pebel.schemes` over a single pairing group."""
+    scheme = schemes.get_scheme(name)
+    gname = group.groupType()
+    record(measure(lambda: scheme.setup(group), repeat=args.repeat),
+           op=name + '_setup', group=gname)
+    mpk, msk = scheme.setup(group)
+
+    for n in args.leaves:
+        attrs = attributes(n)
+        pol = conjunction(attrs)
+        key_access, enc_access = ((attrs, pol) if scheme.kind == 'cp'
+                                  else (pol, attrs))
+        record(measure(lambda: scheme.keygen(group, msk, mpk, key_access),
+                       repeat=args.repeat),
+               op=name + '_keygen', group=gname, leaves=n)
+        dkey = scheme.keygen(group, msk, mpk, key_access)
+        for size in args.payloads:
+            data = os.urandom(size)
+            params = {'group': gname, 'leaves': n, 'payload': size}
+            record(measure(lambda: schemes.encrypt(group, mpk,
+                                                   io.BytesIO(data),
+                                                   enc_access, name),
+                           repeat=args.repeat, nbytes=size,
+                           trace_memory=args.memory),
+                   op=name + '_encrypt', **params)
+            ctxt = schemes.encrypt(group, mpk, io.BytesIO(data),
+                                   enc_access, name)
+            record(measure(lambda: schemes.decrypt(group, mpk, dkey,
+                                                   io.BytesIO(ctxt)),
+                           repeat=args.repeat, nbytes=size,
+                           trace_memory=args.memory),
+                   op=name + '_decrypt', **params)
+
+
+def main():
+    """Run the benchmarks selected on the command line."""
+    parser = argparse.ArgumentParser(
+        description="Benchmarks setup, keygen, encrypt and decrypt of the"
+        " CP-ABE and KP-ABE schemes, and the policy compilers.")
+    parser.add_argument('--groups', nargs='+', default=['SS512', 'MNT224'],
+                        help="Pairing groups to measure."
+                        " Default: %(default)s")
+    parser.add_argument('--schemes', nargs='+', default=['cpabe', 'kpabe'],
+                        choices=['cpabe', 'kpabe', 'pairings',
+                                 'headers', 'policy'] + [
+                            name for name in schemes.list_schemes()
+                            if name not in ('bsw07', 'lsw08')],
+                        help="Benchmarks to run. Default: %(default)s")
+    parser.add_argument('--leaves', nargs='+', type=int,
+                        default=[1, 10, 50],
+                        help="Policy leaf counts. Default: %(default)s")
+    parser.add_argument('--attributes', nargs='+', type=int,
+                        default=[1, 10, 50],
+                        help="Attribute counts. Default: %(default)s")
+    parser.add_argument('--nbits', nargs='+', type=int, default=[8, 32],
+                        help="Numerical attribute bit widths."
+                        " Default: %(default)s")
+    parser.add_argument('--payloads', nargs='+', type=parse_size,
+                        default=[parse_size('1K'), parse_size('1M')],
+                        help="Payload sizes, e.g. 1K 1M 1G."
+                        " Default: %(default)s")
+    parser.add_argument('--repeat', type=int, default=10,
+                        help="Timed repetitions per measurement."
+                        " Default: %(default)s")
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help="Skip tracing the peak memory of encryption"
+                        " and decryption, which slows large payloads.")
+    parser.add_argument('--out', default="schemes.json",
+                        help="File in which to store the results."
+                        " Default: %(default)s")
+    args = parser.parse_args()
+
+    results = []
+
+    def record(stats, **params):
+        params['stats'] = stats
+        results.append(params)
+        report(params)
+
+    if 'policy' in args.schemes:
+        bench_policy(args, record)
+    for name in args.groups:
+        if 'cpabe' in args.schemes:
+            bench_cpabe(PairingGroup(name), args, record)
+        if 'kpabe' in args.schemes:
+            bench_kpabe(PairingGroup(name), args, record)
+        if 'pairings' in args.schemes:
+            bench_pairings(PairingGroup(name), args, record)
+        if 'headers' in args.schemes:
+            bench_headers(PairingGroup(name), args, record)
+        for scheme in args.schemes:
+            if scheme in schemes.list_schemes():
+                bench_registered(scheme, PairingGroup(name), args, record)
+
+    parameters = dict(vars(args))
+    write_results(args.out, 'schemes', parameters, results)
+
+if __name__ == '__main__':
+    main()
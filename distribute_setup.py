@@ -13,7 +13,16 @@ setup(
              'scripts/pyKPABE-decrypt.py',
              'scripts/pyKPABE-encrypt.py',
              'scripts/pyKPABE-keygen.py',
-             'scripts/pyKPABE-setup.py'],
+             'scripts/pyKPABE-setup.py',
+             'scripts/pyPEBEL-index.py',
+             'scripts/pyPEBEL-tune.py',
+             'scripts/pyPEBEL-archive.py',
+             'scripts/pyPEBEL-rewrap.py',
+             'scripts/pyCPABE-outsource.py',
+             'scripts/pyPEBEL-abe.py',
+             'scripts/pyPEBEL-epoch.py',
+             'scripts/pyPEBEL-tree.py',
+             'scripts/pyPEBEL-keystore.py'],
     url='https://github.com/jfdm/pyPEBEL',
     license='BSD-new',
     description='A python 3.x module to support the use of the IBE, ABE, and PBE family of asymmetric encryption schemes within python scripts and modules.',
@@ -24,6 +33,10 @@ setup(
         "pycrypto >= 2.6",
         "Charm-Crypto >= 0.42",
     ],
+    extras_require={
+        "numpy": ["numpy"],
+        "records": ["cryptography"],
+    },
     classifiers = [
         "Programming Language :: Python",
         "Programming Language :: Python :: 3",
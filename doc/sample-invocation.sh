@@ -15,10 +15,13 @@ reprehenderit in voluptate velit esse cillum dolore eu fugiat nulla
 pariatur. Excepteur sint occaecat cupidatat non proident, sunt in
 culpa qui officia deserunt mollit anim id est laborum." > myfile.data
 
+## ------------------------------------------------------------------ [ Tuning ]
+pyPEBEL-tune.py --scheme cpabe --security 80 --mix keygen=1,encrypt=10,decrypt=10
+
 ## ------------------------------------------------------------------ [ CP-ABE ]
 
 ## ------------------------------------------------------------------- [ Setup ]
-pyCPABE-setup.py
+pyCPABE-setup.py --group SS512
 
 ## ------------------------------------------------------------------ [ KeyGen ]
 pyCPABE-keygen.py \
@@ -39,6 +42,9 @@ pyCPABE-encrypt.py \
     --ptxt myfile.data \
     '(ONE and TWO) or THREE'
 
+pyPEBEL-abe.py encrypt --mpk cp.mpk --ptxt server.log --compress auto \
+    'ONE and TWO'
+
 ## ----------------------------------------------------------------- [ Decrypt ]
 pyCPABE-decrypt.py \
     --mpk cp.mpk \
@@ -50,6 +56,17 @@ pyCPABE-decrypt.py \
     --ctxt myfile.data.cpabe \
     --dkey wrong.cpabe.dkey
 
+## -------------------------------------------------------------- [ Outsource ]
+pyCPABE-outsource.py --mpk cp.mpk \
+    keygen --dkey right.cpabe.dkey --tkey-out right.cpabe.tkey \
+    --rkey-out right.cpabe.rkey
+
+pyCPABE-outsource.py --mpk cp.mpk \
+    transform --tkey right.cpabe.tkey --ctxt myfile.data.cpabe
+
+pyCPABE-outsource.py --mpk cp.mpk \
+    decrypt --rkey right.cpabe.rkey --ctxt myfile.data.cpabe.tx
+
 ## ------------------------------------------------------------------ [ KP-ABE ]
 
 ## ------------------------------------------------------------------- [ Setup ]
@@ -84,5 +101,52 @@ pyKPABE-decrypt.py \
     --ctxt myfile.data.cpabe \
     --dkey wrong.kpabe.dkey
 
+## ------------------------------------------------------------------- [ Index ]
+pyPEBEL-index.py --index my.index add myfile.data.cpabe
+
+pyPEBEL-index.py --index my.index query --dkey right.cpabe.dkey
+
+## ----------------------------------------------------------------- [ Schemes ]
+pyPEBEL-abe.py --scheme fame setup
+pyPEBEL-abe.py --scheme fame keygen --mpk abe.mpk --msk abe.msk one two
+pyPEBEL-abe.py --scheme fame encrypt --mpk abe.mpk --ptxt myfile.data \
+    'ONE and TWO'
+pyPEBEL-abe.py decrypt --mpk abe.mpk --dkey bob.abe.dkey \
+    --ctxt myfile.data.abe
+
+## ----------------------------------------------------------------- [ Archive ]
+pyPEBEL-archive.py --mpk cp.mpk --archive docs.par \
+    create --policy '(ONE and TWO) or THREE' doc
+
+pyPEBEL-archive.py --mpk cp.mpk --archive docs.par \
+    list --dkey right.cpabe.dkey
+
+pyPEBEL-archive.py --mpk cp.mpk --archive docs.par \
+    extract --dkey right.cpabe.dkey --path extracted doc/sample-invocation.sh
+
+## ------------------------------------------------------------------ [ Rewrap ]
+pyPEBEL-rewrap.py --mpk cp.mpk --dkey right.cpabe.dkey \
+    --policy 'ONE and TWO' docs.par
+
+pyPEBEL-rewrap.py --mpk kp.mpk --dkey right.kpabe.dkey \
+    --attributes ONE TWO --jobs 4 *.kpabe
+
+## ------------------------------------------------------------------ [ Epochs ]
+pyPEBEL-epoch.py --mpk cp.mpk keygen --msk cp.msk --valid-for 7 \
+    --dkey-out week.cpabe.dkey one two
+pyPEBEL-epoch.py --mpk cp.mpk encrypt --ptxt myfile.data 'ONE and TWO'
+pyPEBEL-epoch.py --mpk cp.mpk expiring --within 2 *.dkey
+pyPEBEL-epoch.py --mpk cp.mpk renew --msk cp.msk --within 2 --jobs 4 *.dkey
+
+## -------------------------------------------------------------------- [ Tree ]
+pyPEBEL-tree.py --mpk cp.mpk --jobs 4 --compress auto doc doc.abe \
+    'ONE and TWO'
+
+## --------------------------------------------------------------- [ Key store ]
+pyPEBEL-keystore.py build --out keys.pks mpk=cp.mpk right.cpabe.dkey \
+    wrong.cpabe.dkey
+pyPEBEL-keystore.py list keys.pks
+
 ## ----------------------------------------------------------------- [ Cleanup ]
-rm -i *.dkey *.mpk *.msk *.cpabe *.kpabe
+rm -i *.dkey *.tkey *.rkey *.mpk *.msk *.cpabe *.cpabe.tx *.kpabe *.abe *.index *.par *.pks
+rm -ri doc.abe
@@ -0,0 +1,238 @@
+"""@package pebel.archive
+
+Provides an archive of many files encrypted under a single encapsulated
+session key.
+
+Encrypting many small files individually requires an ABE encapsulation
+per file, and an ABE decapsulation per file to read them back. An
+archive instead encapsulates a single session key, using either the
+CP-ABE or KP-ABE scheme, and encrypts each member with its own random
+nonce under the key derived from it. An index of the members is stored
+encrypted at the end of the archive, such that a reader decapsulates
+once and can then extract any subset of members directly, without
+reading the others.
+
+The members are encrypted using 256-bit AES in CTR mode, with a 64-bit
+random nonce prefixing a 64-bit block counter.
+
+The archive is a linear combination of:
+
+ 1. The magic bytes `PEBELAR1`.
+ 2. The identifier of the scheme, see `pebel.schemes`, as an unsigned
+    byte.
+ 3. The size in bytes of the encrypted session key.
+ 4. The encrypted session key.
+ 5. Each member, as its nonce followed by its encrypted contents.
+ 6. The index, as its nonce followed by its encrypted JSON encoding.
+ 7. The offset and size of the index, and the magic bytes again.
+
+@author Jan de Muijnck-Hughes <jfdm@st-andrews.ac.uk>
+
+"""
+
+import io
+import json
+import os
+import struct
+
+from Crypto import Random
+
+from pebel.exceptions import PebelException
+from pebel.schemes import get_scheme, select_scheme
+from pebel.util import (resolve_group, read_structure, derive_key,
+                        ctr_cipher, NONCE_SIZE)
+
+MAGIC = b'PEBELAR1'
+
+## The size of the chunks in which members are read and encrypted.
+CHUNK_SIZE = 2**16
+
+_HEADER = struct.Struct('<BQ')
+_TRAILER = struct.Struct('<QQ8s')
+
+
+class ArchiveWriter:
+    """Writes an archive to a binary file object.
+
+    Exactly one of policy, for CP-ABE, or attributes, for KP-ABE, must
+    be given. The file object need not be seekable.
+    """
+    def __init__(self, f, group, mpk, policy=None, attributes=None,
+                 scheme=None):
+        """Encapsulate the session key and write the archive header.
+
+        @param f          The binary file object to write to.
+        @param group      The `PairingGroup` used within the underlying
+        crypto.
+        @param mpk        The Master Public Key of the scheme.
+        @param policy     The policy `str` used with CP-ABE.
+        @param attributes The `str` attributes used with KP-ABE.
+        @param scheme     The name (`str`) of the scheme, by default
+        that of `pebel.schemes.DEFAULT_SCHEMES` for its kind.
+        """
+        scheme, access = select_scheme(policy, attributes, scheme)
+        session_key, session_key_ctxt_b = scheme.encapsulate(
+            group, mpk, access)
+        self._f = f
+        self._key = derive_key(session_key)
+        self._members = []
+        self._names = set()
+        self._offset = 0
+        self._write(MAGIC)
+        self._write(_HEADER.pack(scheme.ident, len(session_key_ctxt_b)))
+        self._write(session_key_ctxt_b)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+    def add(self, name, data):
+        """Encrypt and append a member.
+
+        @param name The name (`str`) of the member.
+        @param data The member contents, as `bytes` or a binary file
+        object.
+        """
+        if name in self._names:
+            raise PebelException(
+                "Duplicate archive member: {0}".format(name))
+        if isinstance(data, (bytes, bytearray)):
+            data = io.BytesIO(data)
+        nonce = Random.new().read(NONCE_SIZE)
+        cipher = ctr_cipher(self._key, nonce)
+        offset = self._offset
+        self._write(nonce)
+        size = 0
+        while True:
+            chunk = data.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            self._write(cipher.encrypt(chunk))
+        self._names.add(name)
+        self._members.append((name, offset, size))
+
+    def add_file(self, fname, arcname=None):
+        """Encrypt and append the named file.
+
+        @param fname   The name of the file (`str`) to add.
+        @param arcname The name of the member, by default fname.
+        """
+        with io.open(fname, 'rb') as data:
+            self.add(fname if arcname is None else arcname, data)
+
+    def close(self):
+        """Write the index and trailer. The file object is not closed."""
+        if self._key is None:
+            return
+        index = json.dumps(self._members).encode('utf-8')
+        nonce = Random.new().read(NONCE_SIZE)
+        offset = self._offset
+        self._write(nonce)
+        self._write(ctr_cipher(self._key, nonce).encrypt(index))
+        self._write(_TRAILER.pack(offset, self._offset - offset, MAGIC))
+        self._f.flush()
+        self._key = None
+
+    def _write(self, data):
+        self._f.write(data)
+        self._offset += len(data)
+
+
+class ArchiveReader:
+    """Reads selected members from an archive.
+
+    The session key is decapsulated once, when the reader is
+    constructed. The file object must be seekable.
+    """
+    def __init__(self, f, mpk, deckey, group=None):
+        """Decapsulate the session key and read the index.
+
+        @param f      The seekable binary file object to read from.
+        @param mpk    The Master Public Key of type `pk_t`.
+        @param deckey The decryption key of type `sk_t`.
+        @param group  The `PairingGroup` used within the underlying
+        crypto, or None to use the group recorded in the archive.
+
+        @throws PebelDecryptionException If deckey cannot decrypt the
+        archive.
+        @throws PebelException If the file is not an archive.
+        """
+        self._f = f
+        f.seek(0)
+        if f.read(len(MAGIC)) != MAGIC:
+            raise PebelException("Not a pebel archive.")
+        ident, size = _HEADER.unpack(f.read(_HEADER.size))
+        scheme = get_scheme(ident)
+        session_key_ctxt_b = f.read(size)
+        structure = read_structure(session_key_ctxt_b)
+        group = resolve_group(group, structure)
+        self._key = derive_key(scheme.decapsulate(
+            group, mpk, deckey, session_key_ctxt_b, structure=structure))
+
+        f.seek(-_TRAILER.size, os.SEEK_END)
+        offset, size, magic = _TRAILER.unpack(f.read(_TRAILER.size))
+        if magic != MAGIC:
+            raise PebelException("Truncated pebel archive.")
+        f.seek(offset)
+        nonce = f.read(NONCE_SIZE)
+        index = ctr_cipher(self._key, nonce).decrypt(
+            f.read(size - NONCE_SIZE))
+        self._members = dict((name, (offset, size)) for name, offset, size
+                             in json.loads(index.decode('utf-8')))
+
+    def names(self):
+        """Return the names of the members, in archive order."""
+        return sorted(self._members, key=lambda n: self._members[n][0])
+
+    def size(self, name):
+        """Return the size in bytes of the named member."""
+        return self._members[name][1]
+
+    def extract(self, name, out):
+        """Decrypt the named member to a binary file object.
+
+        @param name The name (`str`) of the member.
+        @param out  The binary file object to write to.
+        """
+        try:
+            offset, size = self._members[name]
+        except KeyError:
+            raise PebelException("No such archive member: {0}".format(name))
+        self._f.seek(offset)
+        cipher = ctr_cipher(self._key, self._f.read(NONCE_SIZE))
+        while size:
+            chunk = self._f.read(min(size, CHUNK_SIZE))
+            if not chunk:
+                raise PebelException("Truncated pebel archive.")
+            size -= len(chunk)
+            out.write(cipher.decrypt(chunk))
+
+    def read(self, name):
+        """Return the decrypted contents of the named member as `bytes`."""
+        out = io.BytesIO()
+        self.extract(name, out)
+        return out.getvalue()
+
+    def extractall(self, path=".", names=None):
+        """Decrypt members into files beneath a directory.
+
+        Member names that are absolute, or that would escape the
+        directory, are rejected.
+
+        @param path  The directory (`str`) to extract to.
+        @param names The names of the members to extract, by default all.
+        """
+        root = os.path.abspath(path)
+        for name in self.names() if names is None else names:
+            dest = os.path.abspath(os.path.join(root, name))
+            if os.path.isabs(name) or \
+                    os.path.commonpath([root, dest]) != root:
+                raise PebelException(
+                    "Unsafe archive member name: {0}".format(name))
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            with io.open(dest, 'wb') as out:
+                self.extract(name, out)
@@ -0,0 +1,158 @@
+"""@package pebel.compress
+
+Optional compression of payloads prior to their symmetric encryption.
+
+Ciphertexts do not compress, so compressible payloads, such as logs,
+must be compressed before they are encrypted if they are to be stored
+or sent in fewer bytes. The codecs of the standard library are
+supported:
+
+ - `zlib` fast, with a moderate ratio.
+ - `bz2`  slower, with a better ratio on text.
+ - `lzma` slowest, with the best ratio.
+
+Compression is streamed within the chunked DEM loop, so payloads are
+never held in memory twice. The codec used is recorded within the
+encrypted session key, and ciphertexts that record none are not
+compressed, as is the case for those written by earlier versions.
+
+With `AUTO` the start of the payload is compressed on trial with the
+fastest level of zlib, and compression is skipped when the payload
+does not shrink enough, as is the case for media or archives that are
+already compressed.
+
+@author Jan de Muijnck-Hughes <jfdm@st-andrews.ac.uk>
+
+"""
+
+import bz2
+import itertools
+import lzma
+import zlib
+
+from pebel.exceptions import PebelException, PebelDecryptionException
+from pebel.groups import COMPRESSION_FIELD
+from pebel.util import read_structure, read_data
+
+## Choose whether to compress by sampling the payload.
+AUTO = 'auto'
+
+## The codecs available, by the name recorded within ciphertexts.
+CODECS = {
+    'zlib': (zlib.compressobj, zlib.decompressobj),
+    'bz2': (bz2.BZ2Compressor, bz2.BZ2Decompressor),
+    'lzma': (lzma.LZMACompressor, lzma.LZMADecompressor),
+}
+
+## The codec chosen by `AUTO` for compressible payloads.
+AUTO_CODEC = 'zlib'
+
+## The number of bytes sampled by `AUTO`.
+SAMPLE_SIZE = 2**16
+
+## The largest ratio of compressed to original sample size for which
+## `AUTO` compresses.
+AUTO_RATIO = 0.9
+
+## The size of the chunks read from payloads.
+CHUNK_SIZE = 2**16
+
+
+def _codec(name):
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise PebelException("Unknown compression: {0}".format(name))
+
+
+def detect_compression(sample, ratio=AUTO_RATIO):
+    """Decide whether a payload is worth compressing.
+
+    @param sample The first bytes of the payload.
+    @param ratio  The largest ratio of compressed to original size for
+    which to compress.
+
+    @return The name (`str`) of the codec to use, or None.
+    """
+    if not sample:
+        return None
+    if len(zlib.compress(sample, 1)) > ratio * len(sample):
+        return None
+    return AUTO_CODEC
+
+
+def compress_data(bin_data, compression=None, chunksize=CHUNK_SIZE):
+    """Read a payload in chunks, compressing it.
+
+    @param bin_data    The `bytearray` resulting from `io.open` or
+    `io.BytesIO` containing the payload.
+    @param compression The name (`str`) of the codec, `AUTO`, or None.
+    @param chunksize   The size of the chunks read.
+
+    @return A tuple `(compression, chunks)` of the name of the codec
+    used, or None if the payload is not compressed, and a generator of
+    the compressed chunks.
+    """
+    chunks = read_data(bin_data=bin_data, chunksize=chunksize)
+    if compression == AUTO:
+        sample = bytearray()
+        for chunk in chunks:
+            sample += chunk
+            if len(sample) >= SAMPLE_SIZE:
+                break
+        compression = detect_compression(bytes(sample))
+        chunks = itertools.chain([bytes(sample)], chunks)
+    if compression is None:
+        return None, chunks
+    return compression, _compress(_codec(compression)[0](), chunks)
+
+
+def _compress(compressor, chunks):
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def decompress_data(chunks, compression=None):
+    """Decompress a payload in chunks.
+
+    @param chunks      An iterable of the compressed chunks.
+    @param compression The name (`str`) of the codec, or None if the
+    payload is not compressed.
+
+    @return A generator of the decompressed chunks.
+
+    @throws PebelException If the codec is unknown.
+    @throws PebelDecryptionException If the payload is truncated.
+    """
+    if compression is None:
+        return iter(chunks)
+    return _decompress(_codec(compression)[1](), chunks)
+
+
+def _decompress(decompressor, chunks):
+    for chunk in chunks:
+        out = decompressor.decompress(chunk)
+        if out:
+            yield out
+    if hasattr(decompressor, 'flush'):
+        yield decompressor.flush()
+    if not decompressor.eof:
+        raise PebelDecryptionException("Truncated compressed payload.")
+
+
+def read_compression(session_key_ctxt_b):
+    """Find the codec recorded within an encrypted session key.
+
+    @param session_key_ctxt_b The serialised encrypted session key, or
+    its structure as returned by `pebel.util.read_structure`.
+
+    @return The name (`str`) of the codec, or None if the payload is
+    not compressed.
+    """
+    obj = read_structure(session_key_ctxt_b)
+    if isinstance(obj, dict):
+        return obj.get(COMPRESSION_FIELD)
+    return None
@@ -26,6 +26,21 @@ The generated ciphertext is a linear combination of:
  3. The encrypted session key.
  4. The AES encrypted plaintext.
 
+The encrypted session key records the names of the pairing group and
+scheme used, such that the group need not be known in advance to
+decrypt and the scheme can be chosen by `pebel.schemes`. It also
+records the codec, if any, with which the plaintext was compressed
+before encryption, see `pebel.compress`.
+
+Decryption may be outsourced, following Green2011oda. A decryption key
+is split by `cpabe_outsource_keygen` into a transformation key, which
+is blinded and may be handed to an untrusted server, and a retrieval
+key kept by the client. The server uses `cpabe_transform` to perform
+the pairings of decryption, replacing the encrypted session key with a
+transformed one, and the client completes decryption with
+`cpabe_decrypt_transformed` at the cost of a single exponentiation in
+GT. Transformed ciphertexts share the layout above.
+
 @author Jan de Muijnck-Hughes <jfdm@st-andrews.ac.uk>
 
 """
@@ -35,6 +50,7 @@ The generated ciphertext is a linear combination of:
 @example pyCPABE-keygen.py  Example use of the `cpabe_keygen` function.
 @example pyCPABE-encrypt.py Example use of the `cpabe_encrypt` function.
 @example pyCPABE-decrypt.py Example use of the `cpabe_decrypt` function.
+@example pyCPABE-outsource.py Example use of outsourced decryption.
 """
 
 import io
@@ -42,21 +58,48 @@ import sys
 import struct
 import os
 
-from charm.toolbox.pairinggroup import PairingGroup, GT
+from charm.toolbox.pairinggroup import PairingGroup, GT, G2, ZR
 from charm.schemes.abenc.abenc_bsw07 import CPabe_BSW07
 from charm.core.engine.util import objectToBytes, bytesToObject
-from charm.core.math.pairing import hashPair as sha
 
 from Crypto.Cipher import AES
 from Crypto import Random
 
-from pebel.exceptions import PebelDecryptionException
+from pebel import instrument
+from pebel.compress import (
+    CHUNK_SIZE,
+    compress_data,
+    decompress_data,
+    read_compression
+)
+from pebel.exceptions import PebelException, PebelDecryptionException
+from pebel.groups import (
+    GROUP_FIELD,
+    SCHEME_FIELD,
+    COMPRESSION_FIELD,
+    PREPARED_FIELD
+)
+from pebel.hashcache import get_hash_cache
+from pebel.parallel import parallel_leaves, leaf_components, EncodedGroup
+from pebel.policycache import compile_policy
 from pebel.util import (
     write_key_to_file,
     read_key_from_file,
+    read_ciphertext_header,
+    read_structure,
+    read_structure_lazily,
+    resolve_group,
+    check_group,
+    check_scheme,
+    pair_product,
+    precompute,
+    derive_key,
     read_data
 )
 
+## The name of the scheme, as recorded within encrypted session keys.
+SCHEME = 'bsw07'
+
 
 def cpabe_setup(group):
     """Generates master key pair for the Bethencourt2007cae CP-ABE Scheme.
@@ -83,43 +126,263 @@ def cpabe_keygen(group, msk, mpk, attributes):
              the CPabe_BSW07 Scheme.
 
     """
-    return CPabe_BSW07(group).keygen(mpk, msk, attributes)
+    return CPabe_BSW07(get_hash_cache(group)).keygen(mpk, msk, attributes)
 
 
-def cpabe_encrypt(group, mpk, ptxt, policy):
-    """Encrypts a plain-text using the Bethencourt2007cae CP-ABE Scheme.
+def cpabe_encapsulate(group, mpk, policy, trace=None, session_key=None,
+                      compression=None):
+    """Encapsulates a fresh session key using the Bethencourt2007cae
+    CP-ABE Scheme.
+
+    @param group The `PairingGroup` used within the underlying crypto.
+    @param mpk   The Master Public Key of type `pk_t`.
+    @param policy The `str` policy under which to encapsulate the
+                  session key.
+    @param trace An optional `pebel.instrument.Trace` to report to.
+    @param session_key The session key to encapsulate. By default a
+                       fresh session key is chosen.
+    @param compression The name (`str`) of the codec with which the
+                       payload is compressed, recorded within the
+                       encrypted session key, or None.
+
+    @return A tuple `(session_key, session_key_ctxt_b)` containing the
+            session key, an element of GT, and its serialised encryption.
+
+    """
+    intermediate = cpabe_encapsulate_offline(group, mpk, session_key)
+    return cpabe_encapsulate_online(group, mpk, intermediate, policy, trace,
+                                    compression)
+
 
+def cpabe_encapsulate_offline(group, mpk, session_key=None):
+    """Precomputes the policy independent part of an encapsulation
+    using the Bethencourt2007cae CP-ABE Scheme.
+
+    This comprises the fresh session key, the secret exponent s and
+    the elements `C_tilde` and `C`, including the exponentiation in GT.
 
     @param group The `PairingGroup` used within the underlying crypto.
     @param mpk   The Master Public Key of type `pk_t`.
-    @param ptxt The `bytearray` resulting from io.open or io.IOBytes
-                 containing the plaintext.
-    @param policy The `str` policy used to encrypt the plaintext.
+    @param session_key The session key to encapsulate. By default a
+                       fresh session key is chosen.
 
-    @return The encrypted data returned as a `bytearray`.
+    @return An intermediate encapsulation for use, once, with
+            `cpabe_encapsulate_online`.
 
     """
-    cpabe = CPabe_BSW07(group)
+    if session_key is None:
+        session_key = group.random(GT)
+    s = group.random(ZR)
+    return {
+        'session_key': session_key,
+        's': s,
+        'C_tilde': (mpk['e_gg_alpha'] ** s) * session_key,
+        'C': mpk['h'] ** s
+    }
+
+
+def cpabe_encapsulate_online(group, mpk, intermediate, policy, trace=None,
+                             compression=None):
+    """Completes an intermediate encapsulation under a policy.
+
+    The result is identical in form to that of `cpabe_encapsulate`,
+    only the exponentiations for each leaf of the policy remain. The
+    policy is parsed once and shared out using its cached layout, see
+    `pebel.policycache`. The leaves of large policies are computed in
+    parallel once enabled, see `pebel.parallel`.
 
-    session_key = group.random(GT)
-    session_key_ctxt = cpabe.encrypt(mpk, session_key, policy)
+    @param group The `PairingGroup` used within the underlying crypto.
+    @param mpk   The Master Public Key of type `pk_t`.
+    @param intermediate The result of `cpabe_encapsulate_offline`.
+    @param policy The `str` policy under which to encapsulate the
+                  session key.
+    @param trace An optional `pebel.instrument.Trace` to report to.
+    @param compression The name (`str`) of the codec with which the
+                       payload is compressed, recorded within the
+                       encrypted session key, or None.
 
-    ctxt = io.BytesIO()
+    @return A tuple `(session_key, session_key_ctxt_b)` containing the
+            session key, an element of GT, and its serialised encryption.
 
-    iv = Random.new().read(AES.block_size)
-    symcipher = AES.new(sha(session_key)[0:32], AES.MODE_CFB, iv)
+    """
+    compiled = compile_policy(policy)
+    shares = compiled.shares(group, intermediate['s'])
+    serializer = group
+    if parallel_leaves(len(shares)):
+        C_y, C_y_pr = leaf_components(group, mpk['g'], shares,
+                                      compiled.names)
+        serializer = EncodedGroup(group)
+    else:
+        hashes = get_hash_cache(group)
+        C_y, C_y_pr = {}, {}
+        for i, share in shares.items():
+            C_y[i] = mpk['g'] ** share
+            C_y_pr[i] = hashes.hash(compiled.names[i], G2) ** share
+    session_key_ctxt = {
+        'C_tilde': intermediate['C_tilde'],
+        'C': intermediate['C'],
+        'Cy': C_y,
+        'Cyp': C_y_pr,
+        'policy': policy,
+        'attributes': list(compiled.attributes),
+        GROUP_FIELD: group.groupType(),
+        SCHEME_FIELD: SCHEME
+    }
+    if compression is not None:
+        session_key_ctxt[COMPRESSION_FIELD] = compression
+    if trace: trace.mark('kem')
+    session_key_ctxt_b = objectToBytes(session_key_ctxt, serializer)
+    if trace: trace.mark('serialize', header=len(session_key_ctxt_b))
+    return intermediate['session_key'], session_key_ctxt_b
+
+
+def _decrypt(group, deckey, session_key_ctxt):
+    """Decrypts an encrypted session key as `CPabe_BSW07.decrypt`, but
+    evaluating every pairing as a single product of pairings.
+
+    The Lagrange coefficients are moved from GT into the exponents of
+    the arguments in G1, and the divisions into their inverses, i.e.
+
+        C_tilde e(C^-1, D) prod_j e(C_j^z_j, D_j) e(D'_j^-z_j, C'_j)
+
+    For keys prepared by `cpabe_prepare_key` every exponentiation is
+    of a fixed element of the key, using its precomputed table, i.e.
+
+        C_tilde e(C, D^-1) prod_j e(C_j, D_j^z_j) e(D'_j^-z_j, C'_j)
+
+    @return The session key, or False if the attributes of deckey do
+            not satisfy the policy.
+    """
+    policy = compile_policy(session_key_ctxt['policy'])
+    pruned = policy.prune(deckey['S'])
+    if not pruned:
+        return False
+    z = policy.coefficients(group)
+    prepared = deckey.get(PREPARED_FIELD, False)
+    if prepared:
+        lhs = [session_key_ctxt['C']]
+        rhs = [deckey['D_inv']]
+    else:
+        lhs = [session_key_ctxt['C'] ** -1]
+        rhs = [deckey['D']]
+    for leaf in pruned:
+        j = leaf.getAttributeAndIndex()
+        k = leaf.getAttribute()
+        if prepared:
+            lhs.append(session_key_ctxt['Cy'][j])
+            rhs.append(deckey['Dj'][k] ** z[j])
+        else:
+            lhs.append(session_key_ctxt['Cy'][j] ** z[j])
+            rhs.append(deckey['Dj'][k])
+        lhs.append(deckey['Djp'][k] ** -z[j])
+        rhs.append(session_key_ctxt['Cyp'][j])
+    return session_key_ctxt['C_tilde'] * pair_product(group, lhs, rhs)
+
+
+def cpabe_prepare_key(group, deckey):
+    """Prepares a decryption key, or transformation key, for repeated
+    decryption.
+
+    The tables used to raise the elements of the key to the
+    coefficients of each policy are precomputed, in place, and the
+    inverse of D is kept, such that decryption only exponentiates
+    fixed elements. Prepared keys are used as any other key, but the
+    tables are held in memory only and are not serialised.
+
+    @param group  The `PairingGroup` used within the underlying crypto.
+    @param deckey The decryption key of type `sk_t`.
+
+    @return The prepared decryption key.
+
+    """
+    if deckey.get(PREPARED_FIELD):
+        return deckey
+    prepared = dict(deckey)
+    prepared['Dj'] = {k: precompute(v) for k, v in deckey['Dj'].items()}
+    prepared['Djp'] = {k: precompute(v) for k, v in deckey['Djp'].items()}
+    prepared['D_inv'] = deckey['D'] ** -1
+    prepared[PREPARED_FIELD] = True
+    return prepared
+
+
+def cpabe_decapsulate(group, mpk, deckey, session_key_ctxt_b, trace=None,
+                      structure=None):
+    """Recovers a session key encapsulated using the Bethencourt2007cae
+    CP-ABE Scheme.
+
+    @param group  The `PairingGroup` used within the underlying crypto.
+    @param mpk    The Master Public Key of type `pk_t`.
+    @param deckey The decryption key of type `sk_t`.
+    @param session_key_ctxt_b The serialised encryption of the session key.
+    @param trace  An optional `pebel.instrument.Trace` to report to.
+    @param structure The structure of session_key_ctxt_b, as returned by
+    `pebel.util.read_structure`, if already read.
+
+    @return The session key, an element of GT.
+
+    @throws PebelDecryptionException If deckey cannot decrypt the
+            session key.
+    @throws PebelException If the session key was encapsulated within a
+            different group.
+
+    """
+    session_key_ctxt = read_structure_lazily(
+        session_key_ctxt_b if structure is None else structure, group)
+    check_group(session_key_ctxt.pop(GROUP_FIELD, None), group)
+    check_scheme(session_key_ctxt.pop(SCHEME_FIELD, None), SCHEME)
+    if trace: trace.mark('deserialize', header=len(session_key_ctxt_b))
+    session_key = _decrypt(group, deckey, session_key_ctxt)
+    if trace: trace.mark('kem')
+    if not session_key:
+        raise PebelDecryptionException("Unable to decrypt given cipher-text.")
+    return session_key
 
-    ctxt.write(bytes(iv))
 
-    session_key_ctxt_b = objectToBytes(session_key_ctxt, group)
-    ctxt.write(struct.pack('<Q', len(session_key_ctxt_b)))
-    ctxt.write(session_key_ctxt_b)
+def cpabe_encrypt(group, mpk, ptxt, policy, pool=None, compression=None):
+    """Encrypts a plain-text using the Bethencourt2007cae CP-ABE Scheme.
 
-    for b in read_data(bin_data=ptxt, chunksize=AES.block_size):
-        ctxt.write(symcipher.encrypt(b))
-        ctxt.flush()
 
-    return ctxt.getvalue()
+    @param group The `PairingGroup` used within the underlying crypto.
+    @param mpk   The Master Public Key of type `pk_t`.
+    @param ptxt The `bytearray` resulting from io.open or io.IOBytes
+                 containing the plaintext.
+    @param policy The `str` policy used to encrypt the plaintext.
+    @param pool An optional `pebel.pool.EncapsulationPool` from which to
+                take precomputed encapsulations.
+    @param compression The codec with which to compress the plaintext
+                       before encryption, `pebel.compress.AUTO` to
+                       compress only compressible plaintexts, or None.
+
+    @return The encrypted data returned as a `bytearray`.
+
+    """
+    with instrument.traced('cpabe_encrypt', group) as trace:
+        compression, chunks = compress_data(ptxt, compression)
+        if pool is not None:
+            session_key, session_key_ctxt_b = pool.encapsulate(
+                policy, trace, compression)
+        else:
+            session_key, session_key_ctxt_b = cpabe_encapsulate(
+                group, mpk, policy, trace, compression=compression)
+        ctxt = io.BytesIO()
+
+        iv = Random.new().read(AES.block_size)
+        symcipher = AES.new(derive_key(session_key), AES.MODE_CFB, iv)
+        if trace: trace.mark('kdf')
+
+        ctxt.write(bytes(iv))
+        ctxt.write(struct.pack('<Q', len(session_key_ctxt_b)))
+        ctxt.write(session_key_ctxt_b)
+
+        for b in chunks:
+            ctxt.write(symcipher.encrypt(b))
+            ctxt.flush()
+
+        if trace:
+            trace.mark('dem')
+            trace.end(payload=ctxt.tell() - len(session_key_ctxt_b)
+                      - AES.block_size - struct.calcsize('<Q'))
+        return ctxt.getvalue()
 
 
 def cpabe_decrypt(group, mpk, deckey, ctxt):
@@ -129,7 +392,8 @@ def cpabe_decrypt(group, mpk, deckey, ctxt):
     cipher-text can be satisfied by the set of attributes within the
     decryption key.
 
-    @param group The `PairingGroup` used within the underlying crypto.
+    @param group The `PairingGroup` used within the underlying crypto,
+                 or None to use the group recorded in the ciphertext.
     @param mpk The Master Public Key of type `mk_t`.
     @param deckey The decryption key of type `sk_t`.
     @param ctxt The `bytearray` resulting from io.open or io.IOBytes
@@ -139,22 +403,194 @@ def cpabe_decrypt(group, mpk, deckey, ctxt):
 
     @throws PebelDecryptionException If deckey cannot satisfy the
             policy within the ciphertext.
+    @throws PebelException If the ciphertext was generated within a
+            different group.
 
     """
-    cpabe = CPabe_BSW07(group)
     ptxt = io.BytesIO()
 
-    iv = ctxt.read(AES.block_size)
-    session_key_size = struct.unpack('<Q', ctxt.read(struct.calcsize('Q')))[0]
-    session_key_ctxt = bytesToObject(ctxt.read(session_key_size), group)
+    iv, session_key_ctxt_b = read_ciphertext_header(ctxt, AES.block_size)
+    structure = read_structure(session_key_ctxt_b)
+    group = resolve_group(group, structure)
+    compression = read_compression(structure)
+    with instrument.traced('cpabe_decrypt', group) as trace:
+        session_key = cpabe_decapsulate(group, mpk, deckey,
+                                        session_key_ctxt_b, trace, structure)
+
+        symcipher = AES.new(derive_key(session_key), AES.MODE_CFB, iv)
+        if trace: trace.mark('kdf')
+        chunks = read_data(bin_data=ctxt, chunksize=CHUNK_SIZE)
+        for b in decompress_data(map(symcipher.decrypt, chunks),
+                                 compression):
+            ptxt.write(b)
+            ptxt.flush()
+        if trace:
+            trace.mark('dem')
+            trace.end(payload=ptxt.tell())
+        return ptxt.getvalue()
+
+
+def cpabe_outsource_keygen(group, deckey):
+    """Splits a decryption key for outsourced decryption.
+
+    The transformation key is the decryption key with each element
+    raised to 1/z, for a random z, and so reveals nothing about the
+    session keys it is used to transform. The retrieval key is z.
+
+    @param group  The `PairingGroup` used within the underlying crypto.
+    @param deckey The decryption key of type `sk_t`.
+
+    @return A tuple `(tkey, rkey)` of the transformation key, of the
+            same form as `sk_t`, and the retrieval key.
+
+    """
+    z = group.random(ZR)
+    zinv = 1 / z
+    tkey = {
+        'D': deckey['D'] ** zinv,
+        'Dj': dict((a, d ** zinv) for a, d in deckey['Dj'].items()),
+        'Djp': dict((a, d ** zinv) for a, d in deckey['Djp'].items()),
+        'S': deckey['S']
+    }
+    return tkey, {'z': z}
+
+
+def cpabe_transform_header(group, mpk, tkey, session_key_ctxt_b,
+                           trace=None, structure=None):
+    """Partially decrypts an encrypted session key using a
+    transformation key.
+
+    @param group The `PairingGroup` used within the underlying crypto.
+    @param mpk   The Master Public Key of type `pk_t`.
+    @param tkey  The transformation key from `cpabe_outsource_keygen`.
+    @param session_key_ctxt_b The serialised encryption of the session key.
+    @param trace An optional `pebel.instrument.Trace` to report to.
+    @param structure The structure of session_key_ctxt_b, as returned by
+    `pebel.util.read_structure`, if already read.
+
+    @return The serialised transformed encryption of the session key.
+
+    @throws PebelDecryptionException If the attributes of tkey cannot
+            satisfy the policy of the session key.
+
+    """
+    session_key_ctxt = read_structure_lazily(
+        session_key_ctxt_b if structure is None else structure, group)
+    check_group(session_key_ctxt.pop(GROUP_FIELD, None), group)
+    check_scheme(session_key_ctxt.pop(SCHEME_FIELD, None), SCHEME)
+    if trace: trace.mark('deserialize', header=len(session_key_ctxt_b))
+    # Decrypting with the transformation key yields C_tilde / T, where
+    # T = e(g,g)^(alpha s / z).
+    blinded = _decrypt(group, tkey, session_key_ctxt)
+    if trace: trace.mark('kem')
+    if not blinded:
+        raise PebelDecryptionException("Unable to decrypt given cipher-text.")
+    transformed = {
+        'C_tilde': session_key_ctxt['C_tilde'],
+        'T': session_key_ctxt['C_tilde'] / blinded,
+        GROUP_FIELD: group.groupType()
+    }
+    if COMPRESSION_FIELD in session_key_ctxt:
+        transformed[COMPRESSION_FIELD] = session_key_ctxt[COMPRESSION_FIELD]
+    transformed_b = objectToBytes(transformed, group)
+    if trace: trace.mark('serialize', header=len(transformed_b))
+    return transformed_b
+
+
+def cpabe_retrieve(group, rkey, transformed_b, trace=None):
+    """Recovers a session key from its transformed encryption.
+
+    @param group The `PairingGroup` used within the underlying crypto.
+    @param rkey  The retrieval key from `cpabe_outsource_keygen`.
+    @param transformed_b The serialised transformed encryption of the
+                         session key.
+    @param trace An optional `pebel.instrument.Trace` to report to.
+
+    @return The session key, an element of GT.
+
+    @throws PebelException If the session key has not been transformed
+            or was encapsulated within a different group.
+
+    """
+    transformed = bytesToObject(transformed_b, group)
+    check_group(transformed.pop(GROUP_FIELD, None), group)
+    if trace: trace.mark('deserialize', header=len(transformed_b))
+    if 'T' not in transformed:
+        raise PebelException("The cipher-text has not been transformed.")
+    session_key = transformed['C_tilde'] / (transformed['T'] ** rkey['z'])
+    if trace: trace.mark('kem')
+    return session_key
+
+
+def cpabe_transform(group, mpk, tkey, ctxt):
+    """Transforms a ciphertext for decryption with a retrieval key.
+
+    The IV and encrypted payload are copied unchanged.
+
+    @param group The `PairingGroup` used within the underlying crypto,
+                 or None to use the group recorded in the ciphertext.
+    @param mpk   The Master Public Key of type `pk_t`.
+    @param tkey  The transformation key from `cpabe_outsource_keygen`.
+    @param ctxt  The `bytearray` resulting from io.open or io.IOBytes
+                 containing the ciphertext.
 
-    session_key = cpabe.decrypt(mpk,deckey, session_key_ctxt)
+    @return The transformed ciphertext returned as a `bytearray`.
 
-    if session_key:
-        symcipher = AES.new(sha(session_key)[0:32], AES.MODE_CFB, iv)
-        for b in read_data(bin_data=ctxt, chunksize=AES.block_size):
-            ptxt.write(symcipher.decrypt(b))
+    @throws PebelDecryptionException If the attributes of tkey cannot
+            satisfy the policy within the ciphertext.
+
+    """
+    iv, session_key_ctxt_b = read_ciphertext_header(ctxt, AES.block_size)
+    structure = read_structure(session_key_ctxt_b)
+    group = resolve_group(group, structure)
+    with instrument.traced('cpabe_transform', group) as trace:
+        transformed_b = cpabe_transform_header(group, mpk, tkey,
+                                               session_key_ctxt_b, trace,
+                                               structure)
+
+        out = io.BytesIO()
+        out.write(bytes(iv))
+        out.write(struct.pack('<Q', len(transformed_b)))
+        out.write(transformed_b)
+        for b in read_data(bin_data=ctxt, chunksize=2**16):
+            out.write(b)
+        if trace:
+            trace.end(payload=out.tell() - len(transformed_b)
+                      - AES.block_size - struct.calcsize('<Q'))
+        return out.getvalue()
+
+
+def cpabe_decrypt_transformed(group, rkey, ctxt):
+    """Decrypts a ciphertext transformed by `cpabe_transform`.
+
+    @param group The `PairingGroup` used within the underlying crypto,
+                 or None to use the group recorded in the ciphertext.
+    @param rkey  The retrieval key from `cpabe_outsource_keygen`.
+    @param ctxt  The `bytearray` resulting from io.open or io.IOBytes
+                 containing the transformed ciphertext.
+
+    @return The `bytearray` containing the plaintext.
+
+    @throws PebelException If the ciphertext has not been transformed.
+
+    """
+    ptxt = io.BytesIO()
+
+    iv, transformed_b = read_ciphertext_header(ctxt, AES.block_size)
+    structure = read_structure(transformed_b)
+    group = resolve_group(group, structure)
+    compression = read_compression(structure)
+    with instrument.traced('cpabe_decrypt_transformed', group) as trace:
+        session_key = cpabe_retrieve(group, rkey, transformed_b, trace)
+
+        symcipher = AES.new(derive_key(session_key), AES.MODE_CFB, iv)
+        if trace: trace.mark('kdf')
+        chunks = read_data(bin_data=ctxt, chunksize=CHUNK_SIZE)
+        for b in decompress_data(map(symcipher.decrypt, chunks),
+                                 compression):
+            ptxt.write(b)
             ptxt.flush()
+        if trace:
+            trace.mark('dem')
+            trace.end(payload=ptxt.tell())
         return ptxt.getvalue()
-    else:
-        raise PebelDecryptionException("Unable to decrypt given cipher-text.")
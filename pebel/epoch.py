@@ -0,0 +1,238 @@
+"""@package pebel.epoch
+
+Time-limited CP-ABE decryption keys using numerical attributes.
+
+Time is divided into epochs, by default of one day. Each decryption
+key carries, alongside its attributes, the epoch up to which it is
+valid, represented as a numerical attribute (see `pebel.policy`).
+Ciphertexts are encrypted under the policy given, conjoined with the
+clause `EPOCH >= now`, where now is the epoch at the time of
+encryption. A key thus decrypts exactly the ciphertexts encrypted no
+later than its expiry epoch.
+
+Revoking a user amounts to not renewing their key. Rather than running
+key generation for every user at each rotation, only the keys that
+are about to expire are re-issued, see `expiring_keys` and
+`renew_keys`. Renewal is spread over all cores.
+
+@author Jan de Muijnck-Hughes <jfdm@st-andrews.ac.uk>
+
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from pebel import cpabe, schemes
+from pebel.index import read_key_access_structure
+from pebel.policy import (
+    constructNumericalAttribute,
+    convertNumericalComparison,
+    readNumericalAttribute
+)
+from pebel.util import (
+    write_key_to_file,
+    read_key_from_file,
+    read_group_from_file
+)
+
+## The name of the numerical attribute holding the expiry epoch.
+EPOCH_ATTRIBUTE = 'EPOCH'
+
+## The word size of epochs. 16 bits of days last until 2149.
+EPOCH_BITS = 16
+
+## The length of an epoch in seconds.
+EPOCH_PERIOD = 86400
+
+## The schemes whose policies are parsed by `pebel.policy.parsePolicy`,
+## which reads bit markers. Charm parses the policies of FAME, and
+## stops at the ':' of the first bit marker.
+EPOCH_SCHEMES = (cpabe.SCHEME,)
+
+
+def current_epoch(period=EPOCH_PERIOD, now=None):
+    """Return the epoch of a point in time.
+
+    @param period The length (`int`) of an epoch in seconds.
+    @param now    The time in seconds since 1970, by default the present.
+
+    @return The epoch as an `int`.
+    """
+    return int((time.time() if now is None else now) // period)
+
+
+def epoch_attributes(expiry, nbits=EPOCH_BITS):
+    """Return the attributes recording the expiry epoch of a key.
+
+    @param expiry The last epoch (`int`) in which the key is valid.
+    @param nbits  The word size of epochs.
+
+    @return A `list` of `str` attributes.
+    """
+    if not 0 <= expiry < (1 << nbits):
+        raise ValueError("Epochs must lie in [0, 2^{0}).".format(nbits))
+    return [a.upper() for a in
+            constructNumericalAttribute(EPOCH_ATTRIBUTE, expiry, nbits)]
+
+
+def epoch_policy(policy, epoch=None, nbits=EPOCH_BITS):
+    """Conjoin a policy with the clause `EPOCH >= epoch`.
+
+    @param policy The policy `str`.
+    @param epoch  The epoch (`int`) of encryption, by default the
+    current epoch.
+    @param nbits  The word size of epochs.
+
+    @return The policy `str` only satisfied by keys valid in epoch.
+    """
+    if epoch is None:
+        epoch = current_epoch()
+    if not 0 <= epoch < (1 << nbits):
+        raise ValueError("Epochs must lie in [0, 2^{0}).".format(nbits))
+    if epoch == 0:
+        return policy
+    clause = convertNumericalComparison(EPOCH_ATTRIBUTE, True, epoch - 1,
+                                        nbits)
+    return "({0}) and ({1})".format(policy, clause)
+
+
+def key_expiry(attributes, nbits=EPOCH_BITS):
+    """Return the expiry epoch recorded within a key's attributes.
+
+    @param attributes The attributes of the key.
+    @param nbits      The word size of epochs.
+
+    @return The expiry epoch (`int`), or None if the key does not
+    expire.
+    """
+    return readNumericalAttribute(EPOCH_ATTRIBUTE, attributes, nbits)
+
+
+def _without_epoch(attributes):
+    prefix = EPOCH_ATTRIBUTE + ":"
+    return [a for a in attributes if not a.upper().startswith(prefix)]
+
+
+def _epoch_scheme(name):
+    scheme = schemes.get_scheme(name)
+    if scheme.name not in EPOCH_SCHEMES:
+        raise ValueError("Epochs require one of the schemes: {0}".format(
+            ", ".join(EPOCH_SCHEMES)))
+    return scheme
+
+
+def epoch_keygen(group, msk, mpk, attributes, expiry, scheme='bsw07',
+                 nbits=EPOCH_BITS):
+    """Generate a decryption key valid up to an epoch.
+
+    @param group      The `PairingGroup` used within the underlying
+    crypto.
+    @param msk        The Master Secret Key of the scheme.
+    @param mpk        The Master Public Key of the scheme.
+    @param attributes The set of `str` attributes of the key.
+    @param expiry     The last epoch (`int`) in which the key is valid.
+    @param scheme     The name (`str`) of a scheme within
+    `EPOCH_SCHEMES`.
+    @param nbits      The word size of epochs.
+
+    @return The generated decryption key.
+    """
+    scheme = _epoch_scheme(scheme)
+    attributes = ([a.upper() for a in _without_epoch(attributes)]
+                  + epoch_attributes(expiry, nbits))
+    return scheme.keygen(group, msk, mpk, attributes)
+
+
+def epoch_encrypt(group, mpk, ptxt, policy, epoch=None, scheme='bsw07',
+                  nbits=EPOCH_BITS):
+    """Encrypt a plaintext for keys valid in the current epoch.
+
+    @param group  The `PairingGroup` used within the underlying crypto.
+    @param mpk    The Master Public Key of the scheme.
+    @param ptxt   The `bytearray` resulting from io.open or io.IOBytes
+    containing the plaintext.
+    @param policy The policy `str` to encrypt under.
+    @param epoch  The epoch (`int`) of encryption, by default the
+    current epoch.
+    @param scheme The name (`str`) of a scheme within `EPOCH_SCHEMES`.
+    @param nbits  The word size of epochs.
+
+    @return The encrypted data returned as a `bytearray`, decryptable
+    with `pebel.schemes.decrypt`.
+    """
+    scheme = _epoch_scheme(scheme)
+    return schemes.encrypt(group, mpk, ptxt,
+                           epoch_policy(policy, epoch, nbits), scheme.name)
+
+
+def expiring_keys(fnames, before, nbits=EPOCH_BITS):
+    """Find the keys expiring before an epoch.
+
+    Only the attributes of each key are read; group elements are not
+    decoded.
+
+    @param fnames The names of the files (`str`) containing the keys.
+    @param before The epoch (`int`) by which keys must be renewed.
+    @param nbits  The word size of epochs.
+
+    @return A generator of `(fname, expiry)` tuples for each key whose
+    expiry epoch precedes before. Keys without an expiry are skipped.
+    """
+    for fname in fnames:
+        expiry = key_expiry(read_key_access_structure(fname), nbits)
+        if expiry is not None and expiry < before:
+            yield fname, expiry
+
+
+## The keys used by each renewal process.
+_renewal = None
+
+
+def _load_renewal(mpk_fname, msk_fname, expiry, scheme, nbits):
+    global _renewal
+    group = read_group_from_file(mpk_fname,
+                                 schemes.get_scheme(scheme).group)
+    _renewal = (group, read_key_from_file(mpk_fname, group),
+                read_key_from_file(msk_fname, group), expiry, scheme, nbits)
+
+
+def _renew(fname):
+    group, mpk, msk, expiry, scheme, nbits = _renewal
+    dkey = epoch_keygen(group, msk, mpk, read_key_access_structure(fname),
+                        expiry, scheme, nbits)
+    write_key_to_file(fname + ".renew", dkey, group)
+    os.replace(fname + ".renew", fname)
+    return fname
+
+
+def renew_keys(fnames, mpk_fname, msk_fname, expiry, scheme='bsw07',
+               nbits=EPOCH_BITS, workers=None):
+    """Re-issue keys, in place, with a new expiry epoch.
+
+    The attributes of each key are kept. Keys are generated by a pool
+    of processes, each reading the master keys once.
+
+    @param fnames    The names of the files (`str`) containing the keys.
+    @param mpk_fname The name of the file containing the Master Public
+    Key.
+    @param msk_fname The name of the file containing the Master Secret
+    Key.
+    @param expiry    The new expiry epoch (`int`).
+    @param scheme    The name (`str`) of the CP-ABE scheme of the keys.
+    @param nbits     The word size of epochs.
+    @param workers   The number of processes, by default one per core.
+
+    @return A generator of the names of the renewed keys, as each is
+    written.
+    """
+    initargs = (mpk_fname, msk_fname, expiry, scheme, nbits)
+    if workers == 1:
+        _load_renewal(*initargs)
+        for fname in fnames:
+            yield _renew(fname)
+        return
+    with ProcessPoolExecutor(workers, initializer=_load_renewal,
+                             initargs=initargs) as pool:
+        for fname in pool.map(_renew, fnames, chunksize=64):
+            yield fname
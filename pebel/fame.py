@@ -0,0 +1,135 @@
+"""@package pebel.fame
+
+Provides the Agrawal2017fame CP-ABE scheme.
+
+This module provides a series of wrapper functions over the
+implementation of the FAME Ciphertext-Policy Attribute Based
+Encryption scheme as provided within the Charm Toolkit (`AC17CPABE`).
+
+FAME is built over asymmetric (type-III) pairings and decrypts with a
+constant number of pairings, 2(k + 1) under the k-linear assumption,
+regardless of the number of attributes used. Decryption under large
+policies is thus considerably cheaper than with Bethencourt2007cae.
+
+The functions follow the KEM interface of `pebel.cpabe`, such that the
+scheme can be used through the KEM/DEM wrapper of `pebel.schemes`.
+
+@author Jan de Muijnck-Hughes <jfdm@st-andrews.ac.uk>
+
+"""
+
+from charm.toolbox.pairinggroup import GT
+from charm.toolbox.msp import MSP
+from charm.schemes.abenc.ac17 import AC17CPABE
+from charm.core.engine.util import objectToBytes
+
+from pebel.exceptions import PebelDecryptionException
+from pebel.groups import GROUP_FIELD, SCHEME_FIELD, COMPRESSION_FIELD
+from pebel.hashcache import get_hash_cache
+from pebel.util import check_group, check_scheme, read_structure_lazily
+
+## The name of the scheme, as recorded within encrypted session keys.
+SCHEME = 'fame'
+
+## The size of the linear assumption. Two corresponds to DLIN.
+ASSUMPTION_SIZE = 2
+
+
+def fame_setup(group):
+    """Generates the master key pair for the Agrawal2017fame CP-ABE Scheme.
+
+    @param group The `PairingGroup`, of an asymmetric curve, used within
+                 the underlying crypto.
+
+    @return The master public and private key pair `(pk, msk)`.
+
+    """
+    return AC17CPABE(group, ASSUMPTION_SIZE).setup()
+
+
+def fame_keygen(group, msk, mpk, attributes):
+    """Generates a decryption key for the Agrawal2017fame CP-ABE Scheme.
+
+    @param group The `PairingGroup` used within the underlying crypto.
+    @param msk   The Master Secret Key.
+    @param mpk   The Master Public Key.
+    @param attributes The set of `str` attributes used to generate the
+                      decryption key.
+
+    @return The generated decryption key.
+
+    """
+    return AC17CPABE(get_hash_cache(group), ASSUMPTION_SIZE).keygen(
+        mpk, msk, [a.upper() for a in attributes])
+
+
+def fame_encapsulate(group, mpk, policy, trace=None, session_key=None,
+                     compression=None):
+    """Encapsulates a session key using the Agrawal2017fame CP-ABE Scheme.
+
+    @param group The `PairingGroup` used within the underlying crypto.
+    @param mpk   The Master Public Key.
+    @param policy The `str` policy under which to encapsulate the
+                  session key.
+    @param trace An optional `pebel.instrument.Trace` to report to.
+    @param session_key The session key to encapsulate. By default a
+                       fresh session key is chosen.
+    @param compression The name (`str`) of the codec with which the
+                       payload is compressed, recorded within the
+                       encrypted session key, or None.
+
+    @return A tuple `(session_key, session_key_ctxt_b)` containing the
+            session key, an element of GT, and its serialised encryption.
+
+    """
+    if session_key is None:
+        session_key = group.random(GT)
+    abe = AC17CPABE(get_hash_cache(group), ASSUMPTION_SIZE)
+    session_key_ctxt = abe.encrypt(mpk, session_key, policy)
+    # The parsed policy cannot be serialised, and is parsed again on
+    # decapsulation.
+    session_key_ctxt['policy'] = policy
+    session_key_ctxt[GROUP_FIELD] = group.groupType()
+    session_key_ctxt[SCHEME_FIELD] = SCHEME
+    if compression is not None:
+        session_key_ctxt[COMPRESSION_FIELD] = compression
+    if trace: trace.mark('kem')
+    session_key_ctxt_b = objectToBytes(session_key_ctxt, group)
+    if trace: trace.mark('serialize', header=len(session_key_ctxt_b))
+    return session_key, session_key_ctxt_b
+
+
+def fame_decapsulate(group, mpk, deckey, session_key_ctxt_b, trace=None,
+                     structure=None):
+    """Recovers a session key encapsulated using the Agrawal2017fame
+    CP-ABE Scheme.
+
+    @param group  The `PairingGroup` used within the underlying crypto.
+    @param mpk    The Master Public Key.
+    @param deckey The decryption key.
+    @param session_key_ctxt_b The serialised encryption of the session key.
+    @param trace  An optional `pebel.instrument.Trace` to report to.
+    @param structure The structure of session_key_ctxt_b, as returned by
+    `pebel.util.read_structure`, if already read.
+
+    @return The session key, an element of GT.
+
+    @throws PebelDecryptionException If deckey cannot decrypt the
+            session key.
+    @throws PebelException If the session key was encapsulated within a
+            different group or scheme.
+
+    """
+    session_key_ctxt = read_structure_lazily(
+        session_key_ctxt_b if structure is None else structure, group)
+    check_group(session_key_ctxt.pop(GROUP_FIELD, None), group)
+    check_scheme(session_key_ctxt.pop(SCHEME_FIELD, None), SCHEME)
+    session_key_ctxt['policy'] = MSP(group).createPolicy(
+        session_key_ctxt['policy'])
+    if trace: trace.mark('deserialize', header=len(session_key_ctxt_b))
+    session_key = AC17CPABE(group, ASSUMPTION_SIZE).decrypt(
+        mpk, session_key_ctxt, deckey)
+    if trace: trace.mark('kem')
+    if not session_key:
+        raise PebelDecryptionException("Unable to decrypt given cipher-text.")
+    return session_key
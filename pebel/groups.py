@@ -0,0 +1,162 @@
+"""@package pebel.groups
+
+Selection and caching of the pairing groups used by the schemes.
+
+Constructing a `PairingGroup` loads and pre-processes its curve
+parameters, so `get_group` keeps one instance per curve for the life
+of the process.
+
+The name of the group is recorded within keys written using
+`pebel.util.write_key_to_file`, and within the headers of ciphertexts,
+allowing both to be read back without knowing the group beforehand.
+
+`benchmark_groups` measures the schemes over each available curve on
+the local machine and `recommend_group` uses those measurements to
+select the cheapest curve meeting a security level for a given mix of
+operations. See the `pyPEBEL-tune.py` script.
+
+@author Jan de Muijnck-Hughes <jfdm@st-andrews.ac.uk>
+
+"""
+
+import io
+import threading
+import time
+
+from charm.toolbox.pairinggroup import PairingGroup
+
+## The curves provided by Charm and their approximate security level
+## in bits, as stated by the Charm documentation.
+CURVES = {
+    'SS512': 80,
+    'SS1024': 112,
+    'MNT159': 70,
+    'MNT201': 90,
+    'MNT224': 100,
+    'BN254': 128,
+}
+
+## The group used by each scheme when none is recorded or given.
+DEFAULT_GROUPS = {
+    'cpabe': 'SS512',
+    'kpabe': 'MNT224',
+}
+
+## The operations that make up a workload.
+OPERATIONS = ('keygen', 'encrypt', 'decrypt')
+
+## The key under which the group name is recorded within keys and
+## encrypted session keys. Scheme attributes are upper-cased and so
+## cannot collide with it.
+GROUP_FIELD = '__group__'
+
+## The key under which the name of the scheme is recorded within
+## encrypted session keys, see `pebel.schemes`.
+SCHEME_FIELD = '__scheme__'
+
+## The key under which the compression of the payload is recorded
+## within encrypted session keys, see `pebel.compress`.
+COMPRESSION_FIELD = '__compression__'
+
+## The key marking decryption keys prepared for repeated decryption,
+## see `pebel.prepared`. Prepared keys are held in memory only.
+PREPARED_FIELD = '__prepared__'
+
+_groups = {}
+_groups_lock = threading.Lock()
+
+
+def get_group(name):
+    """Return the process wide `PairingGroup` for the named curve.
+
+    @param name The name (`str`) of the curve, e.g. 'SS512'.
+
+    @return The `PairingGroup`, constructed on first use.
+    """
+    group = _groups.get(name)
+    if group is None:
+        with _groups_lock:
+            group = _groups.get(name)
+            if group is None:
+                group = _groups[name] = PairingGroup(name)
+    return group
+
+
+def benchmark_groups(scheme, curves=None, leaves=10, repeat=5):
+    """Measure a scheme over each curve.
+
+    Encryption is measured over a small payload, such that the
+    measurements reflect the cost of the ABE operations.
+
+    @param scheme The scheme (`str`) to measure, 'cpabe' or 'kpabe'.
+    @param curves The names of the curves to measure, by default all
+    of `CURVES`.
+    @param leaves The number of policy leaves and attributes used.
+    @param repeat The number of repetitions of each operation.
+
+    @return A `dict` mapping each curve that could be measured to a
+    `dict` of the mean time in seconds of each of the `OPERATIONS`.
+    """
+    if scheme == 'cpabe':
+        from pebel.cpabe import (cpabe_setup as setup,
+                                 cpabe_keygen as keygen,
+                                 cpabe_encrypt as encrypt,
+                                 cpabe_decrypt as decrypt)
+    else:
+        from pebel.kpabe import (kpabe_setup as setup,
+                                 kpabe_keygen as keygen,
+                                 kpabe_encrypt as encrypt,
+                                 kpabe_decrypt as decrypt)
+
+    attributes = ["ATTR{0}".format(i) for i in range(leaves)]
+    policy = " and ".join(attributes)
+    key_arg, enc_arg = ((attributes, policy) if scheme == 'cpabe'
+                        else (policy, attributes))
+    payload = b"\0" * 1024
+
+    results = {}
+    for name in curves or sorted(CURVES):
+        try:
+            group = get_group(name)
+            mpk, msk = setup(group)
+        except Exception:
+            # The curve is not supported by this build of Charm.
+            continue
+        timings = dict((op, 0.0) for op in OPERATIONS)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            dkey = keygen(group, msk, mpk, key_arg)
+            timings['keygen'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            ctxt = encrypt(group, mpk, io.BytesIO(payload), enc_arg)
+            timings['encrypt'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            decrypt(group, mpk, dkey, io.BytesIO(ctxt))
+            timings['decrypt'] += time.perf_counter() - start
+        results[name] = dict((op, t / repeat) for op, t in timings.items())
+    return results
+
+
+def recommend_group(timings, security=80, mix=None):
+    """Choose the cheapest curve for a workload.
+
+    @param timings  The measurements returned by `benchmark_groups`.
+    @param security The minimum security level in bits.
+    @param mix      A `dict` weighting each of the `OPERATIONS` by its
+    share of the workload. By default operations are weighted equally.
+
+    @return A list of `(cost, name)` tuples for the curves meeting the
+    security level, cheapest first. The cost is the weighted mean time
+    in seconds of an operation.
+    """
+    mix = mix or dict((op, 1.0) for op in OPERATIONS)
+    total = float(sum(mix.values()))
+    ranking = []
+    for name, times in timings.items():
+        if CURVES.get(name, 0) < security:
+            continue
+        cost = sum(times[op] * weight for op, weight in mix.items()) / total
+        ranking.append((cost, name))
+    return sorted(ranking)
@@ -0,0 +1,218 @@
+"""@package pebel.hashcache
+
+A bounded, per-group cache of attributes hashed into the group.
+
+Key generation and encryption hash every attribute of a key or leaf of
+a policy into the pairing group, which costs a hash-to-curve each
+time. Numerical attributes, see `pebel.policy`, expand into a bit
+marker per bit, so a single key or policy can hold hundreds of
+attributes, and the same markers recur from one call to the next.
+
+`get_hash_cache` returns a stand in for a `PairingGroup` that passes
+everything through to the group, except that the hashes of `str`
+values are kept, up to a bounded number, in least recently used
+order. The wrappers of `pebel.cpabe`, `pebel.kpabe` and `pebel.fame`
+hand it to the schemes of Charm in place of the group, such that the
+cache is shared by key generation and encryption within the process.
+
+The cache can be preloaded with the attributes of a schema, a JSON
+file of the form::
+
+    {"attributes": ["DOCTOR", "NURSE"],
+     "numerical": {"AGE": 8, "LEVEL": 4}}
+
+listing the attributes, and the numerical attributes with their word
+sizes, in use.
+
+@author Jan de Muijnck-Hughes <jfdm@st-andrews.ac.uk>
+
+"""
+
+import collections
+import io
+import json
+import threading
+
+from charm.toolbox.pairinggroup import ZR, G1, G2
+
+from pebel.policy import bitmarkerTable
+
+## The default number of hashes held per group.
+HASH_CACHE_SIZE = 8192
+
+## The group into which each kind of scheme hashes attributes.
+HASH_TYPES = {'cp': G2, 'kp': G1}
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+class HashCache:
+    """A `PairingGroup` memoising the hashes of `str` values.
+
+    The cache is safe to use from many threads.
+    """
+    def __init__(self, group, maxsize=HASH_CACHE_SIZE):
+        """Create an empty cache.
+
+        @param group   The `PairingGroup` to pass through to.
+        @param maxsize The number of hashes to hold. Zero disables the
+        cache.
+        """
+        self.group = group
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._hashes = collections.OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def __getattr__(self, name):
+        return getattr(self.group, name)
+
+    def hash(self, args, type=ZR):
+        """Hash a value into the group, as `PairingGroup.hash`."""
+        if not isinstance(args, str) or self.maxsize <= 0:
+            return self.group.hash(args, type)
+        key = (args, type)
+        with self._lock:
+            element = self._hashes.get(key)
+            if element is not None:
+                self._hashes.move_to_end(key)
+                self._hits += 1
+                return element
+            self._misses += 1
+        element = self.group.hash(args, type)
+        with self._lock:
+            self._hashes[key] = element
+            while len(self._hashes) > self.maxsize:
+                self._hashes.popitem(last=False)
+        return element
+
+    def preload(self, attributes, type):
+        """Hash attributes ahead of their use.
+
+        Preloading is not counted within the metrics.
+
+        @param attributes The `str` attributes.
+        @param type       The group into which to hash, e.g. `G1`.
+        """
+        for attribute in attributes:
+            element = self.group.hash(attribute, type)
+            with self._lock:
+                self._hashes[(attribute, type)] = element
+                while len(self._hashes) > self.maxsize:
+                    self._hashes.popitem(last=False)
+
+    def resize(self, maxsize):
+        """Change the number of hashes held, evicting as needed.
+
+        @param maxsize The number of hashes to hold.
+        """
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._hashes) > max(maxsize, 0):
+                self._hashes.popitem(last=False)
+
+    def clear(self):
+        """Drop every hash held and reset the metrics."""
+        with self._lock:
+            self._hashes.clear()
+            self._hits = 0
+            self._misses = 0
+
+    def metrics(self):
+        """Report the use of the cache.
+
+        @return A `dict` of the form::
+
+            {'hits': 1200, 'misses': 40, 'hit_rate': 0.968,
+             'size': 40, 'maxsize': 8192}
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / float(lookups) if lookups else 0.0,
+                'size': len(self._hashes),
+                'maxsize': self.maxsize
+            }
+
+
+def get_hash_cache(group):
+    """Return the process wide hash cache of a group.
+
+    @param group The `PairingGroup`, or a `HashCache` which is returned
+    as is.
+
+    @return The `HashCache` of the group, created on first use.
+    """
+    if isinstance(group, HashCache):
+        return group
+    name = group.groupType()
+    cache = _caches.get(name)
+    if cache is None or cache.group is not group:
+        with _caches_lock:
+            cache = _caches.get(name)
+            if cache is None or cache.group is not group:
+                cache = _caches[name] = HashCache(group)
+    return cache
+
+
+def hash_cache_metrics():
+    """Report the use of every hash cache.
+
+    @return A `dict` mapping the name of each group to the metrics of
+    its cache, see `HashCache.metrics`.
+    """
+    with _caches_lock:
+        caches = dict(_caches)
+    return {name: cache.metrics() for name, cache in caches.items()}
+
+
+def read_schema(fname):
+    """Read a schema of the attributes in use.
+
+    @param fname The name of the JSON file (`str`) holding the schema.
+
+    @return The schema as a `dict`.
+    """
+    with io.open(fname, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def schema_attributes(schema):
+    """List the attributes of a schema, expanding each numerical
+    attribute into its bit markers.
+
+    @param schema The schema `dict`.
+
+    @return A `list` of upper-cased `str` attributes.
+    """
+    attributes = [a.upper() for a in schema.get('attributes', ())]
+    for name, nbits in sorted(schema.get('numerical', {}).items()):
+        for markers in bitmarkerTable(name, nbits):
+            attributes.extend(m.upper() for m in markers)
+    return attributes
+
+
+def preload_schema(group, schema, kind='cp'):
+    """Preload the hash cache of a group with the attributes of a
+    schema.
+
+    @param group  The `PairingGroup`.
+    @param schema The schema `dict`, or the name (`str`) of a JSON file
+    holding it.
+    @param kind   The kind of scheme, 'cp' or 'kp', the attributes are
+    used with.
+
+    @return The number of attributes preloaded.
+    """
+    if isinstance(schema, str):
+        schema = read_schema(schema)
+    attributes = schema_attributes(schema)
+    cache = get_hash_cache(group)
+    if len(attributes) > cache.maxsize:
+        cache.resize(len(attributes))
+    cache.preload(attributes, HASH_TYPES[kind])
+    return len(attributes)
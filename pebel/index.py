@@ -0,0 +1,277 @@
+"""@package pebel.index
+
+Provides an index of the access structures protecting ciphertexts.
+
+Answering which of many ciphertexts a decryption key can open would
+otherwise require attempting to decrypt each one. The index records,
+for each object, the access structure found in its ciphertext header:
+the policy of a CP-ABE ciphertext, or the attribute set of a KP-ABE
+ciphertext. An inverted index maps each attribute to the distinct
+access structures mentioning it, and those to the objects they
+protect, so a query only evaluates the distinct structures that share
+an attribute with the key, once each.
+
+The index is kept on disk as an append-only journal of JSON records,
+one per line, so adding objects is incremental. The journal is
+replayed when the index is opened and can be rewritten without
+superseded records using `compact`.
+
+Reading a header only requires the serialised structure of the
+encrypted session key; no group elements are decoded and no pairing
+group is needed.
+
+@author Jan de Muijnck-Hughes <jfdm@st-andrews.ac.uk>
+
+"""
+
+import functools
+import io
+import json
+import os
+
+from pebel.policy import parsePolicy, policySatisfied, policyToString
+from pebel.util import read_ciphertext_header, read_structure
+
+# Objects are commonly protected by a small set of recurring policies.
+_parse_policy = functools.lru_cache(maxsize=4096)(parsePolicy)
+
+
+def read_access_structure(ctxt):
+    """Read the access structure from the header of a ciphertext.
+
+    @param ctxt The `bytearray` resulting from `io.open` or `io.BytesIO`
+    containing a CP-ABE or KP-ABE ciphertext.
+
+    @return The policy `str` of a CP-ABE ciphertext, or the `list` of
+    attributes of a KP-ABE ciphertext.
+    """
+    iv, session_key_ctxt_b = read_ciphertext_header(ctxt)
+    session_key_ctxt = read_structure(session_key_ctxt_b)
+    if 'policy' in session_key_ctxt:
+        return session_key_ctxt['policy']
+    return list(session_key_ctxt['attributes'])
+
+
+def read_key_access_structure(fname):
+    """Read the access structure of a decryption key stored on disk.
+
+    @param fname The name of the file (`str`) containing the key.
+
+    @return The `list` of attributes of a CP-ABE key, or the policy
+    `str` of a KP-ABE key.
+    """
+    with io.open(fname, 'rb') as f:
+        key = read_structure(f.read())
+    if 'S' in key:
+        return list(key['S'])
+    if 'attr_list' in key:
+        return list(key['attr_list'])
+    return key['policy']
+
+
+class CiphertextIndex:
+    """An incrementally updated index of ciphertext access structures.
+
+    Objects are identified by name, typically the name of the file
+    containing the ciphertext.
+    """
+    def __init__(self, fname):
+        """Open, or create, the index stored within the named file.
+
+        @param fname The name of the file (`str`) holding the journal.
+        """
+        self.fname = fname
+        self._journal = None
+        # name -> PolicyTree (CP-ABE) or frozenset (KP-ABE)
+        self._structures = {}
+        # structure -> set of names
+        self._objects = {}
+        # attribute -> set of structures, per scheme
+        self._policies = {}
+        self._attribute_sets = {}
+        if os.path.exists(fname):
+            with io.open(fname, 'r', encoding='utf-8') as journal:
+                for line in journal:
+                    if line.strip():
+                        self._apply(json.loads(line))
+
+    def __len__(self):
+        return len(self._structures)
+
+    def __contains__(self, name):
+        return name in self._structures
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, name, ctxt):
+        """Index an object from its ciphertext header.
+
+        @param name The name (`str`) of the object.
+        @param ctxt The `bytearray` resulting from `io.open` or
+        `io.BytesIO` containing the ciphertext. Only the header is
+        read.
+        """
+        structure = read_access_structure(ctxt)
+        if isinstance(structure, str):
+            self.add_policy(name, structure)
+        else:
+            self.add_attributes(name, structure)
+
+    def add_file(self, fname):
+        """Index the ciphertext stored within the named file.
+
+        @param fname The name of the ciphertext file (`str`), which is
+        also the name of the object.
+        """
+        with io.open(fname, 'rb') as ctxt:
+            self.add(fname, ctxt)
+
+    def add_policy(self, name, policy):
+        """Index an object encrypted with CP-ABE under a policy.
+
+        @param name   The name (`str`) of the object.
+        @param policy The policy `str` protecting the object.
+        """
+        self._record({'name': name, 'policy': policy})
+
+    def add_attributes(self, name, attributes):
+        """Index an object encrypted with KP-ABE under attributes.
+
+        @param name       The name (`str`) of the object.
+        @param attributes The attributes protecting the object.
+        """
+        self._record({'name': name, 'attributes': sorted(attributes)})
+
+    def remove(self, name):
+        """Remove an object from the index.
+
+        @param name The name (`str`) of the object.
+        """
+        if name in self._structures:
+            self._record({'name': name, 'removed': True})
+
+    def objects_for_attributes(self, attributes):
+        """Find the CP-ABE objects a key with the given attributes opens.
+
+        @param attributes The attributes of the decryption key.
+
+        @return A `set` containing the names of the objects whose
+        policies are satisfied by the attributes.
+        """
+        attributes = frozenset(attributes)
+        candidates = set()
+        for attribute in attributes:
+            candidates.update(self._policies.get(attribute, ()))
+        found = set()
+        for policy in candidates:
+            if policySatisfied(policy, attributes):
+                found.update(self._objects[policy])
+        return found
+
+    def objects_for_policy(self, policy):
+        """Find the KP-ABE objects a key with the given policy opens.
+
+        @param policy The policy `str` of the decryption key.
+
+        @return A `set` containing the names of the objects whose
+        attributes satisfy the policy.
+        """
+        policy = _parse_policy(policy)
+        candidates = set()
+        for attribute in set(policy.leaves()):
+            candidates.update(self._attribute_sets.get(attribute, ()))
+        found = set()
+        for attributes in candidates:
+            if policySatisfied(policy, attributes):
+                found.update(self._objects[attributes])
+        return found
+
+    def objects_for_key(self, fname):
+        """Find the objects that the decryption key in the named file
+        opens.
+
+        @param fname The name of the file (`str`) containing the key.
+
+        @return A `set` containing the names of the objects.
+        """
+        structure = read_key_access_structure(fname)
+        if isinstance(structure, str):
+            return self.objects_for_policy(structure)
+        return self.objects_for_attributes(structure)
+
+    def compact(self):
+        """Rewrite the journal keeping only the current records."""
+        self.close()
+        tmp_fname = self.fname + ".tmp"
+        with io.open(tmp_fname, 'w', encoding='utf-8') as journal:
+            for name, structure in self._structures.items():
+                if isinstance(structure, frozenset):
+                    record = {'name': name,
+                              'attributes': sorted(structure)}
+                else:
+                    record = {'name': name,
+                              'policy': policyToString(structure)}
+                journal.write(json.dumps(record) + "\n")
+        os.replace(tmp_fname, self.fname)
+
+    def flush(self):
+        """Flush the journal to disk."""
+        if self._journal:
+            self._journal.flush()
+
+    def close(self):
+        """Close the journal. It is reopened on the next update."""
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+
+    def _record(self, record):
+        """Apply a record and append it to the journal."""
+        self._apply(record)
+        if not self._journal:
+            self._journal = io.open(self.fname, 'a', encoding='utf-8')
+        self._journal.write(json.dumps(record) + "\n")
+
+    def _apply(self, record):
+        """Apply a journal record to the in-memory index."""
+        name = record['name']
+        self._discard(name)
+        if record.get('removed'):
+            return
+        if 'policy' in record:
+            structure = _parse_policy(record['policy'])
+            attributes = set(structure.leaves())
+            postings = self._policies
+        else:
+            structure = frozenset(record['attributes'])
+            attributes = structure
+            postings = self._attribute_sets
+        self._structures[name] = structure
+        objects = self._objects.setdefault(structure, set())
+        if not objects:
+            for attribute in attributes:
+                postings.setdefault(attribute, set()).add(structure)
+        objects.add(name)
+
+    def _discard(self, name):
+        """Remove an object from the in-memory index."""
+        structure = self._structures.pop(name, None)
+        if structure is None:
+            return
+        objects = self._objects[structure]
+        objects.discard(name)
+        if objects:
+            return
+        del self._objects[structure]
+        if isinstance(structure, frozenset):
+            attributes, postings = structure, self._attribute_sets
+        else:
+            attributes, postings = set(structure.leaves()), self._policies
+        for attribute in attributes:
+            postings[attribute].discard(structure)
+            if not postings[attribute]:
+                del postings[attribute]
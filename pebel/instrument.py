@@ -0,0 +1,211 @@
+"""@package pebel.instrument
+
+Opt-in instrumentation of the KEM/DEM hot paths.
+
+When a callback is installed using `set_callback`, each call to the
+encryption and decryption functions of `pebel.cpabe` and `pebel.kpabe`
+reports an event to it once complete. An event is a `dict` of the
+form::
+
+    {'operation': 'cpabe_decrypt',
+     'status': 'ok',
+     'elapsed': 0.0123,
+     'phases': {'deserialize': 0.0011, 'kem': 0.0098,
+                'kdf': 0.00001, 'dem': 0.0013},
+     'bytes': {'header': 1821, 'payload': 4096},
+     'counts': {'Pair': 4, 'Exp': 3, 'Mul': 5}}
+
+Phases are timed in seconds:
+
+ - `kem`         The ABE encapsulation or decapsulation of the session key.
+ - `serialize`   Encoding the encrypted session key with `objectToBytes`.
+ - `deserialize` Reading and decoding the encrypted session key.
+ - `kdf`         Deriving the AES key from the session key with `hashPair`.
+ - `dem`         The symmetric encryption or decryption of the payload.
+
+Operation counts are collected with the benchmarking facilities of the
+`PairingGroup`, and only when requested, as they need a charm build
+with benchmarking enabled.
+
+When no callback is installed the instrumented functions only pay for
+a check of a module global per phase.
+
+Traced operations run within `traced`, such that an operation failing
+with any exception still ends its trace, reporting a 'failed' event and
+releasing the benchmark of the group.
+
+`MetricsCollector` is a ready-made callback that aggregates events in
+process.
+
+@author Jan de Muijnck-Hughes <jfdm@st-andrews.ac.uk>
+
+"""
+
+import contextlib
+import threading
+import time
+
+## The benchmark options of the `PairingGroup` counted within events.
+COUNTED_OPERATIONS = ["Pair", "Exp", "Mul", "Div"]
+
+_callback = None
+_count_operations = False
+
+
+def set_callback(callback, count_operations=False):
+    """Install the callback to which instrumentation events are reported.
+
+    @param callback A callable taking a single event `dict`, or `None`
+    to disable instrumentation.
+    @param count_operations If True, also count the pairing group
+    operations performed by each call.
+    """
+    global _callback, _count_operations
+    _callback = callback
+    _count_operations = count_operations
+
+
+def clear_callback():
+    """Disable instrumentation."""
+    set_callback(None)
+
+
+def begin(operation, group):
+    """Start tracing an operation.
+
+    @param operation The name (`str`) of the operation.
+    @param group     The `PairingGroup` used within the operation.
+
+    @return A `Trace`, or `None` if instrumentation is disabled.
+    """
+    if _callback is None:
+        return None
+    return Trace(operation, group, _callback, _count_operations)
+
+
+def traced(operation, group):
+    """Trace an operation within a `with` statement.
+
+    The trace is ended as failed if the body raises.
+
+    @param operation The name (`str`) of the operation.
+    @param group     The `PairingGroup` used within the operation.
+
+    @return A context manager giving a `Trace`, or `None` if
+    instrumentation is disabled.
+    """
+    trace = begin(operation, group)
+    if trace is None:
+        return contextlib.nullcontext()
+    return trace
+
+
+class Trace:
+    """Accumulates the timings of a single traced operation."""
+    __slots__ = ("operation", "group", "callback", "counting",
+                 "start", "last", "phases", "sizes", "ended")
+
+    def __init__(self, operation, group, callback, count_operations):
+        self.operation = operation
+        self.group = group
+        self.callback = callback
+        self.phases = {}
+        self.sizes = {}
+        self.ended = False
+        # InitBenchmark declines if the group is already being
+        # benchmarked, e.g. by a nested or concurrent call.
+        self.counting = (count_operations and
+                         bool(group.InitBenchmark()) and
+                         bool(group.StartBenchmark(COUNTED_OPERATIONS)))
+        self.start = self.last = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and not self.ended:
+            self.end(status="failed")
+        return False
+
+    def mark(self, phase, **sizes):
+        """Attribute the time since the previous mark to a phase.
+
+        @param phase The name (`str`) of the phase that just finished.
+        @param sizes Byte counts to record with the event.
+        """
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self.last
+        self.last = now
+        self.sizes.update(sizes)
+
+    def end(self, status="ok", **sizes):
+        """Finish the trace and report its event to the callback.
+
+        @param status The outcome (`str`) of the operation.
+        @param sizes  Byte counts to record with the event.
+        """
+        if self.ended:
+            return
+        self.ended = True
+        elapsed = time.perf_counter() - self.start
+        self.sizes.update(sizes)
+        counts = {}
+        if self.counting:
+            self.group.EndBenchmark()
+            counts = dict(self.group.GetGeneralBenchmarks())
+        self.callback({'operation': self.operation,
+                       'status': status,
+                       'elapsed': elapsed,
+                       'phases': self.phases,
+                       'bytes': self.sizes,
+                       'counts': counts})
+
+
+class MetricsCollector:
+    """In-process aggregation of instrumentation events.
+
+    Use an instance as the callback given to `set_callback`. Totals are
+    kept per operation, and are safe to update from several threads.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals = {}
+
+    def __call__(self, event):
+        with self._lock:
+            totals = self.totals.setdefault(event['operation'], {
+                'calls': 0, 'failures': 0, 'elapsed': 0.0,
+                'phases': {}, 'bytes': {}, 'counts': {}})
+            totals['calls'] += 1
+            if event['status'] != "ok":
+                totals['failures'] += 1
+            totals['elapsed'] += event['elapsed']
+            for field in ('phases', 'bytes', 'counts'):
+                for k, v in event[field].items():
+                    totals[field][k] = totals[field].get(k, 0) + v
+
+    def reset(self):
+        """Discard all aggregated events."""
+        with self._lock:
+            self.totals = {}
+
+    def summary(self):
+        """Return the mean of each metric per call, per operation.
+
+        @return A `dict` mapping each operation to a `dict` of its call
+        count, and its mean elapsed time, phase times, byte counts and
+        operation counts.
+        """
+        with self._lock:
+            summary = {}
+            for operation, totals in self.totals.items():
+                calls = totals['calls']
+                summary[operation] = {
+                    'calls': calls,
+                    'failures': totals['failures'],
+                    'elapsed': totals['elapsed'] / calls,
+                }
+                for field in ('phases', 'bytes', 'counts'):
+                    summary[operation][field] = dict(
+                        (k, v / calls) for k, v in totals[field].items())
+            return summary
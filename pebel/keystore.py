@@ -0,0 +1,271 @@
+"""@package pebel.keystore
+
+A read-only store of keys shared by many worker processes.
+
+Servers running dozens of worker processes, e.g. under gunicorn or
+multiprocessing, otherwise have each worker open, read and decode the
+Master Public Key and every decryption key from its own file. A key
+store packs the keys into a single file, built once by
+`build_keystore`, that each worker memory maps read-only with
+`KeyStore`. The pages of the store are shared by every worker through
+the page cache, and a worker decodes a key only when it first uses
+it, keeping it within a bounded per process cache.
+
+Within the store the group elements of keys are kept uncompressed, as
+supported by Charm, such that decoding them does not recover points
+from their compressed form. The decoded elements themselves, and the
+tables of prepared keys, see `pebel.prepared`, are objects of Charm
+and cannot be shared between processes; each worker prepares the keys
+it uses.
+
+The store is a linear combination of:
+
+ 1. The magic bytes `PEBELKS1`.
+ 2. The size in bytes of the index.
+ 3. The index, a JSON object mapping the name of each key to its
+    offset and size, the name of its group and whether its elements
+    are compressed.
+ 4. Each key, as the size of its structure, its structure as JSON in
+    which the `n`th group element is replaced by `elem:n`, and its
+    elements, each preceded by its size.
+
+@author Jan de Muijnck-Hughes <jfdm@st-andrews.ac.uk>
+
+"""
+
+import collections
+import io
+import json
+import mmap
+import os
+import struct
+import threading
+
+from pebel.exceptions import PebelException
+from pebel.groups import get_group
+from pebel.prepared import prepare_key
+from pebel.util import read_key_from_file, read_group_from_file, check_group
+
+MAGIC = b'PEBELKS1'
+
+## The number of decoded keys held per process by each `KeyStore`.
+KEY_CACHE_SIZE = 256
+
+_SIZE = struct.Struct('<I')
+_INDEX_SIZE = struct.Struct('<Q')
+
+
+def _serialize(group, element, compression):
+    if compression:
+        return group.serialize(element)
+    return group.serialize(element, compression=False)
+
+
+def _encode(obj, group, elements, compression):
+    if isinstance(obj, dict):
+        return {k: _encode(v, group, elements, compression)
+                for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_encode(v, group, elements, compression) for v in obj]
+    if isinstance(obj, str):
+        return 'str:' + obj
+    if isinstance(obj, (int, float)):
+        return obj
+    elements.append(_serialize(group, obj, compression))
+    return 'elem:{0}'.format(len(elements) - 1)
+
+
+def _decode(obj, group, elements, compression):
+    if isinstance(obj, dict):
+        return {k: _decode(v, group, elements, compression)
+                for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_decode(v, group, elements, compression) for v in obj]
+    if isinstance(obj, str):
+        kind, value = obj.split(':', 1)
+        if kind == 'str':
+            return value
+        if compression:
+            return group.deserialize(elements[int(value)])
+        return group.deserialize(elements[int(value)], compression=False)
+    return obj
+
+
+def _supports_uncompressed(group):
+    try:
+        group.serialize(group.random(), compression=False)
+    except TypeError:
+        return False
+    return True
+
+
+def build_keystore(fname, keys, default=None):
+    """Pack keys stored on disk into a key store.
+
+    The store is written atomically, such that workers attached to a
+    previous version of it are unaffected.
+
+    @param fname The name of the file (`str`) in which to store the keys.
+    @param keys  A `dict` mapping the name of each key to the name of the
+    file containing it, or an iterable of file names, each key being
+    named by the base name of its file.
+    @param default The name (`str`) of the group of keys that do not
+    record one, as is the case for keys written by earlier versions.
+
+    @return The number of keys stored.
+
+    @throws PebelException If a key does not record its group.
+    """
+    if not isinstance(keys, dict):
+        keys = collections.OrderedDict(
+            (os.path.basename(f), f) for f in keys)
+    index = {}
+    entries = io.BytesIO()
+    compressions = {}
+    for name, kfname in keys.items():
+        group = read_group_from_file(kfname, default)
+        if group is None:
+            raise PebelException(
+                "No pairing group is recorded within {0}.".format(kfname))
+        key = read_key_from_file(kfname, group)
+        gname = group.groupType()
+        if gname not in compressions:
+            compressions[gname] = not _supports_uncompressed(group)
+        compression = compressions[gname]
+        elements = []
+        structure = json.dumps(_encode(key, group, elements, compression),
+                               separators=(',', ':')).encode('utf-8')
+        offset = entries.tell()
+        entries.write(_SIZE.pack(len(structure)))
+        entries.write(structure)
+        for element in elements:
+            entries.write(_SIZE.pack(len(element)))
+            entries.write(element)
+        index[name] = [offset, entries.tell() - offset, gname, compression]
+    index_b = json.dumps(index, sort_keys=True).encode('utf-8')
+    tmp = fname + '.tmp'
+    with io.open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(_INDEX_SIZE.pack(len(index_b)))
+        f.write(index_b)
+        f.write(entries.getvalue())
+    os.replace(tmp, fname)
+    return len(index)
+
+
+class KeyStore:
+    """A key store memory mapped read-only.
+
+    Open the store once per process; stores opened before a fork are
+    shared with the children. Instances are safe to use from many
+    threads.
+    """
+    def __init__(self, fname, maxsize=KEY_CACHE_SIZE):
+        """Map a key store and read its index.
+
+        @param fname   The name of the file (`str`) of the store.
+        @param maxsize The number of decoded keys to hold.
+
+        @throws PebelException If the file is not a key store.
+        """
+        with io.open(fname, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            self._map.close()
+            raise PebelException("Not a pebel key store.")
+        start = len(MAGIC) + _INDEX_SIZE.size
+        size, = _INDEX_SIZE.unpack_from(self._map, len(MAGIC))
+        self._index = json.loads(self._map[start:start + size].decode())
+        self._base = start + size
+        self.maxsize = maxsize
+        self._keys = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def names(self):
+        """Return the names of the keys held, sorted."""
+        return sorted(self._index)
+
+    def get(self, name, group=None, prepare=False):
+        """Return a key, decoding it on first use.
+
+        @param name    The name (`str`) of the key.
+        @param group   The `PairingGroup` used within the underlying
+        crypto. If not given, the group recorded within the store is
+        used.
+        @param prepare Prepare decryption keys for repeated decryption,
+        see `pebel.prepared.prepare_key`.
+
+        @return The key.
+
+        @throws PebelException If there is no such key, or the recorded
+        group differs from the given group.
+        """
+        try:
+            offset, size, gname, compression = self._index[name]
+        except KeyError:
+            raise PebelException("No such key: {0}".format(name))
+        if group is None:
+            group = get_group(gname)
+        else:
+            check_group(gname, group)
+        cache_key = (name, prepare)
+        with self._lock:
+            key = self._keys.get(cache_key)
+            if key is not None:
+                self._keys.move_to_end(cache_key)
+                return key
+        key = self._read(self._base + offset, group, compression)
+        if prepare:
+            key = prepare_key(group, key)
+        with self._lock:
+            self._keys[cache_key] = key
+            while len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+        return key
+
+    def _read(self, offset, group, compression):
+        view = memoryview(self._map)
+        try:
+            size, = _SIZE.unpack_from(view, offset)
+            offset += _SIZE.size
+            structure = json.loads(bytes(view[offset:offset + size]))
+            offset += size
+            elements = []
+            count = _count_elements(structure)
+            for _ in range(count):
+                size, = _SIZE.unpack_from(view, offset)
+                offset += _SIZE.size
+                elements.append(bytes(view[offset:offset + size]))
+                offset += size
+        finally:
+            view.release()
+        return _decode(structure, group, elements, compression)
+
+    def clear(self):
+        """Drop every decoded key held by this process."""
+        with self._lock:
+            self._keys.clear()
+
+    def close(self):
+        """Unmap the store."""
+        self.clear()
+        self._map.close()
+
+
+def _count_elements(obj):
+    if isinstance(obj, dict):
+        return sum(_count_elements(v) for v in obj.values())
+    if isinstance(obj, list):
+        return sum(_count_elements(v) for v in obj)
+    if isinstance(obj, str) and obj.startswith('elem:'):
+        return 1
+    return 0
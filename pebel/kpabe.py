@@ -26,6 +26,12 @@ The generated ciphertext is a linear combination of:
  3. The encrypted session key.
  4. The AES encrypted plaintext.
 
+The encrypted session key records the names of the pairing group and
+scheme used, such that the group need not be known in advance to
+decrypt and the scheme can be chosen by `pebel.schemes`. It also
+records the codec, if any, with which the plaintext was compressed
+before encryption, see `pebel.compress`.
+
 @author Jan de Muijnck-Hughes <jfdm@st-andrews.ac.uk>
 
 """
@@ -42,21 +48,47 @@ import sys
 import struct
 import os
 
-from charm.toolbox.pairinggroup import PairingGroup, GT
+from charm.toolbox.pairinggroup import PairingGroup, GT, ZR, G1
 from charm.schemes.abenc.abenc_lsw08 import KPabe
-from charm.core.engine.util import objectToBytes, bytesToObject
-from charm.core.math.pairing import hashPair as sha
+from charm.core.engine.util import objectToBytes
 
 from Crypto.Cipher import AES
 from Crypto import Random
 
+from pebel import instrument
+from pebel.compress import (
+    CHUNK_SIZE,
+    compress_data,
+    decompress_data,
+    read_compression
+)
 from pebel.exceptions import PebelDecryptionException
+from pebel.groups import (
+    GROUP_FIELD,
+    SCHEME_FIELD,
+    COMPRESSION_FIELD,
+    PREPARED_FIELD
+)
+from pebel.hashcache import get_hash_cache
+from pebel.policycache import compile_policy
 from pebel.util import (
     write_key_to_file,
     read_key_from_file,
+    read_ciphertext_header,
+    read_structure,
+    read_structure_lazily,
+    resolve_group,
+    pair_product,
+    precompute,
+    check_group,
+    check_scheme,
+    derive_key,
     read_data
 )
 
+## The name of the scheme, as recorded within encrypted session keys.
+SCHEME = 'lsw08'
+
 def kpabe_setup(group):
     """Generates the master key pair for the Lewko2008rsw KP-ABE Scheme.
 
@@ -70,18 +102,163 @@ def kpabe_setup(group):
 def kpabe_keygen(group, msk, mpk, policy):
     """Generates an decryption key using the Lewmko2008rws KP-ABE Scheme.
 
+    The key is generated as by `KPabe.keygen`, but the policy is parsed
+    once and shared out using its cached layout, see
+    `pebel.policycache`.
+
     @param group The `PairingGroup` used within the underlying crypto.
     @param msk The master secret key of type `mk_t`.
     @param mpk The master public key of type `pk_t`.
     @param policy The policy `str` used to generate the decryption key.
 
-
     @return The generated decryption key of type `sk_t`.
     """
-    return KPabe(group).keygen(mpk, msk, policy)
+    hashes = get_hash_cache(group)
+    compiled = compile_policy(policy)
+    shares = compiled.shares(group, msk['alpha1'])
+    deckey = {'policy': policy}
+    for x in compiled.attributes:
+        d = []
+        if x[0] != '!':
+            r = group.random(ZR)
+            d.append((mpk['g_G1'] ** (msk['alpha2'] * shares[x]))
+                     * (hashes.hash(compiled.names[x], G1) ** r))
+            d.append(mpk['g_G2'] ** r)
+        deckey[x] = d
+    return deckey
+
+
+def kpabe_encapsulate(group, mpk, attributes, trace=None, session_key=None,
+                      compression=None):
+    """Encapsulates a fresh session key using the Lewmko2008rws
+    KP-ABE Scheme.
+
+    @param group The `PairingGroup` used within the underlying crypto.
+    @param mpk   The Master Public Key of type `pk_t`.
+    @param attributes The set of `str` attributes under which to
+                      encapsulate the session key.
+    @param trace An optional `pebel.instrument.Trace` to report to.
+    @param session_key The session key to encapsulate. By default a
+                       fresh session key is chosen.
+    @param compression The name (`str`) of the codec with which the
+                       payload is compressed, recorded within the
+                       encrypted session key, or None.
+
+    @return A tuple `(session_key, session_key_ctxt_b)` containing the
+            session key, an element of GT, and its serialised encryption.
+
+    """
+    if session_key is None:
+        session_key = group.random(GT)
+    session_key_ctxt = KPabe(get_hash_cache(group)).encrypt(
+        mpk, session_key, [a.upper() for a in attributes])
+    session_key_ctxt[GROUP_FIELD] = group.groupType()
+    session_key_ctxt[SCHEME_FIELD] = SCHEME
+    if compression is not None:
+        session_key_ctxt[COMPRESSION_FIELD] = compression
+    if trace: trace.mark('kem')
+    session_key_ctxt_b = objectToBytes(session_key_ctxt, group)
+    if trace: trace.mark('serialize', header=len(session_key_ctxt_b))
+    return session_key, session_key_ctxt_b
+
+
+def _decrypt(group, deckey, session_key_ctxt):
+    """Decrypts an encrypted session key as `KPabe.decrypt`, but
+    evaluating every pairing as a single product of pairings.
+
+    The Lagrange coefficients are moved from GT into the exponents of
+    the arguments in G1. The pairings with E2 share their second
+    argument and are merged into one, i.e.
+
+        E1 e(prod_y D_y0^-c_y, E2) prod_y e(E3_x^c_y, D_y1)
+
+    For keys prepared by `kpabe_prepare_key` the exponentiations of
+    D_y0 use their precomputed tables.
+
+    @return The session key, or False if the attributes do not satisfy
+            the policy of deckey.
+    """
+    policy = compile_policy(deckey['policy'])
+    pruned = policy.prune(session_key_ctxt['attributes'])
+    if not pruned:
+        return False
+    coeff = policy.coefficients(group)
+    merged = None
+    lhs, rhs = [], []
+    for leaf in pruned:
+        x = leaf.getAttribute()
+        y = leaf.getAttributeAndIndex()
+        if y[0] == '!':
+            continue
+        d0 = deckey[y][0] ** -coeff[y]
+        merged = d0 if merged is None else merged * d0
+        lhs.append(session_key_ctxt['E3'][x] ** coeff[y])
+        rhs.append(deckey[y][1])
+    if merged is None:
+        return session_key_ctxt['E1']
+    lhs.append(merged)
+    rhs.append(session_key_ctxt['E2'])
+    return session_key_ctxt['E1'] * pair_product(group, lhs, rhs)
+
+
+def kpabe_prepare_key(group, deckey):
+    """Prepares a decryption key for repeated decryption.
+
+    The tables used to raise the elements of the key to the
+    coefficients of each set of attributes are precomputed, in place.
+    Prepared keys are used as any other key, but the tables are held
+    in memory only and are not serialised.
+
+    @param group  The `PairingGroup` used within the underlying crypto.
+    @param deckey The decryption key of type `sk_t`.
+
+    @return The prepared decryption key.
+    """
+    if deckey.get(PREPARED_FIELD):
+        return deckey
+    prepared = dict(deckey)
+    for y, d in deckey.items():
+        if isinstance(d, list) and d:
+            prepared[y] = [precompute(d[0])] + d[1:]
+    prepared[PREPARED_FIELD] = True
+    return prepared
 
 
-def kpabe_encrypt(group, mpk, ptxt, attributes):
+def kpabe_decapsulate(group, mpk, deckey, session_key_ctxt_b, trace=None,
+                      structure=None):
+    """Recovers a session key encapsulated using the Lewmko2008rws
+    KP-ABE Scheme.
+
+    @param group  The `PairingGroup` used within the underlying crypto.
+    @param mpk    The Master Public Key of type `pk_t`.
+    @param deckey The decryption key of type `sk_t`.
+    @param session_key_ctxt_b The serialised encryption of the session key.
+    @param trace  An optional `pebel.instrument.Trace` to report to.
+    @param structure The structure of session_key_ctxt_b, as returned by
+    `pebel.util.read_structure`, if already read.
+
+    @return The session key, an element of GT.
+
+    @throws PebelDecryptionException If deckey cannot decrypt the
+            session key.
+    @throws PebelException If the session key was encapsulated within a
+            different group.
+
+    """
+    session_key_ctxt = read_structure_lazily(
+        session_key_ctxt_b if structure is None else structure, group)
+    check_group(session_key_ctxt.pop(GROUP_FIELD, None), group)
+    check_scheme(session_key_ctxt.pop(SCHEME_FIELD, None), SCHEME)
+    if trace: trace.mark('deserialize', header=len(session_key_ctxt_b))
+    session_key = _decrypt(group, deckey, session_key_ctxt)
+    if trace: trace.mark('kem')
+    if not session_key:
+        raise PebelDecryptionException("Unable to decrypt given ciphertext")
+    return session_key
+
+
+def kpabe_encrypt(group, mpk, ptxt, attributes, pool=None,
+                  compression=None):
     """Encrypts a plaintext using the Lewmko2008rws KP-ABE Scheme.
 
     @param group The `PairingGroup` used within the underlying crypto.
@@ -90,32 +267,41 @@ def kpabe_encrypt(group, mpk, ptxt, attributes):
     containing the plaintext.
     @param attributes The set of `str` attributes used to encrypt the
     plaintext.
+    @param pool An optional `pebel.pool.EncapsulationPool` from which to
+    take precomputed encapsulations.
+    @param compression The codec with which to compress the plaintext
+    before encryption, `pebel.compress.AUTO` to compress only
+    compressible plaintexts, or None.
 
     @return The encrypted data returned as a `bytearray`.
     """
-    kpabe = KPabe(group)
-
-    session_key = group.random(GT)
-    session_key_ctxt = kpabe.encrypt(mpk,
-                                     session_key,
-                                     [a.upper() for a in attributes])
-    ctxt = io.BytesIO()
-
-    iv = Random.new().read(AES.block_size)
-    symcipher = AES.new(sha(session_key)[0:32], AES.MODE_CFB, iv)
-
-    ctxt.write(bytes(iv))
-
-    session_key_ctxt_b = objectToBytes(session_key_ctxt, group)
-    ctxt.write(struct.pack('Q' ,len(session_key_ctxt_b)))
-    ctxt.write(session_key_ctxt_b)
-
-    for b in read_data(bin_data=ptxt, chunksize=AES.block_size):
-        ctxt.write(symcipher.encrypt(b))
-        ctxt.flush()
-
-    return ctxt.getvalue()
-
+    with instrument.traced('kpabe_encrypt', group) as trace:
+        compression, chunks = compress_data(ptxt, compression)
+        if pool is not None:
+            session_key, session_key_ctxt_b = pool.encapsulate(
+                attributes, trace, compression)
+        else:
+            session_key, session_key_ctxt_b = kpabe_encapsulate(
+                group, mpk, attributes, trace, compression=compression)
+        ctxt = io.BytesIO()
+
+        iv = Random.new().read(AES.block_size)
+        symcipher = AES.new(derive_key(session_key), AES.MODE_CFB, iv)
+        if trace: trace.mark('kdf')
+
+        ctxt.write(bytes(iv))
+        ctxt.write(struct.pack('Q', len(session_key_ctxt_b)))
+        ctxt.write(session_key_ctxt_b)
+
+        for b in chunks:
+            ctxt.write(symcipher.encrypt(b))
+            ctxt.flush()
+
+        if trace:
+            trace.mark('dem')
+            trace.end(payload=ctxt.tell() - len(session_key_ctxt_b)
+                      - AES.block_size - struct.calcsize('Q'))
+        return ctxt.getvalue()
 
 
 def kpabe_decrypt(group, mpk, deckey, ctxt):
@@ -125,7 +311,8 @@ def kpabe_decrypt(group, mpk, deckey, ctxt):
     generate the cipher-text can be satisfied by the policy within the
     decryption key.
 
-    @param group  The `PairingGroup` used within the underlying crypto.
+    @param group  The `PairingGroup` used within the underlying crypto,
+                  or None to use the group recorded in the ciphertext.
     @param mpk    The Master Public Key of type `mk_t`.
     @param deckey The decryption key of type `sk_t`.
     @param ctxt   The `bytearray` resulting from `io.open` or `io.IOBytes`
@@ -135,22 +322,26 @@ def kpabe_decrypt(group, mpk, deckey, ctxt):
 
     @throw PebelDecryptionException if deckey cannot satisfy the
             policy within the ciphertext.
+    @throw PebelException if the ciphertext was generated within a
+            different group.
     """
-    kpabe = KPabe(group)
-
     ptxt = io.BytesIO()
 
-    iv = ctxt.read(AES.block_size)
-    session_key_size = struct.unpack('<Q',
-                                     ctxt.read(struct.calcsize('Q')))[0]
-    session_key_ctxt = bytesToObject(ctxt.read(session_key_size), group)
-    session_key = kpabe.decrypt(session_key_ctxt, deckey)
-
-    if session_key:
-        symcipher = AES.new(sha(session_key)[0:32], AES.MODE_CFB, iv)
-        for b in read_data(bin_data=ctxt, chunksize=AES.block_size):
-            ptxt.write(symcipher.decrypt(b))
+    iv, session_key_ctxt_b = read_ciphertext_header(ctxt, AES.block_size)
+    structure = read_structure(session_key_ctxt_b)
+    group = resolve_group(group, structure)
+    compression = read_compression(structure)
+    with instrument.traced('kpabe_decrypt', group) as trace:
+        session_key = kpabe_decapsulate(group, mpk, deckey,
+                                        session_key_ctxt_b, trace, structure)
+
+        symcipher = AES.new(derive_key(session_key), AES.MODE_CFB, iv)
+        if trace: trace.mark('kdf')
+        chunks = read_data(bin_data=ctxt, chunksize=CHUNK_SIZE)
+        for b in decompress_data(map(symcipher.decrypt, chunks), compression):
+            ptxt.write(b)
             ptxt.flush()
+        if trace:
+            trace.mark('dem')
+            trace.end(payload=ptxt.tell())
         return ptxt.getvalue()
-    else:
-        raise PebelDecryptionException("Unable to decrypt given ciphertext")
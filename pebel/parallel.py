@@ -0,0 +1,165 @@
+"""@package pebel.parallel
+
+Parallel encapsulation under very large policies.
+
+Encapsulating a session key under a policy of n leaves costs two
+exponentiations and a hash into the group per leaf. Policies that are
+disjunctions over thousands of users or groups thus spend seconds on a
+single core. Once a policy has `PARALLEL_LEAVES` leaves or more,
+`pebel.cpabe.cpabe_encapsulate_online` hands the per-leaf work to a
+process wide pool of worker processes, see `leaf_components`.
+
+The shares are sent to the workers serialised, and the workers return
+the leaf components serialised, as they appear within the encrypted
+session key. The components are not decoded again: `EncodedGroup`
+writes them into the encrypted session key as they are, such that the
+result is byte for byte that of a sequential encapsulation.
+
+Each worker keeps the fixed-base exponentiation table of the
+generator, and its own hash cache, across requests. The pool is
+created on first use and sized by `configure`.
+
+Parallel encapsulation is off until enabled by `configure`. The
+workers are spawned, and so import the main module of the program:
+call `configure` only from programs whose main module is guarded by
+`if __name__ == '__main__':`.
+
+@author Jan de Muijnck-Hughes <jfdm@st-andrews.ac.uk>
+
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from charm.toolbox.pairinggroup import G2
+
+from pebel.groups import get_group
+from pebel.hashcache import get_hash_cache
+from pebel.util import precompute
+
+## The number of policy leaves from which encapsulation is parallel.
+PARALLEL_LEAVES = 512
+
+## The number of tasks the leaves are split into per worker.
+TASKS_PER_WORKER = 4
+
+_config = {'workers': 1, 'threshold': PARALLEL_LEAVES}
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class Encoded:
+    """A group element held in its serialised form."""
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+
+class EncodedGroup:
+    """A `PairingGroup` serialising `Encoded` elements as they are."""
+    def __init__(self, group):
+        self.group = group
+
+    def __getattr__(self, name):
+        return getattr(self.group, name)
+
+    def serialize(self, obj):
+        if isinstance(obj, Encoded):
+            return obj.data
+        return self.group.serialize(obj)
+
+
+def configure(workers=None, threshold=PARALLEL_LEAVES):
+    """Configure, and enable, parallel encapsulation.
+
+    The running pool, if any, is shut down and recreated on next use.
+
+    @param workers   The number of worker processes, by default one per
+    core. One or less disables parallel encapsulation.
+    @param threshold The number of policy leaves from which to
+    encapsulate in parallel.
+    """
+    global _executor
+    with _executor_lock:
+        if workers is None:
+            workers = os.cpu_count() or 1
+        _config['workers'] = max(workers, 1)
+        _config['threshold'] = threshold
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown()
+
+
+def parallel_leaves(n):
+    """Decide whether to compute the components of n leaves in
+    parallel.
+
+    @param n The number of leaves (`int`).
+
+    @return True if the leaves are to be computed by `leaf_components`.
+    """
+    return _config['workers'] > 1 and n >= _config['threshold']
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Worker processes are spawned rather than forked, as the
+            # encapsulation pools of `pebel.pool` run in threads.
+            _executor = ProcessPoolExecutor(
+                _config['workers'],
+                mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+
+## The generators, with their tables, used by the worker process.
+_generators = {}
+
+
+def _exponentiate(task):
+    """Compute the serialised components of a slice of leaves."""
+    name, g_b, leaves = task
+    group = get_group(name)
+    g = _generators.get((name, g_b))
+    if g is None:
+        g = _generators[(name, g_b)] = precompute(group.deserialize(g_b))
+    hashes = get_hash_cache(group)
+    components = []
+    for attribute, leaf, share_b in leaves:
+        share = group.deserialize(share_b)
+        components.append((attribute, group.serialize(g ** share),
+                           group.serialize(hashes.hash(leaf, G2) ** share)))
+    return components
+
+
+def leaf_components(group, g, shares, names):
+    """Compute the leaf components of a Bethencourt2007cae encapsulation
+    in parallel.
+
+    @param group  The `PairingGroup` used within the underlying crypto.
+    @param g      The generator `g` of the Master Public Key.
+    @param shares A `dict` mapping each attribute, with its index, to its
+    share.
+    @param names  A `dict` mapping each attribute, with its index, to the
+    attribute hashed into the group.
+
+    @return A tuple `(C_y, C_y_pr)` of `dict`s mapping each attribute to
+    its `Encoded` components, for serialisation with `EncodedGroup`.
+    """
+    executor = _get_executor()
+    name = group.groupType()
+    g_b = group.serialize(g)
+    leaves = [(a, names[a], group.serialize(s)) for a, s in shares.items()]
+    size = -(-len(leaves) // (_config['workers'] * TASKS_PER_WORKER))
+    tasks = [(name, g_b, leaves[i:i + size])
+             for i in range(0, len(leaves), size)]
+    C_y, C_y_pr = {}, {}
+    for components in executor.map(_exponentiate, tasks):
+        for attribute, c_y, c_y_pr in components:
+            C_y[attribute] = Encoded(c_y)
+            C_y_pr[attribute] = Encoded(c_y_pr)
+    return C_y, C_y_pr
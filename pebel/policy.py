@@ -62,11 +62,28 @@ ensures that only these values can be chosen and that the
 non-permissible values a >= 11 will not be.
 """
 
+import functools
+import re
+import sys
+import threading
+import weakref
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from pebel.util import bitmarker
 
 
 __all__ = ["convertNumericalComparison",
-           "constructNumericalAttribute"
+           "numericalComparisonTree",
+           "constructNumericalAttribute",
+           "constructNumericalAttributes",
+           "readNumericalAttribute",
+           "bitmarkerTable",
+           "parsePolicy",
+           "policySatisfied"
            ]
 
 def convertNumericalComparison(name, gt, value, nbits=32):
@@ -90,6 +107,17 @@ def convertNumericalComparison(name, gt, value, nbits=32):
     @rtype: str
     @return: Returns a string containing the comparison in Base-2.
     """
+    return policyToString(numericalComparisonTree(name, gt, value, nbits))
+
+def numericalComparisonTree(name, gt, value, nbits=32):
+    """Construct the policy tree representing a numerical comparison.
+
+    See L{convertNumericalComparison} for the meaning of the
+    parameters.
+
+    @rtype: PolicyTree
+    @return: The root of the comparison's policy tree.
+    """
     # Find right most used bit
     i = 0
     while bool(1 << i & value) if gt else not bool(1 << i & value):
@@ -108,7 +136,7 @@ def convertNumericalComparison(name, gt, value, nbits=32):
         p = kof2_policy(node_type, p,
                         leaf_policy(bitmarker(name, nbits, i, int(gt))))
 
-    return policyToString(p)
+    return p
 
 def constructNumericalAttribute(name, value, nbits):
     """Transforms an attribute assignment into the base-2 bit masking
@@ -127,11 +155,123 @@ def constructNumericalAttribute(name, value, nbits):
     @return: A list of bit markers representing the value of each bit
     in the base-2 representaiton.
     """
-    attributes = [];
-    for i in range(0,nbits):
-        bit = int(bool(1 << i & value))
-        attributes.append(bitmarker(name,nbits,i,bit))
-    return attributes
+    table = bitmarkerTable(name, nbits)
+    return [table[i][(value >> i) & 1] for i in range(0, nbits)]
+
+def constructNumericalAttributes(columns, nbits=32, chunksize=4096):
+    """Bulk form of L{constructNumericalAttribute}.
+
+    Given the values of one or more numerical attributes for many
+    users, yield the bit markers of each user in turn. The bit
+    decomposition is performed with NumPy, one chunk of users at a
+    time, when it is available. Marker strings are taken from
+    L{bitmarkerTable} and are shared between users.
+
+    @type columns: Dict[str, Sequence[int]]
+    @param columns: Maps each attribute name to the values of that
+    attribute, one per user. All sequences must be of equal length.
+
+    @type nbits: int
+    @param nbits: The word size used to represent integers.
+
+    @type chunksize: int
+    @param chunksize: The number of users decomposed at once.
+
+    @rtype: Iterator[List[str]]
+    @return: For each user, the bit markers of every attribute in the
+    order given by columns.
+
+    @raise ValueError: If the columns differ in length, or a value is
+    not representable in nbits bits.
+    """
+    names = list(columns)
+    values = [list(columns[name]) for name in names]
+    if len(set(len(v) for v in values)) > 1:
+        raise ValueError("All attribute columns must be of equal length.")
+    limit = 1 << nbits
+    for name, column in zip(names, values):
+        if column and (min(column) < 0 or max(column) >= limit):
+            raise ValueError(
+                "Values of {0} must lie in [0, 2^{1}).".format(name, nbits))
+    tables = [bitmarkerTable(name, nbits) for name in names]
+    nrows = len(values[0]) if values else 0
+
+    if numpy is None or nbits > 64:
+        for row in range(nrows):
+            attributes = []
+            for table, column in zip(tables, values):
+                value = column[row]
+                attributes.extend(table[i][(value >> i) & 1]
+                                  for i in range(nbits))
+            yield attributes
+        return
+
+    positions = numpy.arange(nbits)
+    shifts = positions.astype(numpy.uint64)
+    tables = [numpy.array(table, dtype=object) for table in tables]
+    for start in range(0, nrows, chunksize):
+        blocks = []
+        for table, column in zip(tables, values):
+            chunk = numpy.array(column[start:start + chunksize],
+                                dtype=numpy.uint64)
+            bits = ((chunk[:, None] >> shifts) & 1).astype(numpy.intp)
+            blocks.append(table[positions, bits])
+        for row in numpy.concatenate(blocks, axis=1):
+            yield row.tolist()
+
+def readNumericalAttribute(name, attributes, nbits):
+    """Recover the value of a numerical attribute from its bit markers.
+
+    The inverse of L{constructNumericalAttribute}. Names are compared
+    without regard to case, as the policy parser upper-cases
+    attributes.
+
+    @type name: str
+    @param name: The name of the attribute.
+
+    @type attributes: Iterable[str]
+    @param attributes: An attribute set, as held within a key.
+
+    @type nbits: int
+    @param nbits: The word size used to represent integers.
+
+    @rtype: int
+    @return: The value of the attribute, or None if the attribute set
+    does not hold a marker for every bit.
+    """
+    prefix = name.upper() + ":"
+    value = 0
+    seen = set()
+    for attribute in attributes:
+        attribute = attribute.upper()
+        if not attribute.startswith(prefix):
+            continue
+        bits = attribute[len(prefix):]
+        marked = [i for i, c in enumerate(bits) if c != "X"]
+        if len(bits) != nbits or len(marked) != 1:
+            continue
+        pos = nbits - marked[0] - 1
+        seen.add(pos)
+        value |= int(bits[marked[0]]) << pos
+    return value if len(seen) == nbits else None
+
+@functools.lru_cache(maxsize=1024)
+def bitmarkerTable(name, nbits):
+    """Construct every bit marker of a numerical attribute.
+
+    @type name: str
+    @param name: The name of the attribute.
+
+    @type nbits: int
+    @param nbits: The word size used to represent integers.
+
+    @rtype: Tuple[Tuple[str, str]]
+    @return: The markers indexed first by bit position (from lsb) and
+    then by bit value.
+    """
+    return tuple((sys.intern(bitmarker(name, nbits, i, 0)),
+                  sys.intern(bitmarker(name, nbits, i, 1)))
+                 for i in range(nbits))
 
 
 def leaf_policy(value):
@@ -153,12 +293,25 @@ def kof2_policy(k, left, right):
     @rtype: Node
     @return: A k of 2 theshold node.
     """
-    return PolicyTree("", k, children=[left,right])
+    return PolicyTree("", k, children=(left, right))
 
-class PolicyTree:
+class PolicyTree(object):
     """Internal class used to represent a boolean access policy.
+
+    Nodes are immutable and hash-consed: constructing a node that is
+    structurally identical to a live node returns the existing
+    instance. Leaf values are interned, so large generated policies
+    that repeat the same bit markers share both their strings and
+    their subtrees. As a consequence, structural equality of two
+    nodes is identity, including for nodes constructed concurrently by
+    many threads.
     """
-    def __init__(self, value, k=1, children=[]):
+    __slots__ = ("value", "k", "children", "__weakref__")
+
+    _nodes = weakref.WeakValueDictionary()
+    _nodes_lock = threading.Lock()
+
+    def __new__(cls, value, k=1, children=()):
         """Construct a new policy node.
 
         Leaf nodes contain a value with a threshold value of
@@ -174,11 +327,33 @@ class PolicyTree:
         @param children: The nodes child nodes.
 
         @rtype: Node
-        @return: A new policy node.
+        @return: A new, or the existing shared, policy node.
         """
-        self.k = k
-        self.value = value;
-        self.children = children
+        if isinstance(value, str):
+            value = sys.intern(value)
+        children = tuple(children)
+        # Children are canonical, so their identity is their structure.
+        key = (value, k, children)
+        # Lookup and insertion are one step, such that threads never
+        # create distinct equal nodes.
+        with cls._nodes_lock:
+            node = cls._nodes.get(key)
+            if node is None:
+                node = object.__new__(cls)
+                object.__setattr__(node, "value", value)
+                object.__setattr__(node, "k", k)
+                object.__setattr__(node, "children", children)
+                cls._nodes[key] = node
+        return node
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PolicyTree nodes are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("PolicyTree nodes are immutable")
+
+    def __reduce__(self):
+        return (PolicyTree, (self.value, self.k, self.children))
 
     def isLeaf(self):
         return not self.children
@@ -207,7 +382,31 @@ class PolicyTree:
             return "Leaf"
         else:
             return "and" if self.k==2 else "or"
-        
+
+    def walk(self):
+        """Iterate over the nodes of the policy in pre-order.
+
+        Traversal is iterative, so arbitrarily deep policies will not
+        exhaust the interpreter stack. Shared subtrees are visited once
+        per occurrence.
+
+        @rtype: Iterator[Node]
+        @return: Each node within the policy.
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+    def leaves(self):
+        """Iterate over the leaf values of the policy, left to right.
+
+        @rtype: Iterator[object]
+        @return: The value of each leaf node.
+        """
+        return (node.value for node in self.walk() if node.isLeaf())
+
     def __str__(self):
         return "{0} {1}".format(self.getType(), self.value)
 
@@ -216,16 +415,112 @@ def policyToString(policy):
     """Utility function to print the policy in-fix to STDOUT"""
     if not policy:
         return
-    s = ""
-    if policy.children:
-        s += "(" + policyToString(policy.children[0]) + " "
-    if policy.isLeaf():
-        s+= policy.value
-    else:
-        s += policy.getTypeStr()
-    if policy.children:
-        s += " " + policyToString(policy.children[1]) + ")"
-    return s.replace("  ", " ")
+    out = []
+    # Iterative in-order walk; closing brackets are pushed as strings.
+    stack = [policy]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, str):
+            out.append(node)
+        elif node.isLeaf():
+            out.append(node.value)
+        else:
+            left, right = node.children
+            stack.extend((")", right,
+                          " " + node.getTypeStr() + " ",
+                          left, "("))
+    return "".join(out).replace("  ", " ")
+
+
+_POLICY_TOKENS = re.compile(r"\(|\)|[^\s()]+")
+_POLICY_OPERATORS = {"and": 2, "AND": 2, "or": 1, "OR": 1}
+
+def parsePolicy(policy):
+    """Parse a policy string into a L{PolicyTree}.
+
+    The grammar and semantics follow those of the Charm policy parser:
+    leaf attributes are upper-cased, and 'and'/'or' have equal
+    precedence and associate to the right, such that::
+
+        A and B or C
+
+    is read as `A and (B or C)`. Parsing is iterative, so policies with
+    many thousands of leaves are supported.
+
+    @type policy: str
+    @param policy: The policy to parse.
+
+    @rtype: PolicyTree
+    @return: The root of the policy tree.
+
+    @raise ValueError: If the policy is malformed.
+    """
+    # Each frame holds the operands and operators of one bracketed
+    # expression; it is folded from the right once it is closed.
+    frames = [([], [])]
+    expect_operand = True
+    for token in _POLICY_TOKENS.findall(policy):
+        operands, operators = frames[-1]
+        if token == "(" and expect_operand:
+            frames.append(([], []))
+        elif token == ")" and not expect_operand and len(frames) > 1:
+            frames.pop()
+            frames[-1][0].append(_foldPolicy(operands, operators))
+            expect_operand = False
+        elif token in _POLICY_OPERATORS and not expect_operand:
+            operators.append(_POLICY_OPERATORS[token])
+            expect_operand = True
+        elif token not in "()" and token not in _POLICY_OPERATORS \
+                and expect_operand:
+            operands.append(leaf_policy(token.upper()))
+            expect_operand = False
+        else:
+            raise ValueError("Unexpected {0!r} in policy: {1}".format(
+                token, policy))
+    if expect_operand or len(frames) > 1:
+        raise ValueError("Incomplete policy: {0}".format(policy))
+    operands, operators = frames[0]
+    return _foldPolicy(operands, operators)
+
+def _foldPolicy(operands, operators):
+    """Combine operands with right associative threshold gates."""
+    p = operands[-1]
+    for i in range(len(operators) - 1, -1, -1):
+        p = kof2_policy(operators[i], operands[i], p)
+    return p
+
+def policySatisfied(policy, attributes):
+    """Determine whether a set of attributes satisfies a policy.
+
+    Shared subtrees are evaluated once.
+
+    @type policy: PolicyTree
+    @param policy: The policy to evaluate.
+
+    @type attributes: Set[str]
+    @param attributes: The attributes held.
+
+    @rtype: bool
+    @return: True iff the attributes satisfy the policy.
+    """
+    results = {}
+    stack = [policy]
+    while stack:
+        node = stack[-1]
+        if node in results:
+            stack.pop()
+        elif node.isLeaf():
+            results[node] = node.value in attributes
+            stack.pop()
+        else:
+            pending = [c for c in node.children if c not in results]
+            if pending:
+                stack.extend(pending)
+            else:
+                satisfied = sum(results[c] for c in node.children)
+                results[node] = satisfied >= node.k
+                stack.pop()
+    return results[policy]
 
 """
 Note: The operations (a <= b) and (a >= b) are special cases of (a < b
@@ -245,7 +540,6 @@ def main():
     print(policy)
 
 if __name__ == '__main__':
-    import sys
     main()
 
 """
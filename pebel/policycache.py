@@ -0,0 +1,338 @@
+"""@package pebel.policycache
+
+A bounded cache of parsed policies and their secret sharing layout.
+
+Encrypting under a CP-ABE policy, or issuing a KP-ABE key for one,
+parses the policy with the pyparsing based parser of Charm and walks
+the resulting tree to share a secret among its leaves; decryption
+parses the policy once more to find the satisfying leaves and their
+Lagrange coefficients. Traffic tends to use a handful of recurring
+policies, yet every call pays for the parse.
+
+`compile_policy` parses each distinct policy once and keeps, in least
+recently used order, a `CompiledPolicy` holding:
+
+ - the tree, as returned by `SecretUtil.createPolicy`, but parsed with
+   `pebel.policy.parsePolicy`;
+ - the leaves of the tree, with their attributes, in order;
+ - the share layout, a flat list of the steps of the secret sharing
+   of `SecretUtil.calculateSharesDict`, such that sharing a secret
+   draws the random coefficients of each gate and evaluates the steps
+   in order without visiting the tree;
+ - the Lagrange coefficients of each leaf, per pairing group.
+
+Policies are keyed by their text with runs of white space collapsed.
+`pebel.cpabe` and `pebel.kpabe` share the cache within the process.
+
+Unlike the parser of Charm, `parsePolicy` accepts the bit markers of
+numerical attributes, e.g. `a:x1xx`, rejects policies with trailing
+input rather than keeping the leading expression, and is iterative.
+The tree is walked iteratively too, such that policies of many
+thousands of leaves, e.g. a flat disjunction of users, are supported.
+
+@author Jan de Muijnck-Hughes <jfdm@st-andrews.ac.uk>
+
+"""
+
+import collections
+import threading
+
+from charm.toolbox.pairinggroup import ZR
+from charm.toolbox.node import BinNode, OpType
+from charm.toolbox.secretutil import SecretUtil
+
+from pebel.exceptions import PebelException
+from pebel.policy import parsePolicy
+
+## The default number of policies held.
+POLICY_CACHE_SIZE = 1024
+
+
+def normalize_policy(policy):
+    """Normalise the text of a policy, collapsing runs of white space.
+
+    @param policy The policy `str`.
+
+    @return The normalised policy `str`.
+    """
+    return " ".join(policy.split())
+
+
+class CompiledPolicy:
+    """A parsed policy with its secret sharing layout.
+
+    Compiled policies are shared between threads and must not be
+    modified.
+    """
+    __slots__ = ('policy', 'tree', 'attributes', 'names', 'thresholds',
+                 'steps', 'leaves', '_coefficients')
+
+    def __init__(self, policy):
+        """Parse a policy and derive its layout.
+
+        @param policy The policy `str`.
+
+        @throws PebelException If the policy is malformed.
+        """
+        self.policy = policy
+        try:
+            self.tree = _create_tree(parsePolicy(policy))
+        except ValueError as e:
+            raise PebelException(str(e))
+        self.thresholds = []
+        self.steps = []
+        self.leaves = []
+        self.names = {}
+        self._coefficients = {}
+        stack = [(self.tree, -1, None, ())]
+        index = 0
+        while stack:
+            node, parent, gate, powers = stack.pop()
+            if parent >= 0:
+                self.steps.append((parent, gate, powers))
+            if node.getNodeType() == OpType.ATTR:
+                attribute = node.getAttributeAndIndex()
+                self.leaves.append((attribute, index))
+                self.names[attribute] = node.getAttribute()
+            else:
+                child_gate = len(self.thresholds)
+                k = node.threshold
+                self.thresholds.append(k)
+                children = _children(node)
+                for x in range(len(children), 0, -1):
+                    stack.append((children[x - 1], index, child_gate,
+                                  tuple(x ** d for d in range(1, k))))
+            index += 1
+        self.attributes = [attribute for attribute, _ in self.leaves]
+
+    def shares(self, group, secret):
+        """Share a secret among the leaves of the policy, as
+        `SecretUtil.calculateSharesDict`.
+
+        @param group  The `PairingGroup` used within the underlying
+        crypto.
+        @param secret The secret, an element of ZR.
+
+        @return A `dict` mapping each attribute, with its index, to its
+        share.
+        """
+        coeffs = [[group.random(ZR) for _ in range(k - 1)]
+                  for k in self.thresholds]
+        values = [secret]
+        for parent, gate, powers in self.steps:
+            value = values[parent]
+            for a, x in zip(coeffs[gate], powers):
+                value = value + a * x
+            values.append(value)
+        shares = {}
+        for attribute, i in self.leaves:
+            shares.setdefault(attribute, values[i])
+        return shares
+
+    def coefficients(self, group):
+        """Return the Lagrange coefficients of the leaves, as
+        `SecretUtil.getCoefficients`.
+
+        @param group The `PairingGroup` used within the underlying
+        crypto.
+
+        @return A `dict` mapping each attribute, with its index, to its
+        coefficient.
+        """
+        name = group.groupType()
+        coeffs = self._coefficients.get(name)
+        if coeffs is None:
+            util = SecretUtil(group, verbose=False)
+            gates = {OpType.AND: util.recoverCoefficients([1, 2]),
+                     OpType.OR: util.recoverCoefficients([1])}
+            coeffs = {}
+            stack = [(self.tree, 1)]
+            while stack:
+                node, coeff = stack.pop()
+                kind = node.getNodeType()
+                if kind == OpType.ATTR:
+                    coeffs[node.getAttributeAndIndex()] = coeff
+                    continue
+                for x, child in enumerate(_children(node), 1):
+                    stack.append((child, coeff * gates[kind][
+                        x if kind == OpType.AND else 1]))
+            self._coefficients[name] = coeffs
+        return coeffs
+
+    def prune(self, attributes):
+        """Select the leaves satisfied by a set of attributes, as
+        `SecretUtil.prune`.
+
+        @param attributes The `str` attributes.
+
+        @return The list of satisfied leaves, or False if the
+        attributes do not satisfy the policy.
+        """
+        return _prune(self.tree, set(attributes))
+
+
+def _children(node):
+    return [c for c in (node.getLeft(), node.getRight()) if c is not None]
+
+
+def _create_tree(policy):
+    """Build the tree of Charm for a parsed policy, as
+    `SecretUtil.createPolicy`, labelling duplicate attributes with
+    their index from left to right."""
+    leaves = []
+    built = []
+    stack = [(policy, False)]
+    while stack:
+        node, visited = stack.pop()
+        if node.isLeaf():
+            leaf = BinNode(node.value)
+            leaves.append(leaf)
+            built.append(leaf)
+        elif visited:
+            right = built.pop()
+            left = built.pop()
+            gate = BinNode(OpType.AND if node.k == 2 else OpType.OR)
+            gate.addSubNode(left, right)
+            built.append(gate)
+        else:
+            stack.append((node, True))
+            stack.extend((c, False) for c in reversed(node.children))
+    counts = collections.Counter(leaf.getAttribute() for leaf in leaves)
+    labels = {}
+    for leaf in leaves:
+        attribute = leaf.getAttribute()
+        if counts[attribute] > 1:
+            leaf.index = labels.get(attribute, 0)
+            labels[attribute] = leaf.index + 1
+    return built[0]
+
+
+def _prune(tree, attributes):
+    # Whether each node is satisfied, from the leaves up.
+    satisfied = {}
+    stack = [(tree, False)]
+    while stack:
+        node, visited = stack.pop()
+        if node.getNodeType() == OpType.ATTR:
+            satisfied[id(node)] = node.getAttribute() in attributes
+        elif visited:
+            satisfied[id(node)] = sum(
+                satisfied[id(c)] for c in _children(node)) >= node.threshold
+        else:
+            stack.append((node, True))
+            stack.extend((c, False) for c in _children(node))
+    if not satisfied[id(tree)]:
+        return False
+    # The leaves of the first satisfied children of each gate.
+    leaves = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if node.getNodeType() == OpType.ATTR:
+            leaves.append(node)
+        else:
+            chosen = [c for c in _children(node) if satisfied[id(c)]]
+            stack.extend(reversed(chosen[:node.threshold]))
+    return leaves
+
+
+class PolicyCache:
+    """A bounded cache of `CompiledPolicy` keyed by normalised policy.
+
+    The cache is safe to use from many threads.
+    """
+    def __init__(self, maxsize=POLICY_CACHE_SIZE):
+        """Create an empty cache.
+
+        @param maxsize The number of policies to hold. Zero disables
+        the cache.
+        """
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._policies = collections.OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, policy):
+        """Return the compiled form of a policy, compiling it once.
+
+        @param policy The policy `str`.
+
+        @return The `CompiledPolicy`.
+
+        @throws PebelException If the policy is malformed.
+        """
+        key = normalize_policy(policy)
+        with self._lock:
+            compiled = self._policies.get(key)
+            if compiled is not None:
+                self._policies.move_to_end(key)
+                self._hits += 1
+                return compiled
+            self._misses += 1
+        compiled = CompiledPolicy(key)
+        if self.maxsize > 0:
+            with self._lock:
+                self._policies[key] = compiled
+                while len(self._policies) > self.maxsize:
+                    self._policies.popitem(last=False)
+        return compiled
+
+    def resize(self, maxsize):
+        """Change the number of policies held, evicting as needed.
+
+        @param maxsize The number of policies to hold.
+        """
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._policies) > max(maxsize, 0):
+                self._policies.popitem(last=False)
+
+    def clear(self):
+        """Drop every policy held and reset the metrics."""
+        with self._lock:
+            self._policies.clear()
+            self._hits = 0
+            self._misses = 0
+
+    def metrics(self):
+        """Report the use of the cache.
+
+        @return A `dict` of the form::
+
+            {'hits': 1200, 'misses': 4, 'hit_rate': 0.997,
+             'size': 4, 'maxsize': 1024}
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / float(lookups) if lookups else 0.0,
+                'size': len(self._policies),
+                'maxsize': self.maxsize
+            }
+
+
+_cache = PolicyCache()
+
+
+def get_policy_cache():
+    """Return the process wide policy cache.
+
+    @return The `PolicyCache`.
+    """
+    return _cache
+
+
+def compile_policy(policy):
+    """Return the compiled form of a policy from the process wide
+    cache.
+
+    @param policy The policy `str`.
+
+    @return The `CompiledPolicy`.
+
+    @throws PebelException If the policy is malformed.
+    """
+    return _cache.get(policy)
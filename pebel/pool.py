@@ -0,0 +1,313 @@
+"""@package pebel.pool
+
+Online/offline encryption using a pool of precomputed encapsulations.
+
+The cost of encryption is dominated by the ABE encapsulation of the
+session key, which is independent of the plaintext. An
+`EncapsulationPool` uses background threads to precompute
+encapsulations while the process is otherwise idle, such that the
+online encryption is left with the symmetric encryption of the
+plaintext. Pass the pool to `pebel.cpabe.cpabe_encrypt` or
+`pebel.kpabe.kpabe_encrypt`.
+
+The pool holds, up to a bounded depth each:
+
+ 1. Complete encapsulations for each registered CP-ABE policy or
+    KP-ABE attribute set. Taking one costs nothing online.
+ 2. For CP-ABE, intermediate encapsulations independent of the
+    policy, see `pebel.cpabe.cpabe_encapsulate_offline`. Completing one
+    under any policy costs the exponentiations for each leaf, saving
+    the exponentiations in GT and G1 of the session key.
+
+When the pool has nothing to offer it falls back to a full
+encapsulation. Each encapsulation taken from the pool is used once.
+
+Complete encapsulations record the codec of the payload, see
+`pebel.compress`, so are held per policy or attribute set and codec.
+Register the codec encrypted with, e.g. `pebel.compress.AUTO_CODEC`,
+for compressed encryptions to take them.
+
+A background thread failing to encapsulate records the error, reported
+by `EncapsulationPool.metrics`, and carries on refilling the other
+pools. The failed pool is retried after a delay doubling with each
+consecutive failure, up to `MAX_RETRY_DELAY` seconds.
+
+@author Jan de Muijnck-Hughes <jfdm@st-andrews.ac.uk>
+
+"""
+
+import collections
+import threading
+import time
+
+from pebel.cpabe import (
+    cpabe_encapsulate,
+    cpabe_encapsulate_offline,
+    cpabe_encapsulate_online
+)
+from pebel.kpabe import kpabe_encapsulate
+
+## The key of the pool of intermediate encapsulations.
+_INTERMEDIATE = None
+
+## Marks that every pool is full.
+_FULL = object()
+
+## The delay in seconds before a background thread retries after a
+## failed encapsulation.
+RETRY_DELAY = 0.1
+
+## The longest delay in seconds between retries.
+MAX_RETRY_DELAY = 30.0
+
+
+class EncapsulationPool:
+    """A bounded pool of encapsulations refilled in the background.
+
+    The pool is safe to use from many threads.
+    """
+    def __init__(self, group, mpk, scheme='cpabe', depth=32, workers=1):
+        """Create an empty pool.
+
+        @param group   The `PairingGroup` used within the underlying
+        crypto.
+        @param mpk     The Master Public Key of the scheme.
+        @param scheme  The scheme (`str`) to encapsulate with, 'cpabe'
+        or 'kpabe'.
+        @param depth   The number of intermediate encapsulations to hold,
+        and the default number of encapsulations to hold for each
+        registered policy or attribute set.
+        @param workers The number of background threads to refill the
+        pool with, once started.
+        """
+        if scheme not in ('cpabe', 'kpabe'):
+            raise ValueError("Unknown scheme: {0}".format(scheme))
+        self.group = group
+        self.mpk = mpk
+        self.scheme = scheme
+        self.workers = workers
+        self._cond = threading.Condition()
+        self._pools = {}
+        self._depths = {}
+        self._access = {}
+        self._pending = collections.Counter()
+        self._threads = []
+        self._stopped = True
+        self._hits = 0
+        self._partial = 0
+        self._misses = 0
+        self._errors = 0
+        self._last_error = None
+        self._retries = {}
+        self._depth = depth
+        if scheme == 'cpabe':
+            self._add(_INTERMEDIATE, None, depth)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _key(self, access, compression):
+        if self.scheme == 'cpabe':
+            return access, compression
+        return frozenset(a.upper() for a in access), compression
+
+    def _add(self, key, access, depth):
+        with self._cond:
+            self._pools.setdefault(key, collections.deque())
+            self._depths[key] = depth
+            self._access[key] = access
+            self._cond.notify_all()
+
+    def register(self, access, depth=None, compression=None):
+        """Precompute complete encapsulations under a policy or
+        attribute set expected to be encrypted under often.
+
+        @param access      The policy `str` for CP-ABE, or the `str`
+        attributes for KP-ABE.
+        @param depth       The number of encapsulations to hold, by
+        default the depth of the pool.
+        @param compression The name (`str`) of the codec of the payloads
+        to be encrypted, or None.
+        """
+        self._add(self._key(access, compression), access,
+                  self._depth if depth is None else depth)
+
+    def start(self):
+        """Start the background threads refilling the pool."""
+        with self._cond:
+            if not self._stopped:
+                return
+            self._stopped = False
+        self._threads = [threading.Thread(target=self._work, daemon=True)
+                         for _ in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Stop the background threads. Held encapsulations are kept."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def fill(self):
+        """Fill the pool within the calling thread."""
+        while True:
+            with self._cond:
+                key = self._next()
+                if key is _FULL:
+                    return
+                self._pending[key] += 1
+            self._produce(key)
+
+    def _next(self):
+        """Return the key of the emptiest pool not awaiting a retry, or
+        `_FULL`."""
+        best, best_fill = _FULL, 1.0
+        now = time.monotonic()
+        for key, pool in self._pools.items():
+            depth = self._depths[key]
+            if depth <= 0:
+                continue
+            if key in self._retries and self._retries[key][1] > now:
+                continue
+            fill = (len(pool) + self._pending[key]) / float(depth)
+            if fill < best_fill:
+                best, best_fill = key, fill
+        return best
+
+    def _produce(self, key):
+        try:
+            if key is _INTERMEDIATE:
+                item = cpabe_encapsulate_offline(self.group, self.mpk)
+            elif self.scheme == 'cpabe':
+                item = cpabe_encapsulate(self.group, self.mpk,
+                                         self._access[key],
+                                         compression=key[1])
+            else:
+                item = kpabe_encapsulate(self.group, self.mpk,
+                                         self._access[key],
+                                         compression=key[1])
+        except Exception:
+            with self._cond:
+                self._pending[key] -= 1
+            raise
+        with self._cond:
+            self._pending[key] -= 1
+            self._pools[key].append(item)
+
+    def _wait(self):
+        """Wait for a change to the pool, or the next retry."""
+        timeout = None
+        if self._retries:
+            timeout = max(0.0, min(r[1] for r in self._retries.values())
+                          - time.monotonic())
+        self._cond.wait(timeout)
+
+    def _work(self):
+        while True:
+            with self._cond:
+                key = self._next()
+                while key is _FULL and not self._stopped:
+                    self._wait()
+                    key = self._next()
+                if self._stopped:
+                    return
+                self._pending[key] += 1
+            try:
+                self._produce(key)
+            except Exception as e:
+                with self._cond:
+                    self._errors += 1
+                    self._last_error = e
+                    delay = self._retries.get(key, (RETRY_DELAY / 2,))[0]
+                    delay = min(delay * 2, MAX_RETRY_DELAY)
+                    self._retries[key] = (delay, time.monotonic() + delay)
+            else:
+                if key in self._retries:
+                    with self._cond:
+                        self._retries.pop(key, None)
+
+    def encapsulate(self, access, trace=None, compression=None):
+        """Encapsulate a session key, using the pool where possible.
+
+        @param access      The policy `str` for CP-ABE, or the `str`
+        attributes for KP-ABE.
+        @param trace       An optional `pebel.instrument.Trace` to report
+        to.
+        @param compression The name (`str`) of the codec of the payload,
+        recorded within the encrypted session key, or None.
+
+        @return A tuple `(session_key, session_key_ctxt_b)` as returned by
+        `pebel.cpabe.cpabe_encapsulate` or `pebel.kpabe.kpabe_encapsulate`.
+        """
+        key = self._key(access, compression)
+        item = intermediate = None
+        with self._cond:
+            if self._pools.get(key):
+                item = self._pools[key].popleft()
+                self._hits += 1
+            elif self._pools.get(_INTERMEDIATE):
+                intermediate = self._pools[_INTERMEDIATE].popleft()
+                self._partial += 1
+            else:
+                self._misses += 1
+            self._cond.notify()
+
+        if item is not None:
+            if trace: trace.mark('kem')
+            return item
+        if intermediate is not None:
+            return cpabe_encapsulate_online(self.group, self.mpk,
+                                            intermediate, access, trace,
+                                            compression)
+        if self.scheme == 'cpabe':
+            return cpabe_encapsulate(self.group, self.mpk, access, trace,
+                                     compression=compression)
+        return kpabe_encapsulate(self.group, self.mpk, access, trace,
+                                 compression=compression)
+
+    def metrics(self):
+        """Report the state of the pool.
+
+        @return A `dict` of the form::
+
+            {'hits': 120, 'partial': 8, 'misses': 2,
+             'intermediate': 30,
+             'depth': {'ONE and TWO': 14, 'ONE and TWO [zlib]': 6},
+             'errors': 0, 'last_error': None}
+
+        where hits, partial and misses count the encapsulations
+        completed from the pool, from an intermediate encapsulation and
+        from scratch, intermediate is the number of intermediate
+        encapsulations held, depth maps each registered policy or
+        attribute set, followed by its codec if any, to the number of
+        encapsulations held for it, and
+        errors counts the failed encapsulations of the background
+        threads, the last of which is last_error.
+        """
+        with self._cond:
+            depth = {}
+            for key, pool in self._pools.items():
+                if key is not _INTERMEDIATE:
+                    access, compression = self._access[key], key[1]
+                    if not isinstance(access, str):
+                        access = " ".join(sorted(key[0]))
+                    if compression is not None:
+                        access += " [{0}]".format(compression)
+                    depth[access] = len(pool)
+            return {
+                'hits': self._hits,
+                'partial': self._partial,
+                'misses': self._misses,
+                'intermediate': len(self._pools.get(_INTERMEDIATE, ())),
+                'depth': depth,
+                'errors': self._errors,
+                'last_error': self._last_error
+            }
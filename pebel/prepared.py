@@ -0,0 +1,89 @@
+"""@package pebel.prepared
+
+Decryption keys prepared for repeated decryption.
+
+Long lived decryption services decrypt many ciphertexts with the same
+key. Each decryption raises elements of the key to the coefficients of
+the policy, or attribute set, of the ciphertext. Preparing a key
+precomputes, once, the fixed-base exponentiation tables of those
+elements; see `pebel.cpabe.cpabe_prepare_key` and
+`pebel.kpabe.kpabe_prepare_key`. Prepared keys are accepted by every
+decryption function in place of the key itself.
+
+Charm cannot serialise the tables, so prepared keys live in memory.
+`load_prepared_key` keeps the keys read from disk, prepared, within a
+bounded process wide cache, invalidated when the key file changes.
+
+@author Jan de Muijnck-Hughes <jfdm@st-andrews.ac.uk>
+
+"""
+
+import collections
+import os
+import threading
+
+from pebel.cpabe import cpabe_prepare_key
+from pebel.kpabe import kpabe_prepare_key
+from pebel.util import read_key_from_file
+
+## The number of prepared keys held by `load_prepared_key`.
+PREPARED_KEYS = 64
+
+_keys = collections.OrderedDict()
+_keys_lock = threading.Lock()
+
+
+def prepare_key(group, deckey):
+    """Prepare a decryption key of any scheme for repeated decryption.
+
+    Keys of schemes without preparation, such as `pebel.fame`, whose
+    decryption takes a constant number of pairings, are returned as is.
+
+    @param group  The `PairingGroup` used within the underlying crypto.
+    @param deckey The decryption key.
+
+    @return The prepared decryption key.
+    """
+    if 'Djp' in deckey:
+        return cpabe_prepare_key(group, deckey)
+    if 'policy' in deckey:
+        return kpabe_prepare_key(group, deckey)
+    return deckey
+
+
+def load_prepared_key(fname, group=None):
+    """Read a decryption key from disk, prepared for repeated
+    decryption.
+
+    Keys are read and prepared once, and held until the file changes
+    or `PREPARED_KEYS` other keys have been used since.
+
+    @param fname The name of the file (`str`) containing the key.
+    @param group The `PairingGroup` used within the underlying crypto.
+    If not given, the group recorded within the key is used.
+
+    @return The prepared decryption key.
+    """
+    path = os.path.realpath(fname)
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size,
+           group.groupType() if group is not None else None)
+    with _keys_lock:
+        deckey = _keys.get(key)
+        if deckey is not None:
+            _keys.move_to_end(key)
+            return deckey
+    deckey = prepare_key(group, read_key_from_file(fname, group))
+    with _keys_lock:
+        for stale in [k for k in _keys if k[0] == path]:
+            del _keys[stale]
+        _keys[key] = deckey
+        while len(_keys) > PREPARED_KEYS:
+            _keys.popitem(last=False)
+    return deckey
+
+
+def clear_prepared_keys():
+    """Drop every prepared key held by `load_prepared_key`."""
+    with _keys_lock:
+        _keys.clear()
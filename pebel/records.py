@@ -0,0 +1,286 @@
+"""@package pebel.records
+
+Provides record level encryption: many short records encrypted under
+a single encapsulated session key.
+
+Encrypting a database row or a message with `pebel.schemes.encrypt`
+attaches an IV, a length and a serialised ABE header, kilobytes in
+size, to every record. In record mode a batch, or partition, of
+records shares one session key, encapsulated once, using either the
+CP-ABE or KP-ABE scheme, into a record key header stored once
+alongside the batch. Each record then carries only a short key
+identifier, a nonce and an authentication tag.
+
+Records are encrypted using 256-bit AES in GCM mode with a random
+96-bit nonce, the key identifier being authenticated as associated
+data. Record mode requires the AES-GCM implementation of the
+`cryptography` package, installed with the `records` extra, as
+pyCrypto provides no GCM mode.
+
+The record key header is a linear combination of:
+
+ 1. The magic bytes `PEBELRK1`.
+ 2. The identifier of the scheme, see `pebel.schemes`, as an unsigned
+    byte.
+ 3. The size in bytes of the encrypted session key.
+ 4. The encrypted session key.
+
+The key identifier is the first `KEY_ID_SIZE` bytes of the SHA-256
+digest of the header. Each record is a linear combination of:
+
+ 1. The key identifier.
+ 2. The nonce.
+ 3. The encrypted record.
+ 4. The 128-bit authentication tag.
+
+A nonce must not repeat under a key, so a session key should encrypt
+no more than 2^32 records.
+
+@author Jan de Muijnck-Hughes <jfdm@st-andrews.ac.uk>
+
+"""
+
+import hashlib
+import os
+import struct
+
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    from cryptography.exceptions import InvalidTag
+except ImportError:
+    AESGCM = None
+    InvalidTag = ValueError
+
+from pebel.exceptions import PebelException, PebelDecryptionException
+from pebel.schemes import get_scheme, select_scheme
+from pebel.util import resolve_group, read_structure, derive_key
+
+MAGIC = b'PEBELRK1'
+
+## The size in bytes of key identifiers.
+KEY_ID_SIZE = 8
+
+## The size in bytes of record nonces.
+NONCE_SIZE = 12
+
+## The size in bytes of record authentication tags.
+TAG_SIZE = 16
+
+## The number of bytes each record adds to its plaintext.
+OVERHEAD = KEY_ID_SIZE + NONCE_SIZE + TAG_SIZE
+
+_HEADER = struct.Struct('<BQ')
+
+
+def _check_aead():
+    if AESGCM is None:
+        raise PebelException("Record mode requires the cryptography"
+                             " package, see the 'records' extra.")
+
+
+def _aead(session_key):
+    return AESGCM(derive_key(session_key))
+
+
+def key_id(header):
+    """Return the key identifier of a record key header.
+
+    @param header The record key header as `bytes`.
+
+    @return The key identifier as `bytes`.
+    """
+    return hashlib.sha256(header).digest()[:KEY_ID_SIZE]
+
+
+def record_key_id(record):
+    """Return the identifier of the key a record is encrypted under.
+
+    @param record The encrypted record as `bytes`.
+
+    @return The key identifier as `bytes`.
+    """
+    return bytes(record[:KEY_ID_SIZE])
+
+
+class RecordEncryptor:
+    """Encrypts records under a single encapsulated session key.
+
+    Exactly one of policy, for CP-ABE, or attributes, for KP-ABE, must
+    be given. The record key header, `header`, must be stored alongside
+    the records for them to be decrypted.
+    """
+    def __init__(self, group, mpk, policy=None, attributes=None,
+                 scheme=None):
+        """Encapsulate the session key.
+
+        @param group      The `PairingGroup` used within the underlying
+        crypto.
+        @param mpk        The Master Public Key of the scheme.
+        @param policy     The policy `str` used with CP-ABE.
+        @param attributes The `str` attributes used with KP-ABE.
+        @param scheme     The name (`str`) of the scheme, by default
+        that of `pebel.schemes.DEFAULT_SCHEMES` for its kind.
+
+        @throws PebelException If the cryptography package is missing.
+        """
+        _check_aead()
+        scheme, access = select_scheme(policy, attributes, scheme)
+        session_key, session_key_ctxt_b = scheme.encapsulate(
+            group, mpk, access)
+        self.header = (MAGIC
+                       + _HEADER.pack(scheme.ident, len(session_key_ctxt_b))
+                       + session_key_ctxt_b)
+        self.key_id = key_id(self.header)
+        self._aead = _aead(session_key)
+
+    def encrypt(self, record):
+        """Encrypt a record.
+
+        @param record The record as `bytes`.
+
+        @return The encrypted record as `bytes`.
+        """
+        nonce = os.urandom(NONCE_SIZE)
+        return self.key_id + nonce + self._aead.encrypt(nonce, record,
+                                                        self.key_id)
+
+    def encrypt_records(self, records):
+        """Encrypt records lazily.
+
+        @param records An iterable of records as `bytes`.
+
+        @return A generator of the encrypted records, in order.
+        """
+        kid = self.key_id
+        encrypt = self._aead.encrypt
+        urandom = os.urandom
+        for record in records:
+            nonce = urandom(NONCE_SIZE)
+            yield kid + nonce + encrypt(nonce, record, kid)
+
+
+class RecordDecryptor:
+    """Decrypts records encrypted under any of several record keys.
+
+    Each record key header is decapsulated once, when added, after
+    which records under it are decrypted without any pairings.
+    """
+    def __init__(self, mpk, deckey, group=None):
+        """Create a decryptor without any record keys.
+
+        @param mpk    The Master Public Key of the scheme.
+        @param deckey The decryption key.
+        @param group  The `PairingGroup` used within the underlying
+        crypto, or None to use the group recorded in each header.
+
+        @throws PebelException If the cryptography package is missing.
+        """
+        _check_aead()
+        self._mpk = mpk
+        self._deckey = deckey
+        self._group = group
+        self._keys = {}
+
+    def add_header(self, header):
+        """Decapsulate a record key header.
+
+        Headers already added are not decapsulated again.
+
+        @param header The record key header as `bytes`.
+
+        @return The key identifier of the header as `bytes`.
+
+        @throws PebelDecryptionException If the decryption key cannot
+        decrypt the header.
+        @throws PebelException If header is not a record key header.
+        """
+        kid = key_id(header)
+        if kid in self._keys:
+            return kid
+        if header[:len(MAGIC)] != MAGIC:
+            raise PebelException("Not a pebel record key header.")
+        ident, size = _HEADER.unpack_from(header, len(MAGIC))
+        start = len(MAGIC) + _HEADER.size
+        session_key_ctxt_b = bytes(header[start:start + size])
+        if len(session_key_ctxt_b) != size:
+            raise PebelException("Truncated pebel record key header.")
+        scheme = get_scheme(ident)
+        structure = read_structure(session_key_ctxt_b)
+        group = resolve_group(self._group, structure)
+        session_key = scheme.decapsulate(group, self._mpk, self._deckey,
+                                         session_key_ctxt_b,
+                                         structure=structure)
+        self._keys[kid] = _aead(session_key)
+        return kid
+
+    def decrypt(self, record):
+        """Decrypt a record.
+
+        @param record The encrypted record as `bytes`.
+
+        @return The record as `bytes`.
+
+        @throws PebelDecryptionException If the record was modified.
+        @throws PebelException If the header of its key was not added.
+        """
+        kid = bytes(record[:KEY_ID_SIZE])
+        aead = self._keys.get(kid)
+        if aead is None:
+            raise PebelException("Unknown record key: {0}".format(kid.hex()))
+        nonce = bytes(record[KEY_ID_SIZE:KEY_ID_SIZE + NONCE_SIZE])
+        try:
+            return aead.decrypt(nonce, bytes(record[KEY_ID_SIZE
+                                                    + NONCE_SIZE:]), kid)
+        except InvalidTag:
+            raise PebelDecryptionException("Record failed authentication.")
+
+    def decrypt_records(self, records):
+        """Decrypt records lazily.
+
+        @param records An iterable of encrypted records as `bytes`.
+
+        @return A generator of the records, in order.
+        """
+        decrypt = self.decrypt
+        for record in records:
+            yield decrypt(record)
+
+
+def encrypt_records(group, mpk, records, policy=None, attributes=None,
+                    scheme=None):
+    """Encrypt a batch of records under one encapsulated session key.
+
+    @param group      The `PairingGroup` used within the underlying
+    crypto.
+    @param mpk        The Master Public Key of the scheme.
+    @param records    An iterable of records as `bytes`.
+    @param policy     The policy `str` used with CP-ABE.
+    @param attributes The `str` attributes used with KP-ABE.
+    @param scheme     The name (`str`) of the scheme.
+
+    @return A tuple `(header, ctxts)` of the record key header and the
+    `list` of encrypted records.
+    """
+    encryptor = RecordEncryptor(group, mpk, policy, attributes, scheme)
+    return encryptor.header, list(encryptor.encrypt_records(records))
+
+
+def decrypt_records(mpk, deckey, headers, records, group=None):
+    """Decrypt records encrypted under any of some record keys.
+
+    @param mpk     The Master Public Key of the scheme.
+    @param deckey  The decryption key.
+    @param headers An iterable of record key headers as `bytes`.
+    @param records An iterable of encrypted records as `bytes`.
+    @param group   The `PairingGroup` used within the underlying crypto,
+    or None to use the group recorded in each header.
+
+    @return The `list` of records, in order.
+
+    @throws PebelDecryptionException If deckey cannot decrypt a header,
+    or a record was modified.
+    """
+    decryptor = RecordDecryptor(mpk, deckey, group)
+    for header in headers:
+        decryptor.add_header(header)
+    return list(decryptor.decrypt_records(records))
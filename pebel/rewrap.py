@@ -0,0 +1,215 @@
+"""@package pebel.rewrap
+
+Changes the access structure protecting a ciphertext without
+re-encrypting its payload.
+
+Within the KEM/DEM workflow only the encrypted session key depends on
+the policy, or attribute set, of a ciphertext. Rewrapping decapsulates
+the session key using an authorised decryption key and encapsulates
+the same session key under the new policy, or attribute set, leaving
+the IV and the encrypted payload untouched. The codec with which the
+payload was compressed, if any, is carried over to the new header.
+
+Ciphertexts produced by `pebel.cpabe`, `pebel.kpabe` and
+`pebel.schemes`, and archives produced by `pebel.archive`, are
+supported, each using the scheme recorded within it.
+
+The encrypted session key is base64 encoded, and decoding discards
+whitespace. When the new encrypted session key is no larger than the
+old, it is padded with newlines to the old size and written over it,
+such that only the header of the file is rewritten. Otherwise the
+ciphertext is rewritten, copying the encrypted payload as is.
+
+@author Jan de Muijnck-Hughes <jfdm@st-andrews.ac.uk>
+
+"""
+
+import io
+import json
+import os
+import shutil
+import struct
+
+from Crypto import Random
+
+from pebel import archive
+from pebel.compress import read_compression
+from pebel.exceptions import PebelException
+from pebel.prepared import prepare_key
+from pebel.schemes import DEFAULT_SCHEMES, resolve_scheme
+from pebel.util import (resolve_group, read_structure, derive_key,
+                        ctr_cipher, NONCE_SIZE)
+
+_IV_SIZE = 16
+_SIZE = struct.Struct('<Q')
+
+
+def _rewrap(group, mpk, deckey, session_key_ctxt_b, policy, attributes):
+    """Return the session key and its new encryption, under the scheme
+    recorded within the encrypted session key."""
+    if (policy is None) == (attributes is None):
+        raise ValueError("Exactly one of policy or attributes"
+                         " must be given.")
+    kind = 'cp' if policy is not None else 'kp'
+    structure = read_structure(session_key_ctxt_b)
+    group = resolve_group(group, structure)
+    scheme = resolve_scheme(DEFAULT_SCHEMES[kind], structure)
+    if scheme.kind != kind:
+        raise PebelException(
+            "The cipher-text uses the other kind of scheme.")
+    session_key = scheme.decapsulate(group, mpk, deckey, session_key_ctxt_b,
+                                     structure=structure)
+    return scheme.encapsulate(
+        group, mpk, policy if kind == 'cp' else attributes,
+        session_key=session_key,
+        compression=read_compression(structure))
+
+
+def rewrap_header(group, mpk, deckey, session_key_ctxt_b,
+                  policy=None, attributes=None):
+    """Re-encapsulate the session key of an encrypted session key.
+
+    Exactly one of policy, for CP-ABE, or attributes, for KP-ABE, must
+    be given.
+
+    @param group      The `PairingGroup` used within the underlying
+    crypto, or None to use the group recorded in the header.
+    @param mpk        The Master Public Key of type `pk_t`.
+    @param deckey     The decryption key of type `sk_t`.
+    @param session_key_ctxt_b The serialised encrypted session key.
+    @param policy     The new policy `str`, for CP-ABE.
+    @param attributes The new `str` attributes, for KP-ABE.
+
+    @return The serialised encryption of the same session key under the
+    new policy or attributes.
+
+    @throws PebelDecryptionException If deckey cannot decrypt the
+    session key.
+    """
+    return _rewrap(group, mpk, deckey, session_key_ctxt_b,
+                   policy, attributes)[1]
+
+
+def _locate_header(f):
+    """Return the offset of the size of the encrypted session key, and
+    whether the file is an archive."""
+    f.seek(0)
+    if f.read(len(archive.MAGIC)) != archive.MAGIC:
+        return _IV_SIZE, False
+    return len(archive.MAGIC) + 1, True
+
+
+def rewrap_file(fname, mpk, deckey, policy=None, attributes=None,
+                group=None, out=None):
+    """Rewrap the ciphertext or archive within the named file.
+
+    Exactly one of policy, for CP-ABE, or attributes, for KP-ABE, must
+    be given.
+
+    @param fname      The name of the file (`str`) to rewrap.
+    @param mpk        The Master Public Key of type `pk_t`.
+    @param deckey     The decryption key of type `sk_t`.
+    @param policy     The new policy `str`, for CP-ABE.
+    @param attributes The new `str` attributes, for KP-ABE.
+    @param group      The `PairingGroup` used within the underlying
+    crypto, or None to use the group recorded in the file.
+    @param out        The name of the file (`str`) to write the rewrapped
+    ciphertext to. By default the file is rewrapped in place.
+
+    @return True if only the header was rewritten, False if the payload
+    was copied.
+
+    @throws PebelDecryptionException If deckey cannot decrypt the file.
+    @throws PebelException If the file uses the other kind of scheme.
+    """
+    with io.open(fname, 'rb' if out else 'r+b') as f:
+        offset, is_archive = _locate_header(f)
+        f.seek(offset)
+        size = _SIZE.unpack(f.read(_SIZE.size))[0]
+        session_key, header = _rewrap(group, mpk, deckey, f.read(size),
+                                      policy, attributes)
+
+        if out is None and len(header) <= size:
+            f.seek(offset + _SIZE.size)
+            f.write(header.ljust(size, b'\n'))
+            return True
+
+        # The header has grown, or a copy was asked for, so write the
+        # new header and the unchanged payload to a new file.
+        if len(header) < size:
+            header = header.ljust(size, b'\n')
+        tmp_fname = (out or fname) + ".rewrap"
+        with io.open(tmp_fname, 'wb') as dest:
+            f.seek(0)
+            dest.write(f.read(offset))
+            dest.write(_SIZE.pack(len(header)))
+            dest.write(header)
+            f.seek(offset + _SIZE.size + size)
+            if is_archive and len(header) != size:
+                _copy_archive(f, dest, derive_key(session_key),
+                              len(header) - size)
+            else:
+                shutil.copyfileobj(f, dest, archive.CHUNK_SIZE)
+    os.replace(tmp_fname, out or fname)
+    return False
+
+
+def _copy_archive(f, dest, key, shift):
+    """Copy the members of an archive, re-encrypting its index such
+    that the offsets of the members account for the resized header."""
+    f.seek(-archive._TRAILER.size, os.SEEK_END)
+    offset, size, _ = archive._TRAILER.unpack(
+        f.read(archive._TRAILER.size))
+    f.seek(offset)
+    nonce = f.read(NONCE_SIZE)
+    members = json.loads(ctr_cipher(key, nonce).decrypt(
+        f.read(size - NONCE_SIZE)).decode('utf-8'))
+
+    # Copy the members, which lie between the header and the index.
+    start = dest.tell() - shift
+    f.seek(start)
+    remaining = offset - start
+    while remaining:
+        chunk = f.read(min(remaining, archive.CHUNK_SIZE))
+        if not chunk:
+            raise PebelException("Truncated pebel archive.")
+        remaining -= len(chunk)
+        dest.write(chunk)
+
+    index = json.dumps([(name, member_offset + shift, member_size)
+                        for name, member_offset, member_size
+                        in members]).encode('utf-8')
+    nonce = Random.new().read(NONCE_SIZE)
+    offset = dest.tell()
+    dest.write(nonce)
+    dest.write(ctr_cipher(key, nonce).encrypt(index))
+    dest.write(archive._TRAILER.pack(offset, dest.tell() - offset,
+                                     archive.MAGIC))
+
+
+def rewrap_files(fnames, mpk, deckey, policy=None, attributes=None,
+                 group=None):
+    """Rewrap many ciphertexts and archives in place.
+
+    Only the headers are read and, where they do not grow, written, so
+    the cost is proportional to the number of files rather than the
+    volume of data. The decryption key is prepared once for all files,
+    see `pebel.prepared`.
+
+    @param fnames     The names of the files (`str`) to rewrap.
+    @param mpk        The Master Public Key of type `pk_t`.
+    @param deckey     The decryption key of type `sk_t`.
+    @param policy     The new policy `str`, for CP-ABE.
+    @param attributes The new `str` attributes, for KP-ABE.
+    @param group      The `PairingGroup` used within the underlying
+    crypto, or None to use the group recorded in each file.
+
+    @return A generator of `(fname, in_place)` tuples, as each file is
+    rewrapped.
+
+    @throws PebelDecryptionException If deckey cannot decrypt a file.
+    """
+    deckey = prepare_key(group, deckey)
+    for fname in fnames:
+        yield fname, rewrap_file(fname, mpk, deckey, policy, attributes,
+                                 group)
@@ -0,0 +1,264 @@
+"""@package pebel.schemes
+
+A registry of the ABE schemes available to the KEM/DEM workflow.
+
+Each scheme provides the same interface as `pebel.cpabe`: setup,
+keygen, and the encapsulation and decapsulation of a session key.
+`encrypt` and `decrypt` wrap any registered scheme within the
+ciphertext format of `pebel.cpabe`, and the name of the scheme is
+recorded within the encrypted session key so that `decrypt` selects
+the scheme by itself.
+
+The schemes registered by default are:
+
+ - `bsw07` Bethencourt2007cae CP-ABE, see `pebel.cpabe`.
+ - `lsw08` Lewko2008rsw KP-ABE, see `pebel.kpabe`.
+ - `fame`  Agrawal2017fame CP-ABE over type-III pairings, with
+           decryption in a constant number of pairings, see
+           `pebel.fame`. Registered only when the installed Charm
+           provides AC17, as Charm 0.50 and later do.
+
+Further schemes are added using `register_scheme`.
+
+@author Jan de Muijnck-Hughes <jfdm@st-andrews.ac.uk>
+
+"""
+
+import collections
+import io
+import struct
+
+from Crypto.Cipher import AES
+from Crypto import Random
+
+from pebel import instrument, cpabe, kpabe
+from pebel.compress import (
+    CHUNK_SIZE,
+    compress_data,
+    decompress_data,
+    read_compression
+)
+from pebel.exceptions import PebelException, PebelDecryptionException
+from pebel.groups import DEFAULT_GROUPS
+from pebel.util import (
+    read_ciphertext_header,
+    read_scheme,
+    read_structure,
+    resolve_group,
+    derive_key,
+    read_data
+)
+
+try:
+    from pebel import fame
+except ImportError:
+    fame = None
+
+## A registered scheme.
+##
+## `ident` is the unsigned byte identifying the scheme within binary
+## headers, such as those of `pebel.archive`. `kind` is 'cp' if the
+## scheme encrypts under policies and keys hold attributes, or 'kp' if
+## the converse. `group` is the name of the default pairing group.
+## `encapsulate` takes the `session_key` to encapsulate and the
+## `compression` to record as keyword arguments, as does
+## `pebel.cpabe.cpabe_encapsulate`. `decapsulate` takes the `structure`
+## of the encrypted session key, if already read, as a keyword
+## argument, as does `pebel.cpabe.cpabe_decapsulate`.
+Scheme = collections.namedtuple(
+    'Scheme',
+    ['name', 'ident', 'kind', 'group',
+     'setup', 'keygen', 'encapsulate', 'decapsulate'])
+
+_schemes = {}
+
+## The default scheme of each kind.
+DEFAULT_SCHEMES = {'cp': cpabe.SCHEME, 'kp': kpabe.SCHEME}
+
+
+def register_scheme(scheme):
+    """Register a scheme.
+
+    @param scheme The `Scheme` to register.
+
+    @throws PebelException If the name or identifier is already taken.
+    """
+    for other in _schemes.values():
+        if scheme.name == other.name or scheme.ident == other.ident:
+            raise PebelException(
+                "Scheme {0} ({1}) is already registered.".format(
+                    scheme.name, scheme.ident))
+    _schemes[scheme.name] = scheme
+
+
+def get_scheme(name):
+    """Return a registered scheme.
+
+    @param name The name (`str`) or identifier (`int`) of the scheme.
+
+    @return The `Scheme`.
+
+    @throws PebelException If no such scheme is registered.
+    """
+    if isinstance(name, int):
+        for scheme in _schemes.values():
+            if scheme.ident == name:
+                return scheme
+    elif name in _schemes:
+        return _schemes[name]
+    raise PebelException("Unknown scheme: {0}".format(name))
+
+
+def list_schemes(kind=None):
+    """Return the names of the registered schemes.
+
+    @param kind Only return schemes of this kind, 'cp' or 'kp'.
+
+    @return A sorted list of names (`str`).
+    """
+    return sorted(name for name, scheme in _schemes.items()
+                  if kind is None or scheme.kind == kind)
+
+
+def select_scheme(policy=None, attributes=None, scheme=None):
+    """Select the scheme with which to encrypt under exactly one of a
+    policy, for CP-ABE, or attributes, for KP-ABE.
+
+    @param policy     The policy `str` used with CP-ABE.
+    @param attributes The `str` attributes used with KP-ABE.
+    @param scheme     The name (`str`) of the scheme, by default that of
+    `DEFAULT_SCHEMES` for the kind of access given.
+
+    @return A tuple `(scheme, access)` of the `Scheme` and the policy or
+    attributes to encrypt under.
+
+    @throws ValueError If not exactly one of policy or attributes is
+    given, or the scheme is of the other kind.
+    @throws PebelException If no such scheme is registered.
+    """
+    if (policy is None) == (attributes is None):
+        raise ValueError("Exactly one of policy or attributes"
+                         " must be given.")
+    kind = 'cp' if policy is not None else 'kp'
+    scheme = get_scheme(scheme or DEFAULT_SCHEMES[kind])
+    if scheme.kind != kind:
+        raise ValueError("Scheme {0} does not encrypt under {1}.".format(
+            scheme.name, 'policies' if kind == 'cp' else 'attributes'))
+    return scheme, policy if kind == 'cp' else attributes
+
+
+def resolve_scheme(scheme, session_key_ctxt_b):
+    """Determine the scheme of an encrypted session key.
+
+    @param scheme The name (`str`) of the scheme to use if none is
+    recorded, as is the case for ciphertexts written by earlier
+    versions, or None.
+    @param session_key_ctxt_b The serialised encrypted session key, or
+    its structure as returned by `pebel.util.read_structure`.
+
+    @return The `Scheme`.
+
+    @throws PebelDecryptionException If no scheme is recorded or given.
+    """
+    name = read_scheme(session_key_ctxt_b) or scheme
+    if name is None:
+        raise PebelDecryptionException(
+            "No scheme is recorded within the cipher-text.")
+    return get_scheme(name)
+
+
+def encrypt(group, mpk, ptxt, access, scheme, compression=None):
+    """Encrypts a plaintext using a registered scheme.
+
+    @param group  The `PairingGroup` used within the underlying crypto.
+    @param mpk    The Master Public Key of the scheme.
+    @param ptxt   The `bytearray` resulting from io.open or io.IOBytes
+                  containing the plaintext.
+    @param access The policy `str`, or `str` attributes, to encrypt
+                  under, according to the kind of scheme.
+    @param scheme The name (`str`) of the scheme.
+    @param compression The codec with which to compress the plaintext
+                  before encryption, `pebel.compress.AUTO` to compress
+                  only compressible plaintexts, or None.
+
+    @return The encrypted data returned as a `bytearray`.
+
+    """
+    scheme = get_scheme(scheme)
+    with instrument.traced(scheme.name + '_encrypt', group) as trace:
+        compression, chunks = compress_data(ptxt, compression)
+        session_key, session_key_ctxt_b = scheme.encapsulate(
+            group, mpk, access, trace, compression=compression)
+        ctxt = io.BytesIO()
+
+        iv = Random.new().read(AES.block_size)
+        symcipher = AES.new(derive_key(session_key), AES.MODE_CFB, iv)
+        if trace: trace.mark('kdf')
+
+        ctxt.write(bytes(iv))
+        ctxt.write(struct.pack('<Q', len(session_key_ctxt_b)))
+        ctxt.write(session_key_ctxt_b)
+
+        for b in chunks:
+            ctxt.write(symcipher.encrypt(b))
+
+        if trace:
+            trace.mark('dem')
+            trace.end(payload=ctxt.tell() - len(session_key_ctxt_b)
+                      - AES.block_size - struct.calcsize('<Q'))
+        return ctxt.getvalue()
+
+
+def decrypt(group, mpk, deckey, ctxt, scheme=None):
+    """Decrypts a ciphertext using the scheme recorded within it.
+
+    @param group  The `PairingGroup` used within the underlying crypto,
+                  or None to use the group recorded in the ciphertext.
+    @param mpk    The Master Public Key of the scheme.
+    @param deckey The decryption key.
+    @param ctxt   The `bytearray` resulting from io.open or io.IOBytes
+                  containing the ciphertext.
+    @param scheme The name (`str`) of the scheme to use if none is
+                  recorded within the ciphertext.
+
+    @return The `bytearray` containing the plaintext.
+
+    @throws PebelDecryptionException If deckey cannot decrypt the
+            ciphertext.
+    @throws PebelException If the ciphertext was generated within a
+            different group.
+
+    """
+    ptxt = io.BytesIO()
+
+    iv, session_key_ctxt_b = read_ciphertext_header(ctxt, AES.block_size)
+    structure = read_structure(session_key_ctxt_b)
+    group = resolve_group(group, structure)
+    scheme = resolve_scheme(scheme, structure)
+    compression = read_compression(structure)
+    with instrument.traced(scheme.name + '_decrypt', group) as trace:
+        session_key = scheme.decapsulate(group, mpk, deckey,
+                                         session_key_ctxt_b, trace,
+                                         structure=structure)
+
+        symcipher = AES.new(derive_key(session_key), AES.MODE_CFB, iv)
+        if trace: trace.mark('kdf')
+        chunks = read_data(bin_data=ctxt, chunksize=CHUNK_SIZE)
+        for b in decompress_data(map(symcipher.decrypt, chunks), compression):
+            ptxt.write(b)
+        if trace:
+            trace.mark('dem')
+            trace.end(payload=ptxt.tell())
+        return ptxt.getvalue()
+
+
+register_scheme(Scheme(cpabe.SCHEME, 1, 'cp', DEFAULT_GROUPS['cpabe'],
+                       cpabe.cpabe_setup, cpabe.cpabe_keygen,
+                       cpabe.cpabe_encapsulate, cpabe.cpabe_decapsulate))
+register_scheme(Scheme(kpabe.SCHEME, 2, 'kp', DEFAULT_GROUPS['kpabe'],
+                       kpabe.kpabe_setup, kpabe.kpabe_keygen,
+                       kpabe.kpabe_encapsulate, kpabe.kpabe_decapsulate))
+if fame is not None:
+    register_scheme(Scheme(fame.SCHEME, 3, 'cp', 'BN254',
+                           fame.fame_setup, fame.fame_keygen,
+                           fame.fame_encapsulate, fame.fame_decapsulate))
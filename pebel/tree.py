@@ -0,0 +1,245 @@
+"""@package pebel.tree
+
+Incremental encryption of directory trees.
+
+`encrypt_tree` encrypts every file beneath a source directory into the
+same relative path beneath a destination directory, as `<fname>.abe`
+ciphertexts of `pebel.schemes`. Files are encrypted by a pool of
+processes, each loading the group and Master Public Key once.
+
+A manifest, stored as JSON within the destination directory, records
+for each source file its size, modification time and SHA-256 digest,
+the scheme and policy, or attributes, it was encrypted under, and the
+SHA-256 digest of the Master Public Key file used. On later runs only
+new files and files whose contents, access structure or Master Public
+Key changed are encrypted:
+
+ - Files whose size and modification time are unchanged are skipped
+   without being read.
+ - Files whose size or modification time changed are hashed, and are
+   only encrypted if their digest changed.
+
+The manifest is written atomically, and periodically during a run, so
+an interrupted run resumes where it stopped.
+
+@author Jan de Muijnck-Hughes <jfdm@st-andrews.ac.uk>
+
+"""
+
+import hashlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from pebel import schemes
+from pebel.util import read_key_from_file, read_group_from_file
+
+## The name of the manifest within the destination directory.
+MANIFEST_NAME = '.pebel-manifest.json'
+
+## The version of the manifest format.
+MANIFEST_VERSION = 1
+
+## The suffix of ciphertexts.
+SUFFIX = '.abe'
+
+## The number of files encrypted between writes of the manifest.
+CHECKPOINT = 1024
+
+## The size of the chunks in which files are hashed.
+CHUNK_SIZE = 2**16
+
+
+def read_manifest(fname):
+    """Read a manifest.
+
+    @param fname The name of the manifest file (`str`).
+
+    @return A `dict` mapping the relative path of each source file to
+    its entry, empty if the manifest does not exist.
+    """
+    if not os.path.exists(fname):
+        return {}
+    with io.open(fname, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest['files']
+
+
+def write_manifest(fname, files):
+    """Write a manifest atomically.
+
+    @param fname The name of the manifest file (`str`).
+    @param files A `dict` mapping the relative path of each source file
+    to its entry.
+    """
+    tmp = fname + '.tmp'
+    with io.open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'version': MANIFEST_VERSION, 'files': files}, f,
+                  indent=1, sort_keys=True)
+    os.replace(tmp, fname)
+
+
+def _walk(src):
+    """Yield the relative path and `os.stat` of each file beneath src."""
+    for root, dirs, files in os.walk(src):
+        dirs.sort()
+        for fname in sorted(files):
+            path = os.path.join(root, fname)
+            yield os.path.relpath(path, src), os.stat(path)
+
+
+def _digest(fname):
+    digest = hashlib.sha256()
+    with io.open(fname, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+## The group, keys and options used by each encryption process.
+_encryption = None
+
+
+def _load_encryption(mpk_fname, access, scheme, compression):
+    global _encryption
+    group = read_group_from_file(mpk_fname, schemes.get_scheme(scheme).group)
+    _encryption = (group, read_key_from_file(mpk_fname, group), access,
+                   scheme, compression)
+
+
+def _encrypt(task):
+    """Encrypt a file unless its digest is unchanged.
+
+    @return A tuple `(rel, digest, nbytes)` where nbytes is the number
+    of bytes encrypted, or None if the file was unchanged.
+    """
+    rel, src, dest, old_digest = task
+    group, mpk, access, scheme, compression = _encryption
+    digest = _digest(src)
+    if digest == old_digest and os.path.exists(dest):
+        return rel, digest, None
+    with io.open(src, 'rb') as ptxt:
+        raw = schemes.encrypt(group, mpk, ptxt, access, scheme, compression)
+    os.makedirs(os.path.dirname(dest) or '.', exist_ok=True)
+    with io.open(dest + '.tmp', 'wb') as f:
+        f.write(raw)
+    os.replace(dest + '.tmp', dest)
+    return rel, digest, os.path.getsize(src)
+
+
+def encrypt_tree(src, dest, mpk_fname, access, scheme='bsw07',
+                 compression=None, manifest=None, workers=None, prune=False):
+    """Encrypt the files of a directory tree that changed since the
+    previous run.
+
+    @param src         The source directory (`str`).
+    @param dest        The destination directory (`str`).
+    @param mpk_fname   The name of the file containing the Master Public
+    Key.
+    @param access      The policy `str`, or `str` attributes, to encrypt
+    under, according to the kind of scheme.
+    @param scheme      The name (`str`) of a scheme within
+    `pebel.schemes`.
+    @param compression The codec with which to compress files, see
+    `pebel.compress`, or None.
+    @param manifest    The name of the manifest file, by default
+    `MANIFEST_NAME` within dest.
+    @param workers     The number of processes, by default one per core.
+    @param prune       Delete the ciphertexts of source files that no
+    longer exist.
+
+    @return A summary `dict` of the form::
+
+        {'files': 1000, 'encrypted': 12, 'unchanged': 988,
+         'removed': 0, 'bytes': 1048576, 'seconds': 1.5,
+         'files_per_s': 8.0, 'bytes_per_s': 699050.7}
+
+    where files counts the source files, encrypted those encrypted,
+    unchanged those skipped, removed those no longer present and bytes
+    the bytes encrypted.
+    """
+    start = time.perf_counter()
+    if manifest is None:
+        manifest = os.path.join(dest, MANIFEST_NAME)
+    if not isinstance(access, str):
+        access = list(access)
+    os.makedirs(dest, exist_ok=True)
+    old = read_manifest(manifest)
+    mpk_digest = _digest(mpk_fname)
+    files = {}
+    tasks = []
+    skip = (os.path.join(os.path.abspath(dest), ''),
+            os.path.abspath(manifest))
+    for rel, st in _walk(src):
+        if os.path.abspath(os.path.join(src, rel)).startswith(skip):
+            continue
+        entry = old.get(rel)
+        target = os.path.join(dest, rel + SUFFIX)
+        same_access = (entry is not None and entry['access'] == access
+                       and entry['scheme'] == scheme
+                       and entry.get('compression') == compression
+                       and entry.get('mpk') == mpk_digest)
+        if (same_access and entry['size'] == st.st_size
+                and entry['mtime_ns'] == st.st_mtime_ns
+                and os.path.exists(target)):
+            files[rel] = entry
+            continue
+        files[rel] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                      'sha256': None, 'access': access, 'scheme': scheme,
+                      'compression': compression, 'mpk': mpk_digest}
+        tasks.append((rel, os.path.join(src, rel), target,
+                      entry['sha256'] if same_access else None))
+
+    summary = {'files': len(files), 'encrypted': 0,
+               'unchanged': len(files) - len(tasks), 'removed': 0,
+               'bytes': 0}
+
+    def record(results):
+        for n, (rel, digest, nbytes) in enumerate(results, 1):
+            files[rel]['sha256'] = digest
+            if nbytes is None:
+                summary['unchanged'] += 1
+            else:
+                summary['encrypted'] += 1
+                summary['bytes'] += nbytes
+            if n % CHECKPOINT == 0:
+                write_manifest(manifest, _completed(files, old))
+
+    initargs = (mpk_fname, access, scheme, compression)
+    if workers == 1 or len(tasks) <= 1:
+        _load_encryption(*initargs)
+        record(map(_encrypt, tasks))
+    else:
+        with ProcessPoolExecutor(workers, initializer=_load_encryption,
+                                 initargs=initargs) as pool:
+            record(pool.map(_encrypt, tasks, chunksize=16))
+
+    for rel in set(old) - set(files):
+        summary['removed'] += 1
+        if prune:
+            target = os.path.join(dest, rel + SUFFIX)
+            if os.path.exists(target):
+                os.remove(target)
+    write_manifest(manifest, files)
+
+    seconds = time.perf_counter() - start
+    summary['seconds'] = seconds
+    summary['files_per_s'] = summary['files'] / seconds if seconds else 0.0
+    summary['bytes_per_s'] = summary['bytes'] / seconds if seconds else 0.0
+    return summary
+
+
+def _completed(files, old):
+    """Return the entries of files processed so far, keeping the old
+    entries of those still pending."""
+    done = {}
+    for rel, entry in files.items():
+        if entry['sha256'] is not None:
+            done[rel] = entry
+        elif rel in old:
+            done[rel] = old[rel]
+    return done
@@ -3,36 +3,350 @@
 Various utility methods to read and write, data from buffers and files.
 """
 
+import collections.abc
 import string
 import io
-from charm.toolbox.pairinggroup import PairingGroup
+import struct
+from charm.toolbox.pairinggroup import PairingGroup, pair
 from charm.core.engine.util import objectToBytes, bytesToObject
+from charm.core.math.pairing import hashPair as sha
+
+from Crypto.Cipher import AES
+from Crypto.Util import Counter
+
+from pebel.exceptions import PebelException, PebelDecryptionException
+from pebel.groups import GROUP_FIELD, SCHEME_FIELD, get_group
 
 
 def write_key_to_file(fname, data, group):
     """Utility function to save charm crypto objects to disk.
 
+    The name of the group is recorded alongside keys, allowing them to
+    be read back without it.
+
     @param fname The name of the file (`str`) to save the data to.
     @param data A `bytearray` containing the data to be saved.
     @param group The `PairingGroup` used within the underlying crypto.
 
     """
+    if isinstance(data, dict):
+        data = dict(data)
+        data[GROUP_FIELD] = group.groupType()
     with io.open(fname, 'wb') as f:
         f.write(objectToBytes(data, group))
         f.flush()
 
 
-def read_key_from_file(fname, group):
+def read_key_from_file(fname, group=None):
     """Utility function to read charm crypto objects from disk.
 
     @param fname The name of the file (`str`) containing the keys.
     @param group The `PairingGroup` used within the underlying crypto.
+    If not given, the group recorded within the key is used.
 
     @return A object reconstructed from the file.
+
+    @throws PebelException If the group is not given and none is
+    recorded, or the recorded group differs from the given group.
     """
     with io.open(fname, 'rb') as f:
         data = f.read()
-    return bytesToObject(data, group)
+    if group is None:
+        group = read_group(data)
+        if group is None:
+            raise PebelException(
+                "No pairing group is recorded within {0}.".format(fname))
+    obj = bytesToObject(data, group)
+    if isinstance(obj, dict):
+        check_group(obj.pop(GROUP_FIELD, None), group)
+    return obj
+
+
+def read_group(data):
+    """Utility function to find the group recorded within a serialised
+    key or encrypted session key.
+
+    @param data The serialised object, or its structure as returned by
+    `read_structure`.
+
+    @return The recorded `PairingGroup`, or None if none is recorded.
+    """
+    obj = read_structure(data)
+    if isinstance(obj, dict) and GROUP_FIELD in obj:
+        return get_group(obj[GROUP_FIELD])
+    return None
+
+
+def read_group_from_file(fname, default=None):
+    """Utility function to find the group recorded within a key stored
+    on disk.
+
+    @param fname   The name of the file (`str`) containing the key.
+    @param default The name (`str`) of the group to use if none is
+    recorded, as is the case for keys written by earlier versions.
+
+    @return The `PairingGroup`, or None if none is recorded and no
+    default is given.
+    """
+    with io.open(fname, 'rb') as f:
+        group = read_group(f.read())
+    if group is None and default is not None:
+        group = get_group(default)
+    return group
+
+
+def resolve_group(group, session_key_ctxt_b):
+    """Utility function to determine the group of an encrypted session
+    key.
+
+    @param group The `PairingGroup` to use, or None to use the group
+    recorded within the encrypted session key.
+    @param session_key_ctxt_b The serialised encrypted session key, or
+    its structure as returned by `read_structure`.
+
+    @return The `PairingGroup`.
+
+    @throws PebelDecryptionException If no group is given or recorded.
+    """
+    if group is None:
+        group = read_group(session_key_ctxt_b)
+        if group is None:
+            raise PebelDecryptionException(
+                "No pairing group is recorded within the cipher-text.")
+    return group
+
+
+def check_group(name, group):
+    """Utility function to check a recorded group name against the
+    group in use.
+
+    @param name  The recorded name (`str`) of the group, or None if
+    nothing was recorded.
+    @param group The `PairingGroup` used within the underlying crypto.
+
+    @throws PebelException If the names differ.
+    """
+    if name is not None and name != group.groupType():
+        raise PebelException(
+            "Expected pairing group {0}, but {1} was given.".format(
+                name, group.groupType()))
+
+
+def read_scheme(data):
+    """Utility function to find the name of the scheme recorded within
+    a serialised encrypted session key.
+
+    @param data The serialised encrypted session key, or its structure
+    as returned by `read_structure`.
+
+    @return The recorded name (`str`) of the scheme, or None if none is
+    recorded, as is the case for ciphertexts written by earlier
+    versions.
+    """
+    obj = read_structure(data)
+    if isinstance(obj, dict):
+        return obj.get(SCHEME_FIELD)
+    return None
+
+
+def check_scheme(name, scheme):
+    """Utility function to check a recorded scheme name against the
+    scheme in use.
+
+    @param name   The recorded name (`str`) of the scheme, or None if
+    nothing was recorded.
+    @param scheme The name (`str`) of the scheme in use.
+
+    @throws PebelException If the names differ.
+    """
+    if name is not None and name != scheme:
+        raise PebelException(
+            "Expected scheme {0}, but {1} was used.".format(name, scheme))
+
+
+def pair_product(group, lhs, rhs):
+    """Utility function to evaluate a product of pairings.
+
+    Where Charm provides it the product is evaluated as one
+    multi-pairing, sharing the final exponentiation between pairings.
+
+    @param group The `PairingGroup` used within the underlying crypto.
+    @param lhs   The `list` of first arguments, elements of G1.
+    @param rhs   The `list` of second arguments, elements of G2.
+
+    @return The product of `pair(lhs[i], rhs[i])`, an element of GT.
+    """
+    if hasattr(group, 'pair_prod'):
+        return group.pair_prod(lhs, rhs)
+    result = pair(lhs[0], rhs[0])
+    for a, b in zip(lhs[1:], rhs[1:]):
+        result *= pair(a, b)
+    return result
+
+
+def precompute(element):
+    """Utility function to precompute, in place, the table used to
+    raise a fixed element to many exponents.
+
+    Elements of Charm versions without preprocessing are left as is.
+
+    @param element An element of G1, G2 or GT.
+
+    @return The element.
+    """
+    if hasattr(element, 'initPP') and not element.preproc:
+        element.initPP()
+    return element
+
+
+def derive_key(session_key):
+    """Utility function to derive the 256-bit symmetric key used to
+    encrypt payloads from a session key.
+
+    @param session_key The session key, an element of GT.
+
+    @return The key as `bytes`.
+    """
+    return sha(session_key)[0:32]
+
+
+## The size in bytes of the nonces used with `ctr_cipher`.
+NONCE_SIZE = 8
+
+
+def ctr_cipher(key, nonce):
+    """Utility function to construct an AES cipher in CTR mode.
+
+    The counter block is the nonce followed by a 64-bit block counter
+    starting from zero. A nonce must never be reused with the same key.
+
+    @param key   The 256-bit key as `bytes`.
+    @param nonce The `NONCE_SIZE` byte nonce.
+
+    @return The AES cipher object.
+    """
+    counter = Counter.new(64, prefix=nonce, initial_value=0)
+    return AES.new(key, AES.MODE_CTR, counter=counter)
+
+
+def read_ciphertext_header(ctxt, ivsize=16):
+    """Utility function to read the header of a KEM/DEM ciphertext.
+
+    After the call the ciphertext is positioned at the start of the
+    symmetrically encrypted payload.
+
+    @param ctxt   The `bytearray` resulting from `io.open` or
+    `io.BytesIO` containing the ciphertext.
+    @param ivsize The size in bytes of the IV.
+
+    @return A tuple `(iv, session_key_ctxt_b)` containing the IV and the
+    serialised encrypted session key.
+    """
+    iv = ctxt.read(ivsize)
+    session_key_size = struct.unpack('<Q',
+                                     ctxt.read(struct.calcsize('<Q')))[0]
+    return iv, ctxt.read(session_key_size)
+
+
+class _Undecoded:
+    """Stand in for a `PairingGroup` that leaves group elements encoded."""
+    def serialize(self, obj):
+        return obj
+
+    def deserialize(self, obj):
+        return obj
+
+
+def read_structure(data):
+    """Utility function to read a serialised charm object without
+    decoding its group elements.
+
+    This recovers the policies and attribute lists held in keys and
+    encrypted session keys without requiring the `PairingGroup` or
+    paying for the decoding of the group elements, which are returned
+    in their encoded form.
+
+    @param data The serialised object, or a structure already read,
+    which is returned as is.
+
+    @return The object with its group elements left encoded.
+    """
+    if isinstance(data, dict):
+        return data
+    return bytesToObject(data, _Undecoded())
+
+
+class LazyStructure(collections.abc.MutableMapping):
+    """A serialised charm dictionary whose group elements are decoded
+    on first access.
+
+    Encrypted session keys hold group elements for every leaf of their
+    policy, or every attribute, indexed by attribute, whereas
+    decryption uses only those of the satisfying leaves. Reading the
+    structure lazily decodes only the elements used. Nested
+    dictionaries are themselves read lazily; lists are decoded whole.
+
+    Values serialised as `bytes`, rather than `str`, are taken to be
+    group elements.
+    """
+    __slots__ = ('_obj', '_group', '_decoded')
+
+    def __init__(self, obj, group):
+        """Wrap a structure returned by `read_structure`.
+
+        @param obj   The structure, a `dict`.
+        @param group The `PairingGroup` with which to decode elements.
+        """
+        self._obj = obj
+        self._group = group
+        self._decoded = {}
+
+    def __getitem__(self, key):
+        try:
+            return self._decoded[key]
+        except KeyError:
+            pass
+        value = self._decode(self._obj[key])
+        self._decoded[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._obj.setdefault(key, None)
+        self._decoded[key] = value
+
+    def __delitem__(self, key):
+        del self._obj[key]
+        self._decoded.pop(key, None)
+
+    def __iter__(self):
+        return iter(self._obj)
+
+    def __len__(self):
+        return len(self._obj)
+
+    def _decode(self, value):
+        if isinstance(value, dict):
+            return LazyStructure(value, self._group)
+        if isinstance(value, bytes):
+            return self._group.deserialize(value)
+        if isinstance(value, list):
+            return [self._decode(v) for v in value]
+        return value
+
+
+def read_structure_lazily(data, group):
+    """Utility function to read a serialised charm dictionary, such as
+    an encrypted session key, decoding its group elements only as they
+    are used.
+
+    @param data  The serialised dictionary, or its structure as returned
+    by `read_structure`, which is left unmodified.
+    @param group The `PairingGroup` with which to decode elements.
+
+    @return The dictionary as a `LazyStructure`.
+    """
+    return LazyStructure(dict(read_structure(data)), group)
+
 
 def bitmarker(name, nbits, pos, v):
     """Construct a bit marker for a bit within a bit string.
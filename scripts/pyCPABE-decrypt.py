@@ -8,10 +8,10 @@ import io
 import sys
 import argparse
 
-from charm.toolbox.pairinggroup import PairingGroup
+from pebel.groups import DEFAULT_GROUPS
 
 from pebel.cpabe import cpabe_decrypt
-from pebel.util import read_key_from_file
+from pebel.util import read_key_from_file, read_group_from_file
 from pebel.exceptions import PebelDecryptionException
 
 def main():
@@ -53,7 +53,8 @@ def main():
 
     ptxt_fname = args.ctxt.replace(".cpabe", ".prime")
 
-    group = PairingGroup('SS512')
+    group = read_group_from_file(args.mpk,
+                                 DEFAULT_GROUPS['cpabe'])
 
     mpk = read_key_from_file(args.mpk, group)
 
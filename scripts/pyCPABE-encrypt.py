@@ -8,10 +8,11 @@ import sys
 import struct
 import os
 
-from charm.toolbox.pairinggroup import PairingGroup
+from pebel.groups import DEFAULT_GROUPS
 
 from pebel.cpabe import cpabe_encrypt
-from pebel.util import read_key_from_file
+from pebel.compress import AUTO, CODECS
+from pebel.util import read_key_from_file, read_group_from_file
 
 
 def main():
@@ -37,16 +38,24 @@ def main():
                         type=str,
                         help="A file containing the plaintext to be encrypted.")
 
+    parser.add_argument('--compress',
+                        choices=[AUTO] + sorted(CODECS),
+                        help="Compress the plaintext before encryption,"
+                        " or with auto only if it is compressible."
+                        " Default: no compression")
+
     parser.add_argument('policy',
                         help="The policy used to encrypt the plaintext under.")
 
     args = parser.parse_args()
 
-    group = PairingGroup('SS512')
+    group = read_group_from_file(args.mpk,
+                                 DEFAULT_GROUPS['cpabe'])
 
     mpk = read_key_from_file(args.mpk, group)
 
-    ctxt = cpabe_encrypt(group, mpk, io.open(args.ptxt,'rb'), args.policy)
+    ctxt = cpabe_encrypt(group, mpk, io.open(args.ptxt,'rb'), args.policy,
+                         compression=args.compress)
 
     ctxt_fname = "".join([args.ptxt, ".cpabe"])
 
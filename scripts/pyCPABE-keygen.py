@@ -6,12 +6,13 @@ import argparse
 import io
 import sys
 
-from charm.toolbox.pairinggroup import PairingGroup
+from pebel.groups import DEFAULT_GROUPS
 
 from pebel.cpabe import cpabe_keygen
 from pebel.util import (
     write_key_to_file,
-    read_key_from_file
+    read_key_from_file,
+    read_group_from_file
 )
 
 
@@ -47,7 +48,8 @@ def main():
                         help="The attributes used to construct the secret key.")
 
     args = parser.parse_args()
-    group = PairingGroup('SS512')
+    group = read_group_from_file(args.mpk,
+                                 DEFAULT_GROUPS['cpabe'])
     msk = read_key_from_file(args.msk, group)
     mpk = read_key_from_file(args.mpk, group)
 
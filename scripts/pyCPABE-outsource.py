@@ -0,0 +1,138 @@
+"""Outsources the decryption of ciphertexts encrypted using the CP-ABE
+Scheme from Bethencourt2007cae, following Green2011oda.
+
+"""
+
+import io
+import sys
+import argparse
+
+from pebel.groups import DEFAULT_GROUPS
+
+from pebel.cpabe import (
+    cpabe_outsource_keygen,
+    cpabe_transform,
+    cpabe_decrypt_transformed
+)
+from pebel.util import (
+    write_key_to_file,
+    read_key_from_file,
+    read_group_from_file
+)
+from pebel.exceptions import PebelException, PebelDecryptionException
+
+
+def main():
+    """Wrapper function to split decryption keys, transform ciphertexts
+    and decrypt transformed ciphertexts.
+
+    """
+    parser = argparse.ArgumentParser(
+        description="Splits a decryption key into a transformation key,"
+        " for a server to partially decrypt ciphertexts with, and a"
+        " retrieval key, with which the client completes decryption.")
+
+    parser.add_argument('--mpk',
+                        required=True,
+                        dest='mpk',
+                        type=str,
+                        help="The name of the Public Parameters.")
+
+    commands = parser.add_subparsers(dest='command')
+
+    keygen = commands.add_parser('keygen',
+                                 help="Split a decryption key.")
+    keygen.add_argument('--dkey',
+                        required=True,
+                        dest='dkey',
+                        type=str,
+                        help="The name of the file containing the"
+                        " decryption key.")
+    keygen.add_argument('--tkey-out',
+                        default="bob.cp.tkey",
+                        dest='tkey',
+                        type=str,
+                        help="The name of the file in which to store the"
+                        " transformation key. Default: %(default)s")
+    keygen.add_argument('--rkey-out',
+                        default="bob.cp.rkey",
+                        dest='rkey',
+                        type=str,
+                        help="The name of the file in which to store the"
+                        " retrieval key. Default: %(default)s")
+
+    transform = commands.add_parser('transform',
+                                    help="Partially decrypt a ciphertext.")
+    transform.add_argument('--tkey',
+                           required=True,
+                           dest='tkey',
+                           type=str,
+                           help="The name of the file containing the"
+                           " transformation key.")
+    transform.add_argument('--ctxt',
+                           required=True,
+                           dest='ctxt',
+                           type=str,
+                           help="The name of the file containing the"
+                           " ciphertext, <fname>.cpabe, to be transformed"
+                           " into <fname>.cpabe.tx")
+
+    decrypt = commands.add_parser('decrypt',
+                                  help="Decrypt a transformed ciphertext.")
+    decrypt.add_argument('--rkey',
+                         required=True,
+                         dest='rkey',
+                         type=str,
+                         help="The name of the file containing the"
+                         " retrieval key.")
+    decrypt.add_argument('--ctxt',
+                         required=True,
+                         dest='ctxt',
+                         type=str,
+                         help="The name of the file containing the"
+                         " transformed ciphertext, <fname>.cpabe.tx")
+
+    args = parser.parse_args()
+
+    if not args.command:
+        parser.print_usage()
+        sys.exit(-1)
+
+    group = read_group_from_file(args.mpk, DEFAULT_GROUPS['cpabe'])
+    mpk = read_key_from_file(args.mpk, group)
+
+    if args.command == 'keygen':
+        dkey = read_key_from_file(args.dkey, group)
+        tkey, rkey = cpabe_outsource_keygen(group, dkey)
+        write_key_to_file(args.tkey, tkey, group)
+        write_key_to_file(args.rkey, rkey, group)
+
+    elif args.command == 'transform':
+        if not args.ctxt.endswith(".cpabe"):
+            print("Ciphertext needs to end with .cpabe")
+            sys.exit(-1)
+        tkey = read_key_from_file(args.tkey, group)
+        try:
+            raw = cpabe_transform(group, mpk, tkey, io.open(args.ctxt, 'rb'))
+        except PebelDecryptionException as e:
+            print("Unable to transform ciphertext: {}".format(e))
+            sys.exit(-1)
+        with io.open(args.ctxt + ".tx", 'wb') as ctxt:
+            ctxt.write(raw)
+
+    else:
+        if not args.ctxt.endswith(".cpabe.tx"):
+            print("Transformed ciphertext needs to end with .cpabe.tx")
+            sys.exit(-1)
+        rkey = read_key_from_file(args.rkey, group)
+        try:
+            raw = cpabe_decrypt_transformed(group, rkey,
+                                            io.open(args.ctxt, 'rb'))
+        except PebelException as e:
+            print("Unable to decrypt ciphertext: {}".format(e))
+            sys.exit(-1)
+        with io.open(args.ctxt.replace(".cpabe.tx", ".prime"), 'wb') as ptxt:
+            ptxt.write(raw)
+
+if __name__ == '__main__':
+    main()
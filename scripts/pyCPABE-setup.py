@@ -7,7 +7,7 @@ import argparse
 import io
 import sys
 
-from charm.toolbox.pairinggroup import PairingGroup
+from pebel.groups import CURVES, DEFAULT_GROUPS, get_group
 
 from pebel.util import write_key_to_file
 from pebel.cpabe import cpabe_setup
@@ -35,8 +35,16 @@ def main():
                         help='The name of the file in which to store the '
                         'Master Secret Key. Default: %(default)s')
 
+    parser.add_argument('--group',
+                        default=DEFAULT_GROUPS['cpabe'],
+                        choices=sorted(CURVES),
+                        dest='group',
+                        type=str,
+                        help='The pairing group used, which is recorded '
+                        'within the keys. Default: %(default)s')
+
     args = parser.parse_args()
-    group = PairingGroup('SS512')
+    group = get_group(args.group)
     (mpk, msk) = cpabe_setup(group)
 
     write_key_to_file(args.mpk, mpk, group)
@@ -8,10 +8,10 @@ import io
 import sys
 import argparse
 
-from charm.toolbox.pairinggroup import PairingGroup
+from pebel.groups import DEFAULT_GROUPS
 
 from pebel.kpabe import kpabe_decrypt
-from pebel.util import read_key_from_file
+from pebel.util import read_key_from_file, read_group_from_file
 from pebel.exceptions import PebelDecryptionException
 
 def main():
@@ -52,7 +52,8 @@ def main():
 
     ptxt_fname = args.ctxt.replace(".kpabe", ".prime")
 
-    group = PairingGroup('MNT224')
+    group = read_group_from_file(args.mpk,
+                                 DEFAULT_GROUPS['kpabe'])
     
     mpk = read_key_from_file(args.mpk, group)
 
@@ -8,10 +8,11 @@ import struct
 import os
 import argparse
 
-from charm.toolbox.pairinggroup import PairingGroup
+from pebel.groups import DEFAULT_GROUPS
 
 from pebel.kpabe import kpabe_encrypt
-from pebel.util import read_key_from_file
+from pebel.compress import AUTO, CODECS
+from pebel.util import read_key_from_file, read_group_from_file
 
 
 
@@ -40,6 +41,12 @@ def main():
                         help="A file containing the plaintext to be encrypted."
         )
 
+    parser.add_argument('--compress',
+                        choices=[AUTO] + sorted(CODECS),
+                        help="Compress the plaintext before encryption,"
+                        " or with auto only if it is compressible."
+                        " Default: no compression")
+
     parser.add_argument('attributes',
                         nargs=argparse.REMAINDER,
                         help="The attributes used to encrypt the plain-text"
@@ -47,11 +54,13 @@ def main():
 
     args = parser.parse_args()
 
-    group = PairingGroup('MNT224')
+    group = read_group_from_file(args.mpk,
+                                 DEFAULT_GROUPS['kpabe'])
 
     mpk = read_key_from_file(args.mpk, group)
 
-    ctxt = kpabe_encrypt(group, mpk, io.open(args.ptxt, 'rb'), args.attributes)
+    ctxt = kpabe_encrypt(group, mpk, io.open(args.ptxt, 'rb'), args.attributes,
+                         compression=args.compress)
 
     ctxt_fname = "".join([args.ptxt, ".kpabe"])
 
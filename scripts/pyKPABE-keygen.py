@@ -6,12 +6,13 @@ import argparse
 import io
 import sys
 
-from charm.toolbox.pairinggroup import PairingGroup
+from pebel.groups import DEFAULT_GROUPS
 
 from pebel.kpabe import kpabe_keygen
 from pebel.util import (
     write_key_to_file,
-    read_key_from_file
+    read_key_from_file,
+    read_group_from_file
 )
 
 
@@ -44,7 +45,8 @@ def main():
                         help="The policy used to construct the secret key.")
 
     args = parser.parse_args()
-    group = PairingGroup('MNT224')
+    group = read_group_from_file(args.mpk,
+                                 DEFAULT_GROUPS['kpabe'])
     msk = read_key_from_file(args.msk, group)
     mpk = read_key_from_file(args.mpk, group)
 
@@ -6,7 +6,7 @@ import argparse
 import io
 import sys
 
-from charm.toolbox.pairinggroup import PairingGroup
+from pebel.groups import CURVES, DEFAULT_GROUPS, get_group
 
 from pebel.util import write_key_to_file
 from pebel.kpabe import kpabe_setup
@@ -34,8 +34,16 @@ def main():
                         help='The name of the file in which to store the '
                         'Master Secret Key. Default: %(default)s')
 
+    parser.add_argument('--group',
+                        default=DEFAULT_GROUPS['kpabe'],
+                        choices=sorted(CURVES),
+                        dest='group',
+                        type=str,
+                        help='The pairing group used, which is recorded '
+                        'within the keys. Default: %(default)s')
+
     args = parser.parse_args()
-    group = PairingGroup('MNT224')
+    group = get_group(args.group)
     (mpk, msk) = kpabe_setup(group)
 
     write_key_to_file(args.mpk, mpk, group)
@@ -0,0 +1,146 @@
+"""Generates keys for, encrypts and decrypts using any of the ABE
+schemes registered within pebel.schemes.
+
+"""
+
+import argparse
+import io
+import sys
+
+from pebel.compress import AUTO, CODECS
+from pebel.groups import CURVES, get_group
+from pebel.schemes import get_scheme, list_schemes, encrypt, decrypt
+from pebel.util import (
+    write_key_to_file,
+    read_key_from_file,
+    read_group_from_file
+)
+from pebel.exceptions import PebelDecryptionException
+
+
+def main():
+    """Wrapper function to set up, generate keys, encrypt and decrypt
+    using a registered scheme.
+
+    """
+    parser = argparse.ArgumentParser(
+        description="Generates keys for, encrypts and decrypts using any"
+        " registered ABE scheme. Ciphertexts are named <fname>.abe and"
+        " record the scheme used.")
+
+    parser.add_argument('--scheme',
+                        default='bsw07',
+                        choices=list_schemes(),
+                        help="The scheme to use. Decryption uses the scheme"
+                        " recorded within the ciphertext."
+                        " Default: %(default)s")
+
+    commands = parser.add_subparsers(dest='command')
+
+    setup = commands.add_parser('setup', help="Generate a master key pair.")
+    setup.add_argument('--mpk-out',
+                       default="abe.mpk",
+                       dest='mpk',
+                       help="The name of the file in which to store the"
+                       " Public Parameters. Default: %(default)s")
+    setup.add_argument('--msk-out',
+                       default="abe.msk",
+                       dest='msk',
+                       help="The name of the file in which to store the"
+                       " Master Secret Key. Default: %(default)s")
+    setup.add_argument('--group',
+                       choices=sorted(CURVES),
+                       help="The pairing group used, which is recorded"
+                       " within the keys. Default: that of the scheme")
+
+    keygen = commands.add_parser('keygen',
+                                 help="Generate a decryption key.")
+    keygen.add_argument('--mpk', required=True, dest='mpk',
+                        help="The name of the Public Parameters.")
+    keygen.add_argument('--msk', required=True, dest='msk',
+                        help="The name of the Master Secret Key.")
+    keygen.add_argument('--dkey-out',
+                        default="bob.abe.dkey",
+                        dest='dkey',
+                        help="The name of the file in which to store the"
+                        " decryption key. Default: %(default)s")
+    keygen.add_argument('access',
+                        nargs='+',
+                        help="The attributes, or for KP-ABE the policy, of"
+                        " the decryption key.")
+
+    enc = commands.add_parser('encrypt', help="Encrypt a file.")
+    enc.add_argument('--mpk', required=True, dest='mpk',
+                     help="The name of the Public Parameters.")
+    enc.add_argument('--ptxt', required=True, dest='ptxt',
+                     help="The name of the file to be encrypted.")
+    enc.add_argument('--compress',
+                     choices=[AUTO] + sorted(CODECS),
+                     help="Compress the plaintext before encryption, or"
+                     " with auto only if it is compressible."
+                     " Default: no compression")
+    enc.add_argument('access',
+                     nargs='+',
+                     help="The policy, or for KP-ABE the attributes, to"
+                     " encrypt under.")
+
+    dec = commands.add_parser('decrypt', help="Decrypt a file.")
+    dec.add_argument('--mpk', required=True, dest='mpk',
+                     help="The name of the Public Parameters.")
+    dec.add_argument('--dkey', required=True, dest='dkey',
+                     help="The name of the file containing the"
+                     " decryption key.")
+    dec.add_argument('--ctxt', required=True, dest='ctxt',
+                     help="The name of the file, <fname>.abe, to be"
+                     " decrypted.")
+
+    args = parser.parse_args()
+
+    if not args.command:
+        parser.print_usage()
+        sys.exit(-1)
+
+    scheme = get_scheme(args.scheme)
+
+    if args.command == 'setup':
+        group = get_group(args.group or scheme.group)
+        mpk, msk = scheme.setup(group)
+        write_key_to_file(args.mpk, mpk, group)
+        write_key_to_file(args.msk, msk, group)
+        return
+
+    group = read_group_from_file(args.mpk, scheme.group)
+    mpk = read_key_from_file(args.mpk, group)
+
+    if args.command == 'keygen':
+        msk = read_key_from_file(args.msk, group)
+        if scheme.kind == 'cp':
+            access = [a.upper() for a in args.access]
+        else:
+            access = " ".join(args.access)
+        write_key_to_file(args.dkey,
+                          scheme.keygen(group, msk, mpk, access), group)
+
+    elif args.command == 'encrypt':
+        access = (" ".join(args.access) if scheme.kind == 'cp'
+                  else args.access)
+        raw = encrypt(group, mpk, io.open(args.ptxt, 'rb'), access,
+                      scheme.name, args.compress)
+        with io.open(args.ptxt + ".abe", 'wb') as ctxt:
+            ctxt.write(raw)
+
+    else:
+        if not args.ctxt.endswith(".abe"):
+            print("Ciphertext needs to end with .abe")
+            sys.exit(-1)
+        dkey = read_key_from_file(args.dkey, group)
+        try:
+            raw = decrypt(group, mpk, dkey, io.open(args.ctxt, 'rb'))
+        except PebelDecryptionException as e:
+            print("Unable to decrypt ciphertext: {}".format(e))
+            sys.exit(-1)
+        with io.open(args.ctxt.replace(".abe", ".prime"), 'wb') as ptxt:
+            ptxt.write(raw)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Creates, lists and extracts archives of files encrypted under a single
+CP-ABE policy or KP-ABE attribute set.
+
+"""
+
+import argparse
+import io
+import os
+import sys
+
+from pebel.archive import ArchiveWriter, ArchiveReader
+from pebel.schemes import DEFAULT_SCHEMES, list_schemes, select_scheme
+from pebel.util import read_key_from_file, read_group_from_file
+from pebel.exceptions import PebelDecryptionException
+
+
+def walk(paths):
+    """Yield the names of the files named, or beneath the directories
+    named, in paths."""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for fname in sorted(files):
+                    yield os.path.join(root, fname)
+        else:
+            yield path
+
+
+def main():
+    """Wrapper function to create, list and extract archives."""
+    parser = argparse.ArgumentParser(
+        description="Encrypts many files into one archive sharing a single"
+        " encapsulated session key, and extracts selected members.")
+
+    parser.add_argument('--mpk',
+                        required=True,
+                        dest='mpk',
+                        type=str,
+                        help="The name of the Public Parameters.")
+
+    parser.add_argument('--archive',
+                        required=True,
+                        dest='archive',
+                        type=str,
+                        help="The name of the archive file.")
+
+    commands = parser.add_subparsers(dest='command')
+
+    create = commands.add_parser('create', help="Create an archive.")
+    access = create.add_mutually_exclusive_group(required=True)
+    access.add_argument('--policy',
+                        help="The CP-ABE policy to encrypt under.")
+    access.add_argument('--attributes',
+                        nargs='+',
+                        help="The KP-ABE attributes to encrypt under.")
+    create.add_argument('--scheme',
+                        choices=list_schemes(),
+                        help="The scheme to encrypt with. Default: {cp}"
+                        " for a policy, {kp} for attributes.".format(
+                            **DEFAULT_SCHEMES))
+    create.add_argument('files',
+                        nargs='+',
+                        help="The files and directories to archive.")
+
+    for name, desc in (('list', "List the members of an archive."),
+                       ('extract', "Extract members from an archive.")):
+        command = commands.add_parser(name, help=desc)
+        command.add_argument('--dkey',
+                             required=True,
+                             dest='dkey',
+                             type=str,
+                             help="The name of the file containing the"
+                             " decryption key.")
+        if name == 'extract':
+            command.add_argument('--path',
+                                 default=".",
+                                 help="The directory to extract to."
+                                 " Default: %(default)s")
+            command.add_argument('members',
+                                 nargs='*',
+                                 help="The members to extract."
+                                 " Default: all")
+
+    args = parser.parse_args()
+
+    if not args.command:
+        parser.print_usage()
+        sys.exit(-1)
+
+    if args.command == 'create':
+        scheme = select_scheme(args.policy, args.attributes, args.scheme)[0]
+        group = read_group_from_file(args.mpk, scheme.group)
+        mpk = read_key_from_file(args.mpk, group)
+        with io.open(args.archive, 'wb') as f:
+            with ArchiveWriter(f, group, mpk, args.policy, args.attributes,
+                               scheme.name) as archive:
+                for fname in walk(args.files):
+                    archive.add_file(fname)
+        return
+
+    group = read_group_from_file(args.mpk)
+    mpk = read_key_from_file(args.mpk, group)
+    dkey = read_key_from_file(args.dkey, group)
+    with io.open(args.archive, 'rb') as f:
+        try:
+            archive = ArchiveReader(f, mpk, dkey, group)
+        except PebelDecryptionException as e:
+            print("Unable to decrypt archive: {}".format(e))
+            sys.exit(-1)
+        if args.command == 'list':
+            for name in archive.names():
+                print("{0:>12} {1}".format(archive.size(name), name))
+        else:
+            archive.extractall(args.path, args.members or None)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Issues, encrypts under and renews CP-ABE decryption keys that expire
+at the end of an epoch.
+
+"""
+
+import argparse
+import io
+import sys
+
+from pebel.epoch import (
+    EPOCH_BITS,
+    EPOCH_PERIOD,
+    EPOCH_SCHEMES,
+    current_epoch,
+    epoch_keygen,
+    epoch_encrypt,
+    expiring_keys,
+    renew_keys
+)
+from pebel.schemes import get_scheme
+from pebel.util import (
+    write_key_to_file,
+    read_key_from_file,
+    read_group_from_file
+)
+
+
+def main():
+    """Wrapper function to issue, encrypt under and renew expiring keys."""
+    parser = argparse.ArgumentParser(
+        description="Issues CP-ABE keys valid up to an epoch, encrypts"
+        " for keys valid in the current epoch, and renews the keys about"
+        " to expire.")
+
+    parser.add_argument('--mpk',
+                        required=True,
+                        dest='mpk',
+                        type=str,
+                        help="The name of the Public Parameters.")
+
+    parser.add_argument('--scheme',
+                        default='bsw07',
+                        choices=EPOCH_SCHEMES,
+                        help="The scheme used. Default: %(default)s")
+
+    parser.add_argument('--period',
+                        default=EPOCH_PERIOD,
+                        type=int,
+                        help="The length of an epoch in seconds."
+                        " Default: %(default)s")
+
+    parser.add_argument('--nbits',
+                        default=EPOCH_BITS,
+                        type=int,
+                        help="The word size of epochs. Default: %(default)s")
+
+    commands = parser.add_subparsers(dest='command')
+
+    keygen = commands.add_parser('keygen', help="Issue an expiring key.")
+    keygen.add_argument('--msk', required=True, dest='msk',
+                        help="The name of the Master Secret Key.")
+    keygen.add_argument('--dkey-out', default="bob.cp.dkey", dest='dkey',
+                        help="The name of the file in which to store the"
+                        " decryption key. Default: %(default)s")
+    keygen.add_argument('--valid-for', default=30, type=int,
+                        dest='valid_for',
+                        help="The number of epochs, including the current,"
+                        " the key is valid for. Default: %(default)s")
+    keygen.add_argument('attributes', nargs='+',
+                        help="The attributes of the key.")
+
+    encrypt = commands.add_parser(
+        'encrypt', help="Encrypt for keys valid in the current epoch.")
+    encrypt.add_argument('--ptxt', required=True, dest='ptxt',
+                         help="The name of the file to be encrypted, to"
+                         " <fname>.abe")
+    encrypt.add_argument('policy', help="The policy to encrypt under.")
+
+    expiring = commands.add_parser(
+        'expiring', help="List the keys expiring within some epochs.")
+    renew = commands.add_parser(
+        'renew', help="Renew the keys expiring within some epochs.")
+    for command in (expiring, renew):
+        command.add_argument('--within', default=1, type=int,
+                             help="Select keys expiring within this many"
+                             " epochs. Default: %(default)s")
+        command.add_argument('dkeys', nargs='+',
+                             help="The decryption keys to consider.")
+    renew.add_argument('--msk', required=True, dest='msk',
+                       help="The name of the Master Secret Key.")
+    renew.add_argument('--valid-for', default=30, type=int,
+                       dest='valid_for',
+                       help="The number of epochs, including the current,"
+                       " renewed keys are valid for. Default: %(default)s")
+    renew.add_argument('--jobs', type=int,
+                       help="The number of processes. Default: one per"
+                       " core")
+
+    args = parser.parse_args()
+
+    if not args.command:
+        parser.print_usage()
+        sys.exit(-1)
+
+    now = current_epoch(args.period)
+
+    if args.command in ('expiring', 'renew'):
+        due = list(expiring_keys(args.dkeys, now + args.within, args.nbits))
+        if args.command == 'expiring':
+            for fname, expiry in due:
+                print("{0:>8} {1}".format(expiry, fname))
+            return
+        renewed = renew_keys([fname for fname, _ in due], args.mpk, args.msk,
+                             now + args.valid_for - 1, args.scheme,
+                             args.nbits, args.jobs)
+        for fname in renewed:
+            print(fname)
+        return
+
+    group = read_group_from_file(args.mpk, get_scheme(args.scheme).group)
+    mpk = read_key_from_file(args.mpk, group)
+
+    if args.command == 'keygen':
+        msk = read_key_from_file(args.msk, group)
+        dkey = epoch_keygen(group, msk, mpk, args.attributes,
+                            now + args.valid_for - 1, args.scheme,
+                            args.nbits)
+        write_key_to_file(args.dkey, dkey, group)
+    else:
+        raw = epoch_encrypt(group, mpk, io.open(args.ptxt, 'rb'),
+                            args.policy, now, args.scheme, args.nbits)
+        with io.open(args.ptxt + ".abe", 'wb') as ctxt:
+            ctxt.write(raw)
+
+if __name__ == '__main__':
+    main()
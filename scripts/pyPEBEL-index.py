@@ -0,0 +1,66 @@
+"""Maintains and queries an index of the access structures protecting
+CP-ABE and KP-ABE ciphertexts.
+
+"""
+
+import argparse
+import sys
+
+from pebel.index import CiphertextIndex
+
+
+def main():
+    """Wrapper function to add ciphertexts to an index, and to list the
+    indexed ciphertexts a decryption key can open.
+
+    """
+    parser = argparse.ArgumentParser(
+        description="Indexes the policies and attribute sets of"
+        " ciphertexts, and finds the ciphertexts a key can open.")
+
+    parser.add_argument('--index',
+                        default="pebel.index",
+                        dest='index',
+                        type=str,
+                        help="The name of the index file."
+                        " Default: %(default)s")
+
+    commands = parser.add_subparsers(dest='command')
+
+    add = commands.add_parser('add',
+                              help="Add ciphertext files to the index.")
+    add.add_argument('ctxts',
+                     nargs='+',
+                     help="The .cpabe or .kpabe files to index.")
+
+    query = commands.add_parser('query',
+                                help="List the indexed ciphertexts the"
+                                " decryption key can open.")
+    query.add_argument('--dkey',
+                       required=True,
+                       dest='dkey',
+                       type=str,
+                       help="The name of the file containing the"
+                       " decryption key.")
+
+    commands.add_parser('compact',
+                        help="Remove superseded records from the index.")
+
+    args = parser.parse_args()
+
+    if not args.command:
+        parser.print_usage()
+        sys.exit(-1)
+
+    with CiphertextIndex(args.index) as index:
+        if args.command == 'add':
+            for fname in args.ctxts:
+                index.add_file(fname)
+        elif args.command == 'query':
+            for name in sorted(index.objects_for_key(args.dkey)):
+                print(name)
+        else:
+            index.compact()
+
+if __name__ == '__main__':
+    main()
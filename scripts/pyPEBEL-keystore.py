@@ -0,0 +1,54 @@
+"""Packs keys into a key store shared by worker processes, or lists the
+keys within one.
+
+"""
+
+import argparse
+import os
+
+from pebel.groups import CURVES
+from pebel.keystore import KeyStore, build_keystore
+
+
+def main():
+    """Wrapper function to build and list key stores."""
+    parser = argparse.ArgumentParser(
+        description="Packs keys into a single key store that worker"
+        " processes memory map read-only, or lists its keys.")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    build = subparsers.add_parser('build', help="Build a key store.")
+    build.add_argument('--out',
+                       required=True,
+                       help="The name of the key store.")
+    build.add_argument('--group',
+                       choices=sorted(CURVES),
+                       help="The pairing group of keys that do not record"
+                       " one.")
+    build.add_argument('keys',
+                       nargs='+',
+                       help="The keys, as <name>=<fname>, or <fname> to"
+                       " name a key by its file.")
+
+    show = subparsers.add_parser('list', help="List the keys of a store.")
+    show.add_argument('store', help="The name of the key store.")
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        keys = {}
+        for key in args.keys:
+            name, sep, fname = key.partition('=')
+            if not sep:
+                name, fname = os.path.basename(key), key
+            keys[name] = fname
+        count = build_keystore(args.out, keys, args.group)
+        print("{0} keys stored within {1}".format(count, args.out))
+    else:
+        with KeyStore(args.store) as store:
+            for name in store.names():
+                print(name)
+
+if __name__ == '__main__':
+    main()
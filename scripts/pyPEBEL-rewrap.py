@@ -0,0 +1,114 @@
+"""Changes the CP-ABE policy or KP-ABE attributes of ciphertexts and
+archives without re-encrypting their payloads.
+
+"""
+
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from pebel.rewrap import rewrap_file, rewrap_files
+from pebel.groups import CURVES
+from pebel.util import read_key_from_file, read_group_from_file
+from pebel.exceptions import PebelException
+
+_keys = None
+
+
+def load_keys(mpk_fname, dkey_fname, default=None):
+    """Read the keys once within each worker process."""
+    global _keys
+    group = read_group_from_file(mpk_fname, default)
+    _keys = (read_key_from_file(mpk_fname, group),
+             read_key_from_file(dkey_fname, group))
+
+
+def rewrap(fname, policy, attributes):
+    """Rewrap a single file within a worker process."""
+    mpk, dkey = _keys
+    return fname, rewrap_file(fname, mpk, dkey, policy, attributes)
+
+
+def main():
+    """Wrapper function to rewrap ciphertexts and archives."""
+    parser = argparse.ArgumentParser(
+        description="Re-encrypts the session keys of ciphertexts and"
+        " archives under a new policy or attribute set, rewriting only"
+        " their headers.")
+
+    parser.add_argument('--mpk',
+                        required=True,
+                        dest='mpk',
+                        type=str,
+                        help="The name of the Public Parameters.")
+
+    parser.add_argument('--dkey',
+                        required=True,
+                        dest='dkey',
+                        type=str,
+                        help="The name of the file containing a decryption"
+                        " key able to decrypt the files.")
+
+    parser.add_argument('--group',
+                        choices=sorted(CURVES),
+                        help="The pairing group of keys that do not record"
+                        " one.")
+
+    access = parser.add_mutually_exclusive_group(required=True)
+    access.add_argument('--policy',
+                        help="The new CP-ABE policy.")
+    access.add_argument('--attributes',
+                        nargs='+',
+                        help="The new KP-ABE attributes.")
+
+    parser.add_argument('--output',
+                        dest='output',
+                        type=str,
+                        help="The file to write the rewrapped ciphertext to,"
+                        " when a single file is given. By default files"
+                        " are rewrapped in place.")
+
+    parser.add_argument('--jobs',
+                        default=1,
+                        type=int,
+                        help="The number of processes to use."
+                        " Default: %(default)s")
+
+    parser.add_argument('files',
+                        nargs='+',
+                        help="The ciphertexts and archives to rewrap.")
+
+    args = parser.parse_args()
+
+    if args.output and len(args.files) != 1:
+        parser.error("--output requires a single file.")
+
+    try:
+        if args.output:
+            load_keys(args.mpk, args.dkey, args.group)
+            rewrap_file(args.files[0], _keys[0], _keys[1], args.policy,
+                        args.attributes, out=args.output)
+            return
+        if args.jobs > 1:
+            with ProcessPoolExecutor(args.jobs, initializer=load_keys,
+                                     initargs=(args.mpk, args.dkey,
+                                               args.group)) as pool:
+                results = pool.map(rewrap, args.files,
+                                   [args.policy] * len(args.files),
+                                   [args.attributes] * len(args.files))
+                for fname, in_place in results:
+                    print("{0} {1}".format(
+                        "header" if in_place else "copied", fname))
+        else:
+            load_keys(args.mpk, args.dkey, args.group)
+            for fname, in_place in rewrap_files(args.files, _keys[0],
+                                                _keys[1], args.policy,
+                                                args.attributes):
+                print("{0} {1}".format(
+                    "header" if in_place else "copied", fname))
+    except PebelException as e:
+        print("Unable to rewrap: {}".format(e))
+        sys.exit(-1)
+
+if __name__ == '__main__':
+    main()
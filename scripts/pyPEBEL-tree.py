@@ -0,0 +1,76 @@
+"""Encrypts the new and changed files of a directory tree.
+
+"""
+
+import argparse
+
+from pebel.compress import AUTO, CODECS
+from pebel.schemes import get_scheme, list_schemes
+from pebel.tree import encrypt_tree
+
+
+def main():
+    """Wrapper function to incrementally encrypt a directory tree."""
+    parser = argparse.ArgumentParser(
+        description="Encrypts every file beneath a directory into a"
+        " mirrored tree of <fname>.abe files, re-encrypting on later runs"
+        " only the files that are new or changed.")
+
+    parser.add_argument('--mpk',
+                        required=True,
+                        dest='mpk',
+                        type=str,
+                        help="The name of the Public Parameters.")
+
+    parser.add_argument('--scheme',
+                        default='bsw07',
+                        choices=list_schemes(),
+                        help="The scheme used. Default: %(default)s")
+
+    parser.add_argument('--manifest',
+                        help="The name of the manifest. Default:"
+                        " .pebel-manifest.json within the destination")
+
+    parser.add_argument('--jobs',
+                        type=int,
+                        help="The number of processes. Default: one per"
+                        " core")
+
+    parser.add_argument('--compress',
+                        choices=[AUTO] + sorted(CODECS),
+                        help="Compress files before encryption, or with"
+                        " auto only those that are compressible."
+                        " Default: no compression")
+
+    parser.add_argument('--prune',
+                        action='store_true',
+                        help="Delete the cipher-texts of files no longer"
+                        " within the source.")
+
+    parser.add_argument('src', help="The directory to encrypt.")
+
+    parser.add_argument('dest',
+                        help="The directory in which to store the"
+                        " cipher-texts.")
+
+    parser.add_argument('access',
+                        nargs='+',
+                        help="The policy, or for KP-ABE the attributes, to"
+                        " encrypt under.")
+
+    args = parser.parse_args()
+
+    scheme = get_scheme(args.scheme)
+    access = (" ".join(args.access) if scheme.kind == 'cp'
+              else args.access)
+    summary = encrypt_tree(args.src, args.dest, args.mpk, access,
+                           scheme.name, args.compress, args.manifest,
+                           args.jobs, args.prune)
+
+    print("{files} files: {encrypted} encrypted, {unchanged} unchanged,"
+          " {removed} removed".format(**summary))
+    print("{bytes} bytes in {seconds:.2f}s: {files_per_s:.1f} files/s,"
+          " {bytes_per_s:.0f} bytes/s".format(**summary))
+
+if __name__ == '__main__':
+    main()
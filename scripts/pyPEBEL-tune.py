@@ -0,0 +1,97 @@
+"""Benchmarks the available pairing groups on this machine and
+recommends one for a security level and workload.
+
+"""
+
+import argparse
+import sys
+
+from pebel.groups import (
+    CURVES,
+    OPERATIONS,
+    benchmark_groups,
+    recommend_group
+)
+
+
+def parse_mix(text):
+    """Parse a workload mix of the form keygen=1,encrypt=10,decrypt=5."""
+    mix = {}
+    for part in text.split(','):
+        op, _, weight = part.partition('=')
+        if op not in OPERATIONS:
+            raise argparse.ArgumentTypeError(
+                "Unknown operation {0}, expected one of {1}.".format(
+                    op, ", ".join(OPERATIONS)))
+        mix[op] = float(weight)
+    return mix
+
+
+def main():
+    """Wrapper function to benchmark the pairing groups and recommend
+    the cheapest meeting the requested security level.
+
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the pairing groups available on this"
+        " machine and recommends one for a given security level and"
+        " mix of operations.")
+
+    parser.add_argument('--scheme',
+                        default='cpabe',
+                        choices=['cpabe', 'kpabe'],
+                        help="The scheme to be tuned. Default: %(default)s")
+
+    parser.add_argument('--security',
+                        default=80,
+                        type=int,
+                        help="The minimum security level in bits."
+                        " Default: %(default)s")
+
+    parser.add_argument('--mix',
+                        default="keygen=1,encrypt=1,decrypt=1",
+                        type=parse_mix,
+                        help="The relative frequency of each operation."
+                        " Default: %(default)s")
+
+    parser.add_argument('--leaves',
+                        default=10,
+                        type=int,
+                        help="The number of policy leaves and attributes"
+                        " typical of the workload. Default: %(default)s")
+
+    parser.add_argument('--repeat',
+                        default=5,
+                        type=int,
+                        help="The repetitions of each operation."
+                        " Default: %(default)s")
+
+    parser.add_argument('--curves',
+                        nargs='+',
+                        default=sorted(CURVES),
+                        choices=sorted(CURVES),
+                        help="The curves to measure. Default: %(default)s")
+
+    args = parser.parse_args()
+
+    timings = benchmark_groups(args.scheme, args.curves,
+                               args.leaves, args.repeat)
+
+    print("{0:<8} {1:>8} {2:>12} {3:>12} {4:>12}".format(
+        "curve", "security", *OPERATIONS))
+    for name in sorted(timings):
+        print("{0:<8} {1:>8} {2:>12.6f} {3:>12.6f} {4:>12.6f}".format(
+            name, CURVES[name], *[timings[name][op] for op in OPERATIONS]))
+
+    ranking = recommend_group(timings, args.security, args.mix)
+    if not ranking:
+        print("No measured curve provides {0} bits of security.".format(
+            args.security))
+        sys.exit(-1)
+
+    cost, name = ranking[0]
+    print("Recommended: {0} ({1:.6f}s per weighted operation)".format(
+        name, cost))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Checks that epoch keys decrypt exactly the ciphertexts encrypted no
+later than their expiry, under the policy given.
+
+"""
+
+import io
+
+import pytest
+
+pytest.importorskip('charm')
+
+from pebel import cpabe, epoch, schemes
+from pebel.exceptions import PebelDecryptionException
+from pebel.groups import get_group
+from pebel.policycache import compile_policy
+
+EPOCH = 20000
+
+PLAINTEXT = b'Expires with the epoch.'
+
+
+@pytest.fixture(scope='module')
+def keys():
+    group = get_group('SS512')
+    mpk, msk = cpabe.cpabe_setup(group)
+    return group, mpk, msk
+
+
+def encrypt(keys, policy, at=EPOCH):
+    group, mpk, _ = keys
+    return epoch.epoch_encrypt(group, mpk, io.BytesIO(PLAINTEXT), policy,
+                               at)
+
+
+def decrypt(keys, attributes, expiry, ctxt):
+    group, mpk, msk = keys
+    deckey = epoch.epoch_keygen(group, msk, mpk, attributes, expiry)
+    return schemes.decrypt(group, mpk, deckey, io.BytesIO(ctxt))
+
+
+def test_epoch_policy_keeps_policy():
+    compiled = compile_policy(epoch.epoch_policy('a and b', EPOCH))
+    assert {'A', 'B'} <= set(compiled.attributes)
+    assert len(compiled.attributes) > 2
+
+
+@pytest.mark.parametrize('expiry', [EPOCH, EPOCH + 1, EPOCH + 365,
+                                    (1 << epoch.EPOCH_BITS) - 1])
+def test_epoch_valid(keys, expiry):
+    ctxt = encrypt(keys, 'ONE and TWO')
+    assert decrypt(keys, ['ONE', 'TWO'], expiry, ctxt) == PLAINTEXT
+
+
+@pytest.mark.parametrize('expiry', [0, EPOCH - 365, EPOCH - 1])
+def test_epoch_expired(keys, expiry):
+    ctxt = encrypt(keys, 'ONE and TWO')
+    with pytest.raises(PebelDecryptionException):
+        decrypt(keys, ['ONE', 'TWO'], expiry, ctxt)
+
+
+def test_epoch_unsatisfied(keys):
+    ctxt = encrypt(keys, 'ONE and TWO')
+    with pytest.raises(PebelDecryptionException):
+        decrypt(keys, ['ONE'], EPOCH + 1, ctxt)
+
+
+@pytest.mark.parametrize('scheme', [s for s in schemes.list_schemes()
+                                    if s not in epoch.EPOCH_SCHEMES])
+def test_epoch_scheme(keys, scheme):
+    group, mpk, _ = keys
+    with pytest.raises(ValueError):
+        epoch.epoch_encrypt(group, mpk, io.BytesIO(PLAINTEXT), 'ONE', EPOCH,
+                            scheme)